@@ -38,10 +38,19 @@ export const useChatWebSocket = (options: UseChatWebSocketOptions = {}) => {
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const reconnectAttemptsRef = useRef(0);
+  const heartbeatIntervalRef = useRef<NodeJS.Timeout | null>(null);
   const onMessageRef = useRef(onMessage);
   const onErrorRef = useRef(onError);
   const maxReconnectAttempts = 5;
   const reconnectDelay = 3000; // 3 seconds
+  const heartbeatInterval = 60000; // keeps presence alive (server TTL is 5 minutes)
+
+  const stopHeartbeat = () => {
+    if (heartbeatIntervalRef.current) {
+      clearInterval(heartbeatIntervalRef.current);
+      heartbeatIntervalRef.current = null;
+    }
+  };
 
   // Update refs when callbacks change (without triggering reconnection)
   useEffect(() => {
@@ -89,6 +98,12 @@ export const useChatWebSocket = (options: UseChatWebSocketOptions = {}) => {
         console.log('WebSocket connected');
         reconnectAttemptsRef.current = 0;
         // User is now online - backend handles this via WebSocket connection
+        stopHeartbeat();
+        heartbeatIntervalRef.current = setInterval(() => {
+          if (ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify({ type: 'heartbeat' }));
+          }
+        }, heartbeatInterval);
       };
 
       ws.onmessage = (event) => {
@@ -221,6 +236,7 @@ export const useChatWebSocket = (options: UseChatWebSocketOptions = {}) => {
 
       ws.onclose = () => {
         console.log('WebSocket disconnected');
+        stopHeartbeat();
         wsRef.current = null;
 
         // Attempt to reconnect if enabled and not exceeded max attempts
@@ -242,6 +258,7 @@ export const useChatWebSocket = (options: UseChatWebSocketOptions = {}) => {
   }, [enabled]); // Only depend on enabled, use ref for roomId
 
   const disconnect = useCallback(() => {
+    stopHeartbeat();
     if (reconnectTimeoutRef.current) {
       clearTimeout(reconnectTimeoutRef.current);
       reconnectTimeoutRef.current = null;
@@ -5,6 +5,7 @@ export interface ChatRoom {
   name?: string;
   participants?: ChatUser[];
   admins?: ChatUser[];
+  participant_count?: number;
   last_message?: ChatMessage;
   unread_count?: number;
   other_participant?: ChatUser;
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Profile, Contact
+from .models import User, Profile, ProfileStats, DailyMetrics, Contact
 
 class CustomUserAdmin(UserAdmin):
     model = User
@@ -22,6 +22,18 @@ class CustomUserAdmin(UserAdmin):
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Profile)
 
+@admin.register(ProfileStats)
+class ProfileStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'followers_count', 'following_count', 'posts_count', 'updated_at')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('updated_at',)
+
+@admin.register(DailyMetrics)
+class DailyMetricsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'new_users', 'posts', 'likes', 'comments', 'shares', 'active_users', 'updated_at')
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'email', 'subject', 'created_at', 'is_read', 'read_by')
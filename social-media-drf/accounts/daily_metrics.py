@@ -0,0 +1,193 @@
+# accounts/daily_metrics.py
+"""
+Build and read the DailyMetrics rollup used by the admin dashboard.
+
+compute() counts a whole date range with one GROUP BY day query per source
+table, so rolling up a day or a year costs the same number of queries.
+
+Post statuses, deletions and late rows keep changing a day's counts after
+it ends. The rollup_daily_metrics command therefore recounts today and the
+DAILY_METRICS_REROLL_DAYS days before it on every run, and can backfill
+any range; it is the only writer. series() reads a range with a single
+scan and never writes. It counts days that were never rolled up, and days
+in the trailing window whose row is older than DAILY_METRICS_STALE_AFTER
+seconds, from the source tables for that request, so the dashboard stays
+right if the command falls behind. Today is always counted live because
+it is still changing.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyMetrics
+
+User = get_user_model()
+
+FIELDS = (
+    'new_users', 'posts', 'shared_posts', 'text_posts', 'media_posts', 'link_posts',
+    'approved_posts', 'pending_posts', 'rejected_posts', 'draft_posts',
+    'likes', 'comments', 'shares', 'communities', 'products', 'active_users',
+)
+
+# Which posts each Post field counts; shared posts only count as shared_posts
+_ORIGINAL = Q(shared_from__isnull=True)
+POST_FILTERS = {
+    'posts': _ORIGINAL,
+    'shared_posts': Q(shared_from__isnull=False),
+    'text_posts': _ORIGINAL & Q(post_type='text'),
+    'media_posts': _ORIGINAL & Q(post_type='media'),
+    'link_posts': _ORIGINAL & Q(post_type='link'),
+    'approved_posts': _ORIGINAL & Q(status='approved'),
+    'pending_posts': _ORIGINAL & Q(status='pending'),
+    'rejected_posts': _ORIGINAL & Q(status='rejected'),
+    'draft_posts': _ORIGINAL & Q(status='draft'),
+}
+
+
+def reroll_days():
+    """Number of past days whose counts may still change"""
+    return getattr(settings, 'DAILY_METRICS_REROLL_DAYS', 7)
+
+
+def days(start, end):
+    """Every date from start to end, inclusive"""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def start_of(day):
+    """Aware datetime at which the date begins in the current timezone"""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def _bounds(start, end):
+    return start_of(start), start_of(end + timedelta(days=1))
+
+
+def _grouped(queryset, date_field, lower, upper, **counts):
+    return (
+        queryset.filter(**{f'{date_field}__gte': lower, f'{date_field}__lt': upper})
+        .annotate(day=TruncDate(date_field))
+        .order_by()
+        .values('day')
+        .annotate(**counts)
+    )
+
+
+def _row_tables():
+    """{field: (model, date field)} for fields that count every row of a table"""
+    from post.models import Like, Comment, Share
+    from community.models import Community
+    from marketplace.models import Product
+
+    return {
+        'new_users': (User, 'date_joined'),
+        'likes': (Like, 'created_at'),
+        'comments': (Comment, 'created_at'),
+        'shares': (Share, 'created_at'),
+        'communities': (Community, 'created_at'),
+        'products': (Product, 'created_at'),
+    }
+
+
+def source(field):
+    """Return (queryset, date field) of the rows the DailyMetrics `field` counts"""
+    from post.models import Post
+
+    if field in POST_FILTERS:
+        return Post.objects.filter(POST_FILTERS[field]), 'created_at'
+    tables = _row_tables()
+    if field not in tables:
+        raise ValueError(f"{field} is not a row count of a single table")
+    model, date_field = tables[field]
+    return model._default_manager.all(), date_field
+
+
+def compute(start, end):
+    """Return {date: {field: count}} for start..end counted from the source tables"""
+    from post.models import Post
+
+    lower, upper = _bounds(start, end)
+    result = {day: dict.fromkeys(FIELDS, 0) for day in days(start, end)}
+
+    sources = [
+        _grouped(
+            Post.objects.all(), 'created_at', lower, upper,
+            **{field: Count('id', filter=q) for field, q in POST_FILTERS.items()},
+            active_users=Count('user', distinct=True),
+        ),
+        *(
+            _grouped(model._default_manager.all(), date_field, lower, upper, **{field: Count('id')})
+            for field, (model, date_field) in _row_tables().items()
+        ),
+    ]
+    for queryset in sources:
+        for row in queryset:
+            day = row.pop('day')
+            if day in result:
+                result[day].update(row)
+    return result
+
+
+def rollup(start, end):
+    """Recount start..end and upsert the DailyMetrics rows. Returns the computed values."""
+    counts = compute(start, end)
+    now = timezone.now()
+    DailyMetrics.objects.bulk_create(
+        [DailyMetrics(date=day, updated_at=now, **values) for day, values in counts.items()],
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=list(FIELDS) + ['updated_at'],
+    )
+    return counts
+
+
+def series(start, end):
+    """Return [{'date': date, field: count, ...}] for every day in start..end (read-only)"""
+    today = timezone.localdate()
+    rolled_at = {}
+    values = {}
+    for row in DailyMetrics.objects.filter(date__range=(start, end)).values('date', 'updated_at', *FIELDS):
+        rolled_at[row['date']] = row.pop('updated_at')
+        values[row['date']] = row
+
+    # Past days nobody rolled up yet (e.g. before the command was scheduled),
+    # and recent days whose rollup may predate later changes
+    settling_from = today - timedelta(days=reroll_days())
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'DAILY_METRICS_STALE_AFTER', 3600))
+    recount = [
+        day for day in days(start, min(end, today - timedelta(days=1)))
+        if day not in values or (day >= settling_from and rolled_at[day] < stale_before)
+    ]
+    if recount:
+        for day, counts in compute(recount[0], recount[-1]).items():
+            values[day] = {'date': day, **counts}
+
+    if start <= today <= end:
+        values[today] = {'date': today, **compute(today, today)[today]}
+
+    return [values[day] for day in days(start, end) if day in values]
+
+
+def totals(rows, *fields):
+    """Sum the given fields over series() rows"""
+    return {field: sum(row[field] for row in rows) for field in fields}
+
+
+def rolling_totals(rows, since, *fields):
+    """
+    Sum the given fields from `since` (an aware datetime) up to now.
+
+    Whole days come from the series() rows; the part of since's own day
+    that lies inside the window is counted from the source tables.
+    """
+    first_day = timezone.localtime(since).date()
+    result = totals([row for row in rows if row['date'] > first_day], *fields)
+    edge_end = start_of(first_day + timedelta(days=1))
+    for field in fields:
+        queryset, date_field = source(field)
+        result[field] += queryset.filter(**{f'{date_field}__gte': since, f'{date_field}__lt': edge_end}).count()
+    return result
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from accounts import profile_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recount follower, following and approved post counters for user profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild the given user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users recounted per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        user_ids = options.get('user_ids')
+
+        if user_ids:
+            # Ignore ids that don't belong to a user
+            user_ids = list(User.objects.filter(id__in=user_ids).order_by('id').values_list('id', flat=True))
+            batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        else:
+            batches = self._batches(batch_size)
+
+        rebuilt = 0
+        for batch in batches:
+            rebuilt += profile_stats.rebuild(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt profile stats for {rebuilt} user(s).')
+        )
+
+    def _batches(self, batch_size):
+        """Walk user ids in primary key order without loading the whole table"""
+        last_id = 0
+        while True:
+            batch = list(
+                User.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
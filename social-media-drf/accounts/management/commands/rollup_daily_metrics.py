@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts import daily_metrics
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Roll up per-day activity counts into DailyMetrics for the admin dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=daily_metrics.reroll_days() + 1,
+            help='Re-roll this many most recent days, including today (default: DAILY_METRICS_REROLL_DAYS + 1)'
+        )
+        parser.add_argument(
+            '--since',
+            help='Backfill from this date (YYYY-MM-DD); "all" starts at the first user sign-up'
+        )
+        parser.add_argument(
+            '--until',
+            help='Last date to roll up (YYYY-MM-DD, default: today)'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='Number of days counted per batch when backfilling (default: 31)'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        end = self._parse_date(options['until']) if options['until'] else today
+
+        since = options['since']
+        if since == 'all':
+            first_joined = User.objects.order_by('date_joined').values_list('date_joined', flat=True).first()
+            start = timezone.localtime(first_joined).date() if first_joined else end
+        elif since:
+            start = self._parse_date(since)
+        else:
+            start = end - timedelta(days=max(1, options['days']) - 1)
+
+        if start > end:
+            raise CommandError('--since must not be after --until')
+
+        chunk = max(1, options['chunk_days'])
+        rolled = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=chunk - 1))
+            rolled += len(daily_metrics.rollup(chunk_start, chunk_end))
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rolled up daily metrics for {rolled} day(s) ({start} to {end}).')
+        )
+
+    def _parse_date(self, value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD')
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_profilestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('new_users', models.IntegerField(default=0)),
+                ('posts', models.IntegerField(default=0)),
+                ('shared_posts', models.IntegerField(default=0)),
+                ('text_posts', models.IntegerField(default=0)),
+                ('media_posts', models.IntegerField(default=0)),
+                ('link_posts', models.IntegerField(default=0)),
+                ('approved_posts', models.IntegerField(default=0)),
+                ('pending_posts', models.IntegerField(default=0)),
+                ('rejected_posts', models.IntegerField(default=0)),
+                ('draft_posts', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('comments', models.IntegerField(default=0)),
+                ('shares', models.IntegerField(default=0)),
+                ('communities', models.IntegerField(default=0)),
+                ('products', models.IntegerField(default=0)),
+                ('active_users', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily metrics',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.text import slugify
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
 from django.core.files.storage import default_storage
@@ -47,11 +47,72 @@ class Profile(models.Model):
 
     def __str__(self):
         return self.display_name if self.display_name else self.user.username
+
+
+class ProfileStats(models.Model):
+    """
+    Denormalized follower/following/approved-post counters for a user.
+    Kept in a separate table so saving a Profile never overwrites them;
+    receivers in post/models.py adjust them with F() expressions.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    posts_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Profile stats'
+
+    def __str__(self):
+        return f"Stats for user {self.user_id}"
+
+
+class DailyMetrics(models.Model):
+    """
+    Per-day rollup of platform activity for the admin dashboard.
+    Filled by the rollup_daily_metrics command (see accounts/daily_metrics.py);
+    every count is for rows created on that date.
+    """
+    date = models.DateField(primary_key=True)
+    new_users = models.IntegerField(default=0)
+    # Posts exclude shares; shared_posts counts the share copies
+    posts = models.IntegerField(default=0)
+    shared_posts = models.IntegerField(default=0)
+    text_posts = models.IntegerField(default=0)
+    media_posts = models.IntegerField(default=0)
+    link_posts = models.IntegerField(default=0)
+    approved_posts = models.IntegerField(default=0)
+    pending_posts = models.IntegerField(default=0)
+    rejected_posts = models.IntegerField(default=0)
+    draft_posts = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    shares = models.IntegerField(default=0)
+    communities = models.IntegerField(default=0)
+    products = models.IntegerField(default=0)
+    # Distinct users who created a post that day
+    active_users = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'Daily metrics'
+
+    def __str__(self):
+        return f"Metrics for {self.date}"
+
 # Automatically create profile when user is created
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance, display_name=instance.username)
+        ProfileStats.objects.create(user=instance)
 
 @receiver(post_delete, sender=Profile)
 def delete_profile_images(sender, instance, **kwargs):
@@ -65,11 +126,27 @@ def delete_profile_images(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    # A login only writes last_login; re-saving the profile would touch its updated_at
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
     if hasattr(instance, 'profile'):
         instance.profile.save()
 
 
+@receiver(m2m_changed, sender=Profile.subcategories.through)
+def bump_profile_interests_version(sender, instance, action, reverse, pk_set, **kwargs):
+    """Interest edits don't touch Profile.updated_at; invalidate the profile ETag"""
+    if not action.startswith('post_'):
+        return
+    from utils.conditional import bump
+    if not reverse:
+        bump('profile', instance.user_id)
+    elif pk_set:
+        for user_id in Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True):
+            bump('profile', user_id)
+
+
 class Contact(models.Model):
     """Model to store contact form submissions"""
     first_name = models.CharField(max_length=100)
@@ -94,4 +171,11 @@ class Contact(models.Model):
         verbose_name_plural = 'Contact Submissions'
 
     def __str__(self):
-        return f"{self.first_name} {self.last_name} - {self.subject}"
\ No newline at end of file
+        return f"{self.first_name} {self.last_name} - {self.subject}"
+
+# Shared response cache (utils/response_cache.py)
+from utils.response_cache import invalidate_on
+
+# Logging in only saves last_login; public_users shows it, but its 30s TTL covers that
+invalidate_on(User, 'users', ignore_fields=['last_login'])
+invalidate_on(Profile, 'users')
@@ -0,0 +1,109 @@
+# accounts/profile_stats.py
+"""
+Read and maintain the denormalized ProfileStats counters.
+
+Writers adjust existing rows with F() expressions inside the caller's
+transaction. A user without a row (e.g. created before the table existed)
+is skipped by writers and gets a row built from the source tables on the
+next read. Concurrent reads may both build it: the insert ignores the
+conflict and the rows are read back, so both return the stored values.
+The rebuild_profile_stats management command recounts everyone.
+"""
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import ProfileStats
+
+FIELDS = ('followers_count', 'following_count', 'posts_count')
+
+
+def _as_dict(stats):
+    # Clamp so drift never shows a negative number before the next rebuild
+    return {field: max(0, getattr(stats, field)) for field in FIELDS}
+
+
+def counts_from_db(user_ids):
+    """Return {user_id: {field: count}} for many users with three GROUP BY queries"""
+    from post.models import Follow, Post
+
+    user_ids = list(user_ids)
+    counts = {user_id: dict.fromkeys(FIELDS, 0) for user_id in user_ids}
+
+    for user_id, count in (
+        Follow.objects.filter(following_id__in=user_ids)
+        .values('following_id').annotate(count=Count('id'))
+        .values_list('following_id', 'count')
+    ):
+        counts[user_id]['followers_count'] = count
+
+    for user_id, count in (
+        Follow.objects.filter(follower_id__in=user_ids)
+        .values('follower_id').annotate(count=Count('id'))
+        .values_list('follower_id', 'count')
+    ):
+        counts[user_id]['following_count'] = count
+
+    for user_id, count in (
+        Post.objects.filter(user_id__in=user_ids, status='approved')
+        .values('user_id').annotate(count=Count('id'))
+        .values_list('user_id', 'count')
+    ):
+        counts[user_id]['posts_count'] = count
+
+    return counts
+
+
+def adjust(user_id, **deltas):
+    """Add deltas (e.g. followers_count=1) to a user's existing stats row"""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if user_id and updates:
+        ProfileStats.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **updates)
+
+
+def get_many(user_ids):
+    """Return {user_id: stats dict}, building rows for users that have none"""
+    user_ids = list(user_ids)
+    result = {
+        stats.user_id: _as_dict(stats)
+        for stats in ProfileStats.objects.filter(user_id__in=user_ids)
+    }
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if missing:
+        counts = counts_from_db(missing)
+        ProfileStats.objects.bulk_create(
+            [ProfileStats(user_id=user_id, **values) for user_id, values in counts.items()],
+            ignore_conflicts=True
+        )
+        # A concurrent request may have built (and a writer adjusted) some of these rows first
+        result.update(counts)
+        result.update(
+            (stats.user_id, _as_dict(stats))
+            for stats in ProfileStats.objects.filter(user_id__in=missing)
+        )
+    return result
+
+
+def get_stats(user_id):
+    """Return the stats dict for one user (a single-row read once built)"""
+    return get_many([user_id])[user_id]
+
+
+def for_user(user):
+    """Stats for a user instance, using select_related('stats') when it was applied"""
+    stats = getattr(user, 'stats', None)
+    if stats is None:
+        return get_stats(user.pk)
+    return _as_dict(stats)
+
+
+def rebuild(user_ids):
+    """Recount and overwrite the stats rows for the given users"""
+    counts = counts_from_db(user_ids)
+    now = timezone.now()
+    ProfileStats.objects.bulk_create(
+        [ProfileStats(user_id=user_id, updated_at=now, **values) for user_id, values in counts.items()],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=list(FIELDS) + ['updated_at'],
+    )
+    return len(counts)
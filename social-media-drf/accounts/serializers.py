@@ -39,8 +39,11 @@ class UserSerializer(serializers.ModelSerializer):
     def get_is_online(self, obj):
         """Check if user is online (from cache or last_login)"""
         from django.core.cache import cache
-        # Check cache first (set by WebSocket connections)
-        cached_status = cache.get(f'user_online_{obj.id}')
+        # Check cache first (set by WebSocket connections); list views pass the flags in
+        if 'online_status' in self.context:
+            cached_status = self.context['online_status'].get(obj.id)
+        else:
+            cached_status = cache.get(f'user_online_{obj.id}')
         if cached_status is not None:
             return cached_status
         
@@ -66,13 +69,17 @@ class UserSerializer(serializers.ModelSerializer):
         # REPORTED user is blocked by the REPORTER.
         # However, for a general serializer, we might want to know if blocked by the *viewer*.
         # For admin unified reports, we need to pass the reporter context.
+        # Both come from the blocker's cached block set (chats/blocks.py)
+        from chats import blocks
         reporter_id = self.context.get('reporter_id')
         if reporter_id:
-            from chats.models import BlockedUser
-            return BlockedUser.objects.filter(blocker_id=reporter_id, blocked=obj).exists()
+            return blocks.has_blocked(reporter_id, obj.id)
             
-        from chats.models import BlockedUser
-        return BlockedUser.objects.filter(blocker=request.user, blocked=obj).exists()
+        # Views that already know whom the viewer blocked pass the ids in
+        if 'blocked_ids' in self.context:
+            return obj.id in self.context['blocked_ids']
+
+        return blocks.has_blocked(request.user.id, obj.id)
 
 
 class AdminUserSerializer(serializers.ModelSerializer):
@@ -264,19 +271,24 @@ class ProfileSerializer(serializers.ModelSerializer):
             return obj.user == request.user
         return False
 
+    def _stats(self, obj):
+        """Denormalized counters, loaded once per serialized profile"""
+        if not hasattr(obj, '_profile_stats'):
+            from accounts.profile_stats import for_user
+            obj._profile_stats = for_user(obj.user)
+        return obj._profile_stats
+
     def get_posts_count(self, obj):
         """Get count of approved posts by this user"""
-        return obj.user.posts.filter(status='approved').count()
+        return self._stats(obj)['posts_count']
     
     def get_followers_count(self, obj):
         """Get count of users following this user"""
-        from post.models import Follow
-        return Follow.objects.filter(following=obj.user).count()
+        return self._stats(obj)['followers_count']
     
     def get_following_count(self, obj):
         """Get count of users this user is following"""
-        from post.models import Follow
-        return Follow.objects.filter(follower=obj.user).count()
+        return self._stats(obj)['following_count']
     
     def get_communities_count(self, obj):
         """Get count of communities this user is a member of"""
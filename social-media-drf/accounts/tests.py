@@ -1,3 +1,248 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from utils import response_cache
+from utils.testing import client_for, make_user
+
+from . import daily_metrics, profile_stats, time_series
+from .models import DailyMetrics, ProfileStats, User
+
+
+def body(response):
+    """The bytes of a streamed response, read the way an ASGI server reads them"""
+    async def read():
+        return b''.join([part async for part in response.streaming_content])
+    return async_to_sync(read)()
+
+
+class ExportTests(TestCase):
+    url = '/auth/admin/users/export/'
+
+    def setUp(self):
+        self.admin = make_user('admin', role='admin')
+        for i in range(5):
+            make_user(f'user{i}')
+
+    def test_csv_streams_every_row_from_an_async_body(self):
+        response = client_for(self.admin).get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(body(response).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'username', 'email'])
+        self.assertEqual(len(rows), 1 + User.objects.count())
+
+    def test_ndjson(self):
+        response = client_for(self.admin).get(self.url, {'export_format': 'ndjson'})
+        lines = [json.loads(line) for line in body(response).decode().splitlines()]
+        self.assertEqual({line['username'] for line in lines}, set(User.objects.values_list('username', flat=True)))
+
+    def test_gzip(self):
+        response = client_for(self.admin).get(self.url, {'gzip': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        self.assertTrue(gzip.decompress(body(response)).startswith(b'id,username,email'))
+
+    def test_unknown_format_is_rejected(self):
+        response = client_for(self.admin).get(self.url, {'export_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admins_only(self):
+        response = client_for(User.objects.get(username='user0')).get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+
+class ProfileStatsTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def toggle_follow(self, user, other):
+        return client_for(user).post('/api/follows/toggle_follow/', {'following_id': other.id}, format='json')
+
+    def test_follow_and_unfollow_adjust_both_users(self):
+        self.assertEqual(self.toggle_follow(self.alice, self.bob).status_code, 201)
+        self.assertEqual(profile_stats.get_stats(self.alice.id)['following_count'], 1)
+        self.assertEqual(profile_stats.get_stats(self.bob.id)['followers_count'], 1)
+        self.assertEqual(self.toggle_follow(self.alice, self.bob).status_code, 200)
+        self.assertEqual(profile_stats.get_stats(self.alice.id)['following_count'], 0)
+        self.assertEqual(profile_stats.get_stats(self.bob.id)['followers_count'], 0)
+
+    def test_missing_row_is_built_from_the_source_tables(self):
+        self.toggle_follow(self.alice, self.bob)
+        ProfileStats.objects.filter(user=self.bob).delete()
+        self.assertEqual(profile_stats.get_stats(self.bob.id)['followers_count'], 1)
+        self.assertEqual(ProfileStats.objects.get(user=self.bob).followers_count, 1)
+
+    def test_row_built_concurrently_wins(self):
+        ProfileStats.objects.filter(user=self.bob).delete()
+        counts_from_db = profile_stats.counts_from_db
+
+        def racing_build(user_ids):
+            counts = counts_from_db(user_ids)
+            # Another request builds the row, and a follow adjusts it, before this insert
+            ProfileStats.objects.create(user=self.bob, followers_count=1)
+            return counts
+
+        with mock.patch.object(profile_stats, 'counts_from_db', side_effect=racing_build):
+            self.assertEqual(profile_stats.get_stats(self.bob.id)['followers_count'], 1)
+
+
+class UsersTagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+
+    def generation(self):
+        return response_cache._tag_generations(['users'])[0]
+
+    def test_login_leaves_the_users_tag_alone(self):
+        before = self.generation()
+        update_last_login(None, self.alice)
+        self.assertEqual(self.generation(), before)
+
+    def test_other_user_changes_invalidate_it(self):
+        before = self.generation()
+        self.alice.username = 'alice2'
+        self.alice.save(update_fields=['username', 'last_login'])
+        self.assertNotEqual(self.generation(), before)
+
+
+class DailyMetricsTests(TestCase):
+    def setUp(self):
+        from post.models import Post
+
+        self.today = timezone.localdate()
+        self.alice = make_user('alice')
+        self.posts = {}
+        for age in (3, 30):
+            day = self.today - timedelta(days=age)
+            post = Post.objects.create(user=self.alice, title=f'{age} days old', post_type='text', status='pending')
+            Post.objects.filter(id=post.id).update(created_at=daily_metrics.start_of(day) + timedelta(hours=12))
+            self.posts[day] = post
+        daily_metrics.rollup(self.today - timedelta(days=30), self.today - timedelta(days=1))
+
+    def approve_all(self):
+        from post.models import Post
+        Post.objects.filter(id__in=[post.id for post in self.posts.values()]).update(status='approved')
+
+    def approved_by_day(self, start):
+        return {row['date']: row['approved_posts'] for row in daily_metrics.series(start, self.today)}
+
+    def test_series_recounts_stale_days_in_the_trailing_window(self):
+        self.approve_all()
+        DailyMetrics.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+        approved = self.approved_by_day(self.today - timedelta(days=30))
+        self.assertEqual(approved[self.today - timedelta(days=3)], 1)
+        # Older days stay as they were rolled up
+        self.assertEqual(approved[self.today - timedelta(days=30)], 0)
+
+    def test_series_never_writes(self):
+        self.approve_all()
+        DailyMetrics.objects.filter(date=self.today - timedelta(days=5)).delete()
+        DailyMetrics.objects.update(updated_at=timezone.now() - timedelta(hours=2))
+        with CaptureQueriesContext(connection) as queries:
+            self.approved_by_day(self.today - timedelta(days=30))
+        self.assertTrue(all(query['sql'].lstrip().upper().startswith('SELECT') for query in queries))
+        self.assertEqual(DailyMetrics.objects.get(date=self.today - timedelta(days=3)).approved_posts, 0)
+        self.assertFalse(DailyMetrics.objects.filter(date=self.today - timedelta(days=5)).exists())
+
+    def test_rolling_totals_count_the_partial_first_day_live(self):
+        from post.models import Post
+
+        since = daily_metrics.start_of(self.today - timedelta(days=3)) + timedelta(hours=12)
+        before = Post.objects.create(user=self.alice, title='before', post_type='text')
+        after = Post.objects.create(user=self.alice, title='after', post_type='text')
+        Post.objects.filter(id=before.id).update(created_at=since - timedelta(minutes=1))
+        Post.objects.filter(id=after.id).update(created_at=since + timedelta(minutes=1))
+        daily_metrics.rollup(self.today - timedelta(days=3), self.today - timedelta(days=1))
+
+        rows = daily_metrics.series(self.today - timedelta(days=30), self.today)
+        # The setUp post sits at noon exactly, so it is inside the window too
+        self.assertEqual(daily_metrics.rolling_totals(rows, since, 'posts'), {'posts': 2})
+
+    def test_dashboard_reports_rolling_windows(self):
+        admin = client_for(make_user('root', role='admin'))
+        data = admin.get('/auth/admin/dashboard-analytics/').data['data']
+        self.assertEqual(len(data['activity_timeline']), 30)
+        # The post 30 days back may fall either side of now - 30d; the 3-day-old one never does
+        self.assertEqual(data['recent_activity_7d']['new_posts'], 1)
+        self.assertIn(data['recent_activity_30d']['new_posts'], (1, 2))
+
+    def test_fresh_rollups_are_reused(self):
+        # One read, plus compute()'s seven GROUP BY queries for today
+        with self.assertNumQueries(1 + 7):
+            self.approved_by_day(self.today - timedelta(days=10))
+
+    def test_command_rerolls_the_trailing_window(self):
+        self.approve_all()
+        call_command('rollup_daily_metrics', stdout=io.StringIO())
+        self.assertEqual(DailyMetrics.objects.get(date=self.today - timedelta(days=3)).approved_posts, 1)
+        self.assertEqual(DailyMetrics.objects.get(date=self.today - timedelta(days=30)).approved_posts, 0)
+
+
+class TimeSeriesTests(TestCase):
+    def setUp(self):
+        from post.models import Post
+
+        self.today = timezone.localdate()
+        alice = make_user('alice')
+        for age in (0, 1, 6, 7, 13, 29, 31, 45, 62, 80):
+            for copy in range(age % 3 + 1):
+                post = Post.objects.create(user=alice, title=f'{age}/{copy}', post_type='text', status='approved')
+                shared = Post.objects.create(user=alice, title='shared', post_type='text', shared_from=post)
+                moment = daily_metrics.start_of(self.today - timedelta(days=age)) + timedelta(hours=copy)
+                Post.objects.filter(id__in=[post.id, shared.id]).update(created_at=moment)
+        # Part of the range is rolled up, the rest is counted on read
+        daily_metrics.rollup(self.today - timedelta(days=50), self.today - timedelta(days=10))
+
+    def assertSameSeries(self, granularity):
+        from post.models import Post
+
+        end = timezone.now()
+        start = end - timedelta(days=90)
+        raw = time_series.series(
+            Post.objects.filter(shared_from__isnull=True), 'created_at', start, end, granularity, cumulative=True
+        )
+        rolled = time_series.rollup_series('posts', start, end, granularity, cumulative=True)
+        self.assertEqual(rolled, raw)
+        self.assertEqual(raw[-1]['cumulative'], Post.objects.filter(shared_from__isnull=True).count())
+
+    def test_day_rollup_matches_the_raw_counts(self):
+        self.assertSameSeries('day')
+
+    def test_week_rollup_matches_the_raw_counts(self):
+        self.assertSameSeries('week')
+
+    def test_month_rollup_matches_the_raw_counts(self):
+        self.assertSameSeries('month')
+
+    def test_hour_series_of_a_rollup_counts_its_source(self):
+        end = timezone.now()
+        points = time_series.rollup_series('posts', end - timedelta(days=2), end, 'hour')
+        self.assertEqual(sum(point['value'] for point in points), 1 + 2)
+
+    def test_rollups_that_are_not_row_counts_are_rejected(self):
+        with self.assertRaises(ValueError):
+            time_series.rollup_series('active_users', timezone.now() - timedelta(days=7), timezone.now())
 
-# Create your tests here.
+    def test_analytics_views(self):
+        admin = client_for(make_user('root', role='admin'))
+        for name in ('post', 'user', 'service', 'subscription'):
+            response = admin.get(f'/auth/admin/{name}-analytics/', {'granularity': 'week', 'cumulative': 'true'})
+            self.assertEqual(response.status_code, 200, name)
+        posts = admin.get('/auth/admin/post-analytics/').data['data']['post_analytics']
+        self.assertEqual(sum(point['new'] for point in posts), 1 + 2 + 1 + 2 + 2 + 3)
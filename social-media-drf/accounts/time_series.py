@@ -0,0 +1,141 @@
+# accounts/time_series.py
+"""
+Zero-filled time series for the admin analytics views.
+
+series() counts rows of a queryset per hour/day/week/month bucket of a
+timestamp field with a single Trunc + GROUP BY query, then fills the
+buckets that had no rows with zeros. rollup_series() reads day and coarser
+series from a DailyMetrics field instead (see accounts/daily_metrics.py),
+which turns the scan of the source table into a scan of one row per day.
+It takes no queryset: the rollup fixes which rows are counted.
+Buckets follow the current timezone; weeks start on Monday.
+"""
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import daily_metrics
+
+TRUNC = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+GRANULARITIES = tuple(TRUNC)
+
+# Guard against accidentally asking for millions of buckets
+MAX_BUCKETS = 5000
+
+
+def floor(moment, granularity):
+    """Start of the bucket containing `moment` (an aware datetime)"""
+    local = timezone.localtime(moment)
+    if granularity == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.date()
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    elif granularity == 'month':
+        day = day.replace(day=1)
+    return daily_metrics.start_of(day)
+
+
+def next_bucket(bucket, granularity):
+    """Start of the bucket after `bucket`"""
+    if granularity == 'hour':
+        return timezone.localtime(bucket + timedelta(hours=1))
+    day = timezone.localtime(bucket).date()
+    if granularity == 'day':
+        day += timedelta(days=1)
+    elif granularity == 'week':
+        day += timedelta(days=7)
+    else:
+        day = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return daily_metrics.start_of(day)
+
+
+def buckets(start, end, granularity):
+    """Bucket starts covering start..end (both aware datetimes, end inclusive)"""
+    result = []
+    bucket = floor(start, granularity)
+    while bucket <= end:
+        result.append(bucket)
+        if len(result) > MAX_BUCKETS:
+            raise ValueError(f"Range spans more than {MAX_BUCKETS} {granularity} buckets")
+        bucket = next_bucket(bucket, granularity)
+    return result
+
+
+def _span(start, end, granularity):
+    if granularity not in TRUNC:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    starts = buckets(start, end, granularity)
+    return starts, (starts[0], next_bucket(starts[-1], granularity)) if starts else None
+
+
+def _points(starts, values, queryset, field, lower, cumulative):
+    points = [{'start': bucket, 'value': values[bucket]} for bucket in starts]
+    if cumulative:
+        running = queryset.filter(**{f'{field}__lt': lower}).count()
+        for point in points:
+            running += point['value']
+            point['cumulative'] = running
+    return points
+
+
+def series(queryset, field, start, end, granularity='day', cumulative=False):
+    """
+    Count rows per bucket between start and end (inclusive).
+
+    `queryset` is a model or a filtered queryset, `field` the timestamp to
+    bucket on. With cumulative=True each point also carries the running
+    total including rows before `start`.
+    Returns [{'start': aware datetime, 'value': n[, 'cumulative': n]}].
+    """
+    if isinstance(queryset, type):
+        queryset = queryset._default_manager.all()
+    starts, bounds = _span(start, end, granularity)
+    if not starts:
+        return []
+    lower, upper = bounds
+    values = dict.fromkeys(starts, 0)
+
+    rows = (
+        queryset.filter(**{f'{field}__gte': lower, f'{field}__lt': upper})
+        .annotate(bucket=TRUNC[granularity](field))
+        .order_by()
+        .values('bucket')
+        .annotate(count=Count('pk'))
+    )
+    for row in rows:
+        bucket = timezone.localtime(row['bucket'])
+        if bucket in values:
+            values[bucket] += row['count']
+    return _points(starts, values, queryset, field, lower, cumulative)
+
+
+def rollup_series(rollup, start, end, granularity='day', cumulative=False):
+    """
+    series() of the rows counted by the DailyMetrics field `rollup`.
+
+    Day, week and month buckets sum the daily rows; hour buckets and the
+    running total before `start` are counted from daily_metrics.source().
+    """
+    queryset, field = daily_metrics.source(rollup)
+    if granularity == 'hour':
+        return series(queryset, field, start, end, granularity, cumulative)
+    starts, bounds = _span(start, end, granularity)
+    if not starts:
+        return []
+    lower, upper = bounds
+    values = dict.fromkeys(starts, 0)
+
+    last_day = timezone.localtime(upper).date() - timedelta(days=1)
+    for row in daily_metrics.series(timezone.localtime(lower).date(), last_day):
+        bucket = floor(daily_metrics.start_of(row['date']), granularity)
+        if bucket in values:
+            values[bucket] += row[rollup]
+    return _points(starts, values, queryset, field, lower, cumulative)
@@ -20,6 +20,7 @@ urlpatterns = [
     path('password-reset/reset/', ResetPasswordView.as_view(), name='reset-password'),
     # Admin endpoints
     path('admin/users/', AdminUsersListView.as_view(), name='admin-users'),
+    path('admin/users/export/', AdminUsersExportView.as_view(), name='admin-users-export'),
     path('admin/users/<int:user_id>/block/', AdminBlockUserView.as_view(), name='admin-block-user'),
     path('admin/users/<int:user_id>/unblock/', AdminBlockUserView.as_view(), name='admin-unblock-user'),
     path('admin/users/<int:user_id>/delete/', AdminDeleteUserView.as_view(), name='admin-delete-user'),
@@ -29,8 +30,11 @@ urlpatterns = [
     path('admin/service-analytics/', ServiceAnalyticsView.as_view(), name='service-analytics'),
     path('admin/subscription-analytics/', SubscriptionAnalyticsView.as_view(), name='subscription-analytics'),
     path('admin/payments/', AdminPaymentListView.as_view(), name='admin-payments'),
+    path('admin/payments/export/', AdminPaymentsExportView.as_view(), name='admin-payments-export'),
     path('admin/subscriptions/', AdminSubscriptionListView.as_view(), name='admin-subscriptions'),
+    path('admin/subscriptions/export/', AdminSubscriptionsExportView.as_view(), name='admin-subscriptions-export'),
     path('admin/communities/', AdminCommunitiesListView.as_view(), name='admin-communities'),
+    path('admin/response-cache/', ResponseCacheStatsView.as_view(), name='admin-response-cache'),
     path('communities/<int:community_id>/delete/', AdminDeleteCommunityView.as_view(), name='delete-community'),
     # Public endpoints (for authenticated users)
     path('users/', PublicUsersListView.as_view(), name='public-users'),
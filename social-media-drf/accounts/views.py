@@ -22,6 +22,11 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import PermissionDenied, NotFound
 from rest_framework.decorators import action
+from utils.conditional import conditional, make_etag, latest, versions
+from . import daily_metrics, time_series
+from utils import response_cache
+from utils.response_cache import cached_response
+from utils.exports import ExportView
 from .models import *
 from .serializers import (
     SendOTPSerializer, VerifyOTPSerializer, SetCredentialsSerializer,
@@ -256,55 +261,61 @@ class LoginView(APIView):
 
 
 """ Admin Users List View """
+def _admin_users_queryset(request):
+    """Users matching the admin list filters (status, start_date, end_date, search)"""
+    from datetime import datetime
+    from django.db.models import Q
+    
+    users = User.objects.select_related('profile').prefetch_related('profile__subcategories').all()
+    
+    # Filter by status (is_active)
+    status_filter = request.query_params.get('status', None)
+    if status_filter:
+        if status_filter == 'active':
+            users = users.filter(is_active=True)
+        elif status_filter == 'inactive':
+            users = users.filter(is_active=False)
+    
+    # Filter by date range
+    start_date = request.query_params.get('start_date', None)
+    end_date = request.query_params.get('end_date', None)
+    
+    if start_date:
+        try:
+            date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+            users = users.filter(date_joined__date__gte=date_obj)
+        except (ValueError, TypeError):
+            pass  # Invalid date format, ignore
+    
+    if end_date:
+        try:
+            date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+            users = users.filter(date_joined__date__lte=date_obj)
+        except (ValueError, TypeError):
+            pass  # Invalid date format, ignore
+    
+    # Filter by search keyword (display_name or email)
+    search_query = request.query_params.get('search', None)
+    if search_query:
+        search_query = search_query.strip()
+        if search_query:
+            users = users.filter(
+                Q(email__icontains=search_query) |
+                Q(profile__display_name__icontains=search_query) |
+                Q(username__icontains=search_query)
+            )
+    
+    users = users.order_by('-date_joined')
+    return users
+
+
 class AdminUsersListView(APIView):
     """Get all users for admin panel"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     
     def get(self, request):
         """Get all users with additional information"""
-        from datetime import datetime
-        from django.db.models import Q
-        
-        users = User.objects.select_related('profile').prefetch_related('profile__subcategories').all()
-        
-        # Filter by status (is_active)
-        status_filter = request.query_params.get('status', None)
-        if status_filter:
-            if status_filter == 'active':
-                users = users.filter(is_active=True)
-            elif status_filter == 'inactive':
-                users = users.filter(is_active=False)
-        
-        # Filter by date range
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        
-        if start_date:
-            try:
-                date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                users = users.filter(date_joined__date__gte=date_obj)
-            except (ValueError, TypeError):
-                pass  # Invalid date format, ignore
-        
-        if end_date:
-            try:
-                date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                users = users.filter(date_joined__date__lte=date_obj)
-            except (ValueError, TypeError):
-                pass  # Invalid date format, ignore
-        
-        # Filter by search keyword (display_name or email)
-        search_query = request.query_params.get('search', None)
-        if search_query:
-            search_query = search_query.strip()
-            if search_query:
-                users = users.filter(
-                    Q(email__icontains=search_query) |
-                    Q(profile__display_name__icontains=search_query) |
-                    Q(username__icontains=search_query)
-                )
-        
-        users = users.order_by('-date_joined')
+        users = _admin_users_queryset(request)
         
         serializer = AdminUserSerializer(users, many=True, context={'request': request})
         
@@ -532,6 +543,8 @@ class PublicUsersListView(APIView):
     """Get all users for authenticated users (not just admins)"""
     permission_classes = [permissions.IsAuthenticated]
     
+    # Per viewer (is_blocked_locally); short TTL because is_online moves
+    @cached_response('public_users', ttl=30, vary='user', tags=('users', 'blocks'))
     def get(self, request):
         """Get all users with basic information"""
         users = User.objects.select_related('profile').all().order_by('-date_joined')
@@ -551,6 +564,8 @@ class PublicStatsView(APIView):
     """Get public statistics for About Us page - no authentication required"""
     permission_classes = []  # Public endpoint
     
+    # TTL only: post volume would invalidate a tag-based entry constantly
+    @cached_response('public_stats', ttl=300)
     def get(self, request):
         """Get basic platform statistics"""
         try:
@@ -584,6 +599,27 @@ class PublicStatsView(APIView):
             }, status=500)
 
 
+""" Response Cache Stats View """
+class ResponseCacheStatsView(APIView):
+    """Hit/miss counters of the shared response cache, for monitoring"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return Response({
+            "success": True,
+            "message": "Response cache statistics retrieved successfully",
+            "data": response_cache.stats()
+        }, status=200)
+
+    def delete(self, request):
+        response_cache.reset_stats()
+        return Response({
+            "success": True,
+            "message": "Response cache statistics reset",
+            "data": None
+        }, status=200)
+
+
 class DashboardAnalyticsView(APIView):
     """Get comprehensive dashboard analytics for admin panel"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
@@ -593,63 +629,106 @@ class DashboardAnalyticsView(APIView):
             now = timezone.now()
             seven_days_ago = now - timedelta(days=7)
             thirty_days_ago = now - timedelta(days=30)
-            ninety_days_ago = now - timedelta(days=90)
+
+            # Per-day counts for the last 90 days come from the DailyMetrics rollup
+            today = timezone.localdate()
+            ninety_days_start = today - timedelta(days=89)
+            daily = daily_metrics.series(ninety_days_start, today)
+            daily_30d = daily[-30:]
         
             # ========== BASIC COUNTS ==========
-            total_users = User.objects.count()
-            # Exclude shared posts from main count (shared posts are duplicates)
-            total_posts = Post.objects.filter(shared_from__isnull=True).count()
-            total_shared_posts = Post.objects.filter(shared_from__isnull=False).count()
-            total_communities = Community.objects.count()
-            total_products = Product.objects.count()
-            total_comments = Comment.objects.count()
-            total_likes = Like.objects.count()
-            total_shares = Share.objects.count()
+            # One conditional aggregate per table instead of a COUNT per figure;
+            # shared posts are excluded from the main post figures (they are duplicates)
+            original = Q(shared_from__isnull=True)
+            post_counts = Post.objects.aggregate(
+                total_posts=Count('id', filter=original),
+                total_shared_posts=Count('id', filter=Q(shared_from__isnull=False)),
+                approved=Count('id', filter=original & Q(status='approved')),
+                rejected=Count('id', filter=original & Q(status='rejected')),
+                pending=Count('id', filter=original & Q(status='pending')),
+                draft=Count('id', filter=original & Q(status='draft')),
+                approved_shared=Count('id', filter=Q(shared_from__isnull=False, status='approved')),
+                text=Count('id', filter=original & Q(post_type='text')),
+                media=Count('id', filter=original & Q(post_type='media')),
+                link=Count('id', filter=original & Q(post_type='link')),
+            )
+            on_original_post = Q(post__shared_from__isnull=True)
+            like_counts = Like.objects.aggregate(total=Count('id'), on_posts=Count('id', filter=on_original_post))
+            comment_counts = Comment.objects.aggregate(total=Count('id'), on_posts=Count('id', filter=on_original_post))
+            share_counts = Share.objects.aggregate(total=Count('id'), on_posts=Count('id', filter=on_original_post))
+            user_counts = User.objects.aggregate(
+                total=Count('id'),
+                verified=Count('id', filter=Q(email_verified=True)),
+                unverified=Count('id', filter=Q(email_verified=False)),
+            )
+            community_counts = Community.objects.aggregate(
+                total=Count('id'),
+                public=Count('id', filter=Q(visibility='public')),
+                restricted=Count('id', filter=Q(visibility='restricted')),
+                private=Count('id', filter=Q(visibility='private')),
+            )
+            published = Q(status='published')
+            product_counts = Product.objects.aggregate(
+                total=Count('id'),
+                published=Count('id', filter=published),
+                draft=Count('id', filter=Q(status='draft')),
+                sold=Count('id', filter=Q(status='sold')),
+                unpublished=Count('id', filter=Q(status='unpublished')),
+                services_with_links=Count('id', filter=published & Q(link__isnull=False) & ~Q(link='')),
+            )
+
+            total_users = user_counts['total']
+            total_posts = post_counts['total_posts']
+            total_shared_posts = post_counts['total_shared_posts']
+            total_communities = community_counts['total']
+            total_products = product_counts['total']
+            total_comments = comment_counts['total']
+            total_likes = like_counts['total']
+            total_shares = share_counts['total']
         
             # ========== POST STATUS BREAKDOWN ==========
-            # Exclude shared posts from status breakdown
-            approved_posts = Post.objects.filter(status='approved', shared_from__isnull=True).count()
-            rejected_posts = Post.objects.filter(status='rejected', shared_from__isnull=True).count()
-            pending_posts = Post.objects.filter(status='pending', shared_from__isnull=True).count()
-            draft_posts = Post.objects.filter(status='draft', shared_from__isnull=True).count()
-            approved_shared_posts = Post.objects.filter(status='approved', shared_from__isnull=False).count()
+            approved_posts = post_counts['approved']
+            rejected_posts = post_counts['rejected']
+            pending_posts = post_counts['pending']
+            draft_posts = post_counts['draft']
+            approved_shared_posts = post_counts['approved_shared']
         
             # ========== POST TYPE BREAKDOWN ==========
-            # Exclude shared posts from type breakdown
-            text_posts = Post.objects.filter(post_type='text', shared_from__isnull=True).count()
-            media_posts = Post.objects.filter(post_type='media', shared_from__isnull=True).count()
-            link_posts = Post.objects.filter(post_type='link', shared_from__isnull=True).count()
+            text_posts = post_counts['text']
+            media_posts = post_counts['media']
+            link_posts = post_counts['link']
         
             # ========== ENGAGEMENT METRICS ==========
             total_engagement = total_likes + (total_comments * 2) + (total_shares * 3)
-            # Calculate averages excluding shared posts
-            avg_likes_per_post = Post.objects.filter(shared_from__isnull=True).annotate(likes_count=Count('likes')).aggregate(
-            avg=Avg('likes_count')
-            )['avg'] or 0
-            avg_comments_per_post = Post.objects.filter(shared_from__isnull=True).annotate(comments_count=Count('comments')).aggregate(
-            avg=Avg('comments_count')
-            )['avg'] or 0
-            avg_shares_per_post = Post.objects.filter(shared_from__isnull=True).annotate(shares_count=Count('shares')).aggregate(
-            avg=Avg('shares_count')
-            )['avg'] or 0
+            # Averages per original post (shared posts excluded)
+            avg_likes_per_post = like_counts['on_posts'] / total_posts if total_posts else 0
+            avg_comments_per_post = comment_counts['on_posts'] / total_posts if total_posts else 0
+            avg_shares_per_post = share_counts['on_posts'] / total_posts if total_posts else 0
         
             # ========== RECENT ACTIVITY (7 DAYS) ==========
-            recent_users_7d = User.objects.filter(date_joined__gte=seven_days_ago).count()
-            recent_posts_7d = Post.objects.filter(created_at__gte=seven_days_ago, shared_from__isnull=True).count()
-            recent_shared_posts_7d = Post.objects.filter(created_at__gte=seven_days_ago, shared_from__isnull=False).count()
-            recent_comments_7d = Comment.objects.filter(created_at__gte=seven_days_ago).count()
-            recent_likes_7d = Like.objects.filter(created_at__gte=seven_days_ago).count()
-            recent_shares_7d = Share.objects.filter(created_at__gte=seven_days_ago).count()
-            recent_communities_7d = Community.objects.filter(created_at__gte=seven_days_ago).count()
-            recent_products_7d = Product.objects.filter(created_at__gte=seven_days_ago).count()
+            # Rolling windows: whole days from the rollup, the partial first day counted live
+            recent_7d = daily_metrics.rolling_totals(
+                daily, seven_days_ago, 'new_users', 'posts', 'shared_posts', 'comments', 'likes', 'shares', 'communities', 'products'
+            )
+            recent_users_7d = recent_7d['new_users']
+            recent_posts_7d = recent_7d['posts']
+            recent_shared_posts_7d = recent_7d['shared_posts']
+            recent_comments_7d = recent_7d['comments']
+            recent_likes_7d = recent_7d['likes']
+            recent_shares_7d = recent_7d['shares']
+            recent_communities_7d = recent_7d['communities']
+            recent_products_7d = recent_7d['products']
         
             # ========== RECENT ACTIVITY (30 DAYS) ==========
-            recent_users_30d = User.objects.filter(date_joined__gte=thirty_days_ago).count()
-            recent_posts_30d = Post.objects.filter(created_at__gte=thirty_days_ago, shared_from__isnull=True).count()
-            recent_shared_posts_30d = Post.objects.filter(created_at__gte=thirty_days_ago, shared_from__isnull=False).count()
-            recent_comments_30d = Comment.objects.filter(created_at__gte=thirty_days_ago).count()
-            recent_likes_30d = Like.objects.filter(created_at__gte=thirty_days_ago).count()
-            recent_shares_30d = Share.objects.filter(created_at__gte=thirty_days_ago).count()
+            recent_30d = daily_metrics.rolling_totals(
+                daily, thirty_days_ago, 'new_users', 'posts', 'shared_posts', 'comments', 'likes', 'shares'
+            )
+            recent_users_30d = recent_30d['new_users']
+            recent_posts_30d = recent_30d['posts']
+            recent_shared_posts_30d = recent_30d['shared_posts']
+            recent_comments_30d = recent_30d['comments']
+            recent_likes_30d = recent_30d['likes']
+            recent_shares_30d = recent_30d['shares']
         
             # ========== USER ACTIVITY METRICS ==========
             # Get users who have been active (created posts, likes, or comments)
@@ -668,13 +747,13 @@ class DashboardAnalyticsView(APIView):
                 logger.error(f"Error calculating active_users_30d: {e}")
                 active_users_30d = 0
             
-            verified_users = User.objects.filter(email_verified=True).count()
-            unverified_users = User.objects.filter(email_verified=False).count()
+            verified_users = user_counts['verified']
+            unverified_users = user_counts['unverified']
         
             # ========== COMMUNITY ANALYTICS ==========
-            public_communities = Community.objects.filter(visibility='public').count()
-            restricted_communities = Community.objects.filter(visibility='restricted').count()
-            private_communities = Community.objects.filter(visibility='private').count()
+            public_communities = community_counts['public']
+            restricted_communities = community_counts['restricted']
+            private_communities = community_counts['private']
         
             # Top 10 communities by members
             try:
@@ -695,87 +774,35 @@ class DashboardAnalyticsView(APIView):
             } for comm in top_communities]
         
             # ========== MARKETPLACE ANALYTICS ==========
-            published_products = Product.objects.filter(status='published').count()
-            draft_products = Product.objects.filter(status='draft').count()
-            sold_products = Product.objects.filter(status='sold').count()
-            unpublished_products = Product.objects.filter(status='unpublished').count()
+            published_products = product_counts['published']
+            draft_products = product_counts['draft']
+            sold_products = product_counts['sold']
+            unpublished_products = product_counts['unpublished']
         
             # Service analytics (replacing price stats)
-            services_with_links = Product.objects.filter(status='published', link__isnull=False).exclude(link='').count()
+            services_with_links = product_counts['services_with_links']
             services_by_category = Product.objects.filter(status='published').values('sub_category__category__name').annotate(
                 count=Count('id')
             ).order_by('-count')[:5]
         
             # ========== ACTIVITY TIMELINE (30 DAYS) ==========
-            activity_data = []
-            for i in range(30):
-                day_start = thirty_days_ago + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                # Exclude shared posts from activity timeline
-                day_posts = Post.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end,
-                    shared_from__isnull=True
-                ).count()
-                
-                day_users = User.objects.filter(
-                    date_joined__gte=day_start,
-                    date_joined__lt=day_end
-                ).count()
-                
-                day_likes = Like.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                day_comments = Comment.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                day_shares = Share.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                activity_data.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
-                    'posts': day_posts,
-                    'users': day_users,
-                    'likes': day_likes,
-                    'comments': day_comments,
-                    'shares': day_shares,
-                })
+            activity_data = [{
+                'date': row['date'].strftime('%Y-%m-%d'),
+                'posts': row['posts'],
+                'users': row['new_users'],
+                'likes': row['likes'],
+                'comments': row['comments'],
+                'shares': row['shares'],
+            } for row in daily_30d]
         
             # ========== ENGAGEMENT TIMELINE (30 DAYS) ==========
-            engagement_timeline = []
-            for i in range(30):
-                day_start = thirty_days_ago + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                day_likes = Like.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                day_comments = Comment.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                day_shares = Share.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                engagement_timeline.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
-                    'likes': day_likes,
-                    'comments': day_comments,
-                    'shares': day_shares,
-                    'total': day_likes + (day_comments * 2) + (day_shares * 3),
-                })
+            engagement_timeline = [{
+                'date': row['date'].strftime('%Y-%m-%d'),
+                'likes': row['likes'],
+                'comments': row['comments'],
+                'shares': row['shares'],
+                'total': row['likes'] + (row['comments'] * 2) + (row['shares'] * 3),
+            } for row in daily_30d]
         
             # ========== TOP POSTS ==========
             # Top 10 most liked posts (exclude shared posts)
@@ -807,41 +834,27 @@ class DashboardAnalyticsView(APIView):
             top_engagement_serializer = PostSerializer(top_engagement_posts, many=True, context={'request': request})
         
             # ========== USER GROWTH TREND (90 DAYS) ==========
+            # Running totals start from everything created before the window
+            window_start = daily_metrics.start_of(ninety_days_start)
+            cumulative_users = User.objects.filter(date_joined__lt=window_start).count()
+            cumulative_posts = Post.objects.filter(created_at__lt=window_start, shared_from__isnull=True).count()
+
             user_growth = []
-            for i in range(90):
-                day_start = ninety_days_ago + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                cumulative_users = User.objects.filter(date_joined__lt=day_end).count()
-                new_users_today = User.objects.filter(
-                    date_joined__gte=day_start,
-                    date_joined__lt=day_end
-                ).count()
-                
+            post_growth = []
+            for row in daily:
+                cumulative_users += row['new_users']
+                cumulative_posts += row['posts']
                 user_growth.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
+                    'date': row['date'].strftime('%Y-%m-%d'),
                     'cumulative': cumulative_users,
-                    'new': new_users_today,
+                    'new': row['new_users'],
                 })
-            
-            # ========== POST GROWTH TREND (90 DAYS) ==========
-            post_growth = []
-            for i in range(90):
-                day_start = ninety_days_ago + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                # Exclude shared posts from growth trend
-                cumulative_posts = Post.objects.filter(created_at__lt=day_end, shared_from__isnull=True).count()
-                new_posts_today = Post.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end,
-                    shared_from__isnull=True
-                ).count()
-                
+                # ========== POST GROWTH TREND (90 DAYS) ==========
+                # Shared posts are excluded from the growth trend
                 post_growth.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
+                    'date': row['date'].strftime('%Y-%m-%d'),
                     'cumulative': cumulative_posts,
-                    'new': new_posts_today,
+                    'new': row['posts'],
                 })
             
             return Response({
@@ -966,82 +979,96 @@ class DashboardAnalyticsView(APIView):
             }, status=500)
 
 
+def _analytics_series(request, queryset=None, field=None, rollup=None):
+    """
+    Build the zero-filled series shared by the analytics views.
+
+    Pass either a DailyMetrics field as `rollup` or the queryset and
+    timestamp field to count.
+
+    Query params: start_date / end_date (YYYY-MM-DD, default the last 30
+    days, at most 2 years), granularity (hour/day/week/month, default day)
+    and cumulative=true to add running totals. Returns (points, date_range).
+    """
+    from datetime import datetime
+
+    start_date_str = request.query_params.get('start_date')
+    end_date_str = request.query_params.get('end_date')
+    granularity = request.query_params.get('granularity', 'day')
+    cumulative = request.query_params.get('cumulative', '').lower() == 'true'
+    if granularity not in time_series.GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(time_series.GRANULARITIES)}")
+
+    now = timezone.now()
+
+    # Parse dates or use defaults
+    try:
+        start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d')) if start_date_str else None
+    except ValueError:
+        start_date = None
+    start_date = start_date or now - timedelta(days=30)
+
+    try:
+        end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d')) if end_date_str else None
+        # Include the full end date
+        end_date = end_date.replace(hour=23, minute=59, second=59) if end_date else None
+    except ValueError:
+        end_date = None
+    end_date = end_date or now
+
+    # Ensure start_date is before end_date
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+
+    # Limit to reasonable range (max 2 years)
+    days_diff = (end_date - start_date).days + 1
+    if days_diff > 730:
+        days_diff = 730
+        start_date = end_date - timedelta(days=729)
+
+    label_format = '%Y-%m-%d %H:00' if granularity == 'hour' else '%Y-%m-%d'
+    points = [
+        {
+            'date': point['start'].strftime(label_format),
+            'new': point['value'],
+            **({'cumulative': point['cumulative']} if cumulative else {}),
+        }
+        for point in (
+            time_series.rollup_series(rollup, start_date, end_date, granularity=granularity, cumulative=cumulative)
+            if rollup else
+            time_series.series(queryset, field, start_date, end_date, granularity=granularity, cumulative=cumulative)
+        )
+    ]
+    date_range = {
+        "start_date": start_date.strftime('%Y-%m-%d'),
+        "end_date": end_date.strftime('%Y-%m-%d'),
+        "days": days_diff,
+        "granularity": granularity,
+    }
+    return points, date_range
+
+
 class PostAnalyticsView(APIView):
     """Get filtered post analytics based on date range"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
     def get(self, request):
         try:
-            from datetime import datetime
-            
-            # Get date range parameters
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-            
-            now = timezone.now()
-            
-            # Parse dates or use defaults
-            if start_date_str:
-                try:
-                    start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
-                except ValueError:
-                    start_date = now - timedelta(days=30)
-            else:
-                start_date = now - timedelta(days=30)
-            
-            if end_date_str:
-                try:
-                    end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d'))
-                    # Include the full end date
-                    end_date = end_date.replace(hour=23, minute=59, second=59)
-                except ValueError:
-                    end_date = now
-            else:
-                end_date = now
-            
-            # Ensure start_date is before end_date
-            if start_date > end_date:
-                start_date, end_date = end_date, start_date
-            
-            # Calculate number of days
-            days_diff = (end_date - start_date).days + 1
-            
-            # Limit to reasonable range (max 2 years)
-            if days_diff > 730:
-                days_diff = 730
-                start_date = end_date - timedelta(days=729)
-            
-            # Generate daily post analytics data
-            post_analytics = []
-            
-            for i in range(days_diff):
-                day_start = start_date + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                # Post analytics (exclude shared posts) - only new posts per day
-                new_posts = Post.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end,
-                    shared_from__isnull=True
-                ).count()
-                
-                post_analytics.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
-                    'new': new_posts,
-                })
-            
+            # Exclude shared posts - only new posts per bucket
+            post_analytics, date_range = _analytics_series(request, rollup='posts')
             return Response({
                 "success": True,
                 "message": "Post analytics retrieved successfully",
                 "data": {
                     "post_analytics": post_analytics,
-                    "date_range": {
-                        "start_date": start_date.strftime('%Y-%m-%d'),
-                        "end_date": end_date.strftime('%Y-%m-%d'),
-                        "days": days_diff,
-                    }
+                    "date_range": date_range,
                 }
             }, status=200)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "message": str(e)
+            }, status=400)
         except Exception as e:
             logger.error(f"Error in PostAnalyticsView: {str(e)}", exc_info=True)
             return Response({
@@ -1057,75 +1084,20 @@ class UserAnalyticsView(APIView):
 
     def get(self, request):
         try:
-            from datetime import datetime
-            
-            # Get date range parameters
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-            
-            now = timezone.now()
-            
-            # Parse dates or use defaults
-            if start_date_str:
-                try:
-                    start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
-                except ValueError:
-                    start_date = now - timedelta(days=30)
-            else:
-                start_date = now - timedelta(days=30)
-            
-            if end_date_str:
-                try:
-                    end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d'))
-                    # Include the full end date
-                    end_date = end_date.replace(hour=23, minute=59, second=59)
-                except ValueError:
-                    end_date = now
-            else:
-                end_date = now
-            
-            # Ensure start_date is before end_date
-            if start_date > end_date:
-                start_date, end_date = end_date, start_date
-            
-            # Calculate number of days
-            days_diff = (end_date - start_date).days + 1
-            
-            # Limit to reasonable range (max 2 years)
-            if days_diff > 730:
-                days_diff = 730
-                start_date = end_date - timedelta(days=729)
-            
-            # Generate daily user analytics data
-            user_analytics = []
-            
-            for i in range(days_diff):
-                day_start = start_date + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                # User analytics - only new users per day
-                new_users = User.objects.filter(
-                    date_joined__gte=day_start,
-                    date_joined__lt=day_end
-                ).count()
-                
-                user_analytics.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
-                    'new': new_users,
-                })
-            
+            user_analytics, date_range = _analytics_series(request, rollup='new_users')
             return Response({
                 "success": True,
                 "message": "User analytics retrieved successfully",
                 "data": {
                     "user_analytics": user_analytics,
-                    "date_range": {
-                        "start_date": start_date.strftime('%Y-%m-%d'),
-                        "end_date": end_date.strftime('%Y-%m-%d'),
-                        "days": days_diff,
-                    }
+                    "date_range": date_range,
                 }
             }, status=200)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "message": str(e)
+            }, status=400)
         except Exception as e:
             logger.error(f"Error in UserAnalyticsView: {str(e)}", exc_info=True)
             return Response({
@@ -1141,75 +1113,20 @@ class ServiceAnalyticsView(APIView):
 
     def get(self, request):
         try:
-            from datetime import datetime
-            
-            # Get date range parameters
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-            
-            now = timezone.now()
-            
-            # Parse dates or use defaults
-            if start_date_str:
-                try:
-                    start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
-                except ValueError:
-                    start_date = now - timedelta(days=30)
-            else:
-                start_date = now - timedelta(days=30)
-            
-            if end_date_str:
-                try:
-                    end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d'))
-                    # Include the full end date
-                    end_date = end_date.replace(hour=23, minute=59, second=59)
-                except ValueError:
-                    end_date = now
-            else:
-                end_date = now
-            
-            # Ensure start_date is before end_date
-            if start_date > end_date:
-                start_date, end_date = end_date, start_date
-            
-            # Calculate number of days
-            days_diff = (end_date - start_date).days + 1
-            
-            # Limit to reasonable range (max 2 years)
-            if days_diff > 730:
-                days_diff = 730
-                start_date = end_date - timedelta(days=729)
-            
-            # Generate daily service analytics data
-            service_analytics = []
-            
-            for i in range(days_diff):
-                day_start = start_date + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                # Service analytics - new services created per day
-                new_services = Product.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                service_analytics.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
-                    'new': new_services,
-                })
-            
+            service_analytics, date_range = _analytics_series(request, rollup='products')
             return Response({
                 "success": True,
                 "message": "Service analytics retrieved successfully",
                 "data": {
                     "service_analytics": service_analytics,
-                    "date_range": {
-                        "start_date": start_date.strftime('%Y-%m-%d'),
-                        "end_date": end_date.strftime('%Y-%m-%d'),
-                        "days": days_diff,
-                    }
+                    "date_range": date_range,
                 }
             }, status=200)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "message": str(e)
+            }, status=400)
         except Exception as e:
             logger.error(f"Error in ServiceAnalyticsView: {str(e)}", exc_info=True)
             return Response({
@@ -1225,75 +1142,20 @@ class SubscriptionAnalyticsView(APIView):
 
     def get(self, request):
         try:
-            from datetime import datetime
-            
-            # Get date range parameters
-            start_date_str = request.query_params.get('start_date')
-            end_date_str = request.query_params.get('end_date')
-            
-            now = timezone.now()
-            
-            # Parse dates or use defaults
-            if start_date_str:
-                try:
-                    start_date = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d'))
-                except ValueError:
-                    start_date = now - timedelta(days=30)
-            else:
-                start_date = now - timedelta(days=30)
-            
-            if end_date_str:
-                try:
-                    end_date = timezone.make_aware(datetime.strptime(end_date_str, '%Y-%m-%d'))
-                    # Include the full end date
-                    end_date = end_date.replace(hour=23, minute=59, second=59)
-                except ValueError:
-                    end_date = now
-            else:
-                end_date = now
-            
-            # Ensure start_date is before end_date
-            if start_date > end_date:
-                start_date, end_date = end_date, start_date
-            
-            # Calculate number of days
-            days_diff = (end_date - start_date).days + 1
-            
-            # Limit to reasonable range (max 2 years)
-            if days_diff > 730:
-                days_diff = 730
-                start_date = end_date - timedelta(days=729)
-            
-            # Generate daily subscription analytics data
-            subscription_analytics = []
-            
-            for i in range(days_diff):
-                day_start = start_date + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                # Subscription analytics - new subscriptions created per day
-                new_subscriptions = UserSubscription.objects.filter(
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                
-                subscription_analytics.append({
-                    'date': day_start.strftime('%Y-%m-%d'),
-                    'new': new_subscriptions,
-                })
-            
+            subscription_analytics, date_range = _analytics_series(request, UserSubscription.objects.all(), 'created_at')
             return Response({
                 "success": True,
                 "message": "Subscription analytics retrieved successfully",
                 "data": {
                     "subscription_analytics": subscription_analytics,
-                    "date_range": {
-                        "start_date": start_date.strftime('%Y-%m-%d'),
-                        "end_date": end_date.strftime('%Y-%m-%d'),
-                        "days": days_diff,
-                    }
+                    "date_range": date_range,
                 }
             }, status=200)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "message": str(e)
+            }, status=400)
         except Exception as e:
             logger.error(f"Error in SubscriptionAnalyticsView: {str(e)}", exc_info=True)
             return Response({
@@ -1303,6 +1165,24 @@ class SubscriptionAnalyticsView(APIView):
             }, status=500)
 
 
+def _admin_payments_queryset(request):
+    """Payments matching the admin list filters (status, payment_type, user_id), newest first"""
+    status_filter = request.query_params.get('status')
+    payment_type = request.query_params.get('payment_type')
+    user_id = request.query_params.get('user_id')
+    
+    queryset = Payment.objects.select_related('user', 'subscription', 'subscription__plan').all()
+    
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    if payment_type:
+        queryset = queryset.filter(payment_type=payment_type)
+    if user_id:
+        queryset = queryset.filter(user_id=user_id)
+    
+    return queryset.order_by('-created_at')
+
+
 class AdminPaymentListView(APIView):
     """Get all payments for admin panel"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
@@ -1312,25 +1192,10 @@ class AdminPaymentListView(APIView):
             from marketplace.payment_serializers import PaymentSerializer
             
             # Get query parameters
-            status_filter = request.query_params.get('status')
-            payment_type = request.query_params.get('payment_type')
-            user_id = request.query_params.get('user_id')
             page = int(request.query_params.get('page', 1))
             page_size = int(request.query_params.get('page_size', 20))
             
-            # Build queryset
-            queryset = Payment.objects.select_related('user', 'subscription', 'subscription__plan').all()
-            
-            # Apply filters
-            if status_filter:
-                queryset = queryset.filter(status=status_filter)
-            if payment_type:
-                queryset = queryset.filter(payment_type=payment_type)
-            if user_id:
-                queryset = queryset.filter(user_id=user_id)
-            
-            # Order by created_at descending
-            queryset = queryset.order_by('-created_at')
+            queryset = _admin_payments_queryset(request)
             
             # Pagination
             total_count = queryset.count()
@@ -1374,6 +1239,24 @@ class AdminPaymentListView(APIView):
             }, status=500)
 
 
+def _admin_subscriptions_queryset(request):
+    """Subscriptions matching the admin list filters (status, plan_id, user_id), newest first"""
+    status_filter = request.query_params.get('status')
+    plan_id = request.query_params.get('plan_id')
+    user_id = request.query_params.get('user_id')
+    
+    queryset = UserSubscription.objects.select_related('user', 'plan').all()
+    
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    if plan_id:
+        queryset = queryset.filter(plan_id=plan_id)
+    if user_id:
+        queryset = queryset.filter(user_id=user_id)
+    
+    return queryset.order_by('-created_at')
+
+
 class AdminSubscriptionListView(APIView):
     """Get all user subscriptions for admin panel"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
@@ -1383,25 +1266,10 @@ class AdminSubscriptionListView(APIView):
             from marketplace.payment_serializers import UserSubscriptionSerializer
             
             # Get query parameters
-            status_filter = request.query_params.get('status')
-            plan_id = request.query_params.get('plan_id')
-            user_id = request.query_params.get('user_id')
             page = int(request.query_params.get('page', 1))
             page_size = int(request.query_params.get('page_size', 20))
             
-            # Build queryset
-            queryset = UserSubscription.objects.select_related('user', 'plan').all()
-            
-            # Apply filters
-            if status_filter:
-                queryset = queryset.filter(status=status_filter)
-            if plan_id:
-                queryset = queryset.filter(plan_id=plan_id)
-            if user_id:
-                queryset = queryset.filter(user_id=user_id)
-            
-            # Order by created_at descending
-            queryset = queryset.order_by('-created_at')
+            queryset = _admin_subscriptions_queryset(request)
             
             # Pagination
             total_count = queryset.count()
@@ -1630,7 +1498,76 @@ class AdminSubscriptionListView(APIView):
             }, status=500)
 
     
+""" Admin Export Views """
+class AdminUsersExportView(ExportView):
+    """Stream the admin user list as CSV / NDJSON (same filters as AdminUsersListView)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    export_name = 'users'
+    columns = (
+        ('id', 'id'),
+        ('username', 'username'),
+        ('email', 'email'),
+        ('display_name', 'profile__display_name'),
+        ('role', 'role'),
+        ('is_active', 'is_active'),
+        ('email_verified', 'email_verified'),
+        ('date_joined', 'date_joined'),
+        ('last_login', 'last_login'),
+    )
+
+    def get_export_queryset(self, request):
+        # values_list() only needs the profile join, not the prefetched interests
+        return _admin_users_queryset(request).prefetch_related(None)
+
+
+class AdminPaymentsExportView(ExportView):
+    """Stream payments as CSV / NDJSON (same filters as AdminPaymentListView)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    export_name = 'payments'
+    columns = (
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('email', 'user__email'),
+        ('payment_type', 'payment_type'),
+        ('amount', 'amount'),
+        ('currency', 'currency'),
+        ('status', 'status'),
+        ('plan', 'subscription__plan__name'),
+        ('stripe_payment_intent_id', 'stripe_payment_intent_id'),
+        ('description', 'description'),
+        ('created_at', 'created_at'),
+    )
+
+    def get_export_queryset(self, request):
+        return _admin_payments_queryset(request)
+
+
+class AdminSubscriptionsExportView(ExportView):
+    """Stream subscriptions as CSV / NDJSON (same filters as AdminSubscriptionListView)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    export_name = 'subscriptions'
+    columns = (
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('email', 'user__email'),
+        ('plan', 'plan__name'),
+        ('plan_price', 'plan__price'),
+        ('status', 'status'),
+        ('cancel_at_period_end', 'cancel_at_period_end'),
+        ('current_period_start', 'current_period_start'),
+        ('current_period_end', 'current_period_end'),
+        ('posts_used_this_month', 'posts_used_this_month'),
+        ('created_at', 'created_at'),
+    )
+
+    def get_export_queryset(self, request):
+        return _admin_subscriptions_queryset(request)
+
+
 """ User Profile Section """
+
 class ProfileViewSet(viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
@@ -1643,7 +1580,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return all profiles for list view"""
-        return Profile.objects.select_related('user').all().order_by('-created_at')
+        return Profile.objects.select_related('user', 'user__stats').all().order_by('-created_at')
 
     def create(self, request, *args, **kwargs):
         """
@@ -1690,7 +1627,22 @@ class ProfileViewSet(viewsets.ModelViewSet):
             status=status.HTTP_403_FORBIDDEN
         )
 
+    def _me_validators(self, request, *args, **kwargs):
+        """ETag/Last-Modified for the caller's profile from its row, stats and versions"""
+        if not request.user.is_authenticated:
+            return None
+        row = Profile.objects.filter(user=request.user).values(
+            'id', 'updated_at', 'user__username', 'user__email', 'user__stats__updated_at'
+        ).first()
+        if row is None:
+            return None
+        # Interests (m2m) and community memberships bump the profile version
+        profile_versions = versions(('profile', request.user.id), ('interest', None))
+        etag = make_etag('profile', request.user.id, row, profile_versions)
+        return etag, latest(row['updated_at'], row['user__stats__updated_at'], *profile_versions)
+
     @action(detail=False, methods=['get'])
+    @conditional(_me_validators)
     def me(self, request):
         """Get the current user's profile"""
         if not request.user.is_authenticated:
@@ -1759,7 +1711,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
         profiles = Profile.objects.filter(
             models.Q(user__username__icontains=query) |
             models.Q(display_name__icontains=query)
-        ).select_related('user').order_by('-created_at')
+        ).select_related('user', 'user__stats').order_by('-created_at')
         
         page = self.paginate_queryset(profiles)
         
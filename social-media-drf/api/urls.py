@@ -64,6 +64,7 @@ urlpatterns = [
     path('chat/messages/delete/', DeleteDirectMessageView.as_view(), name='delete-direct-message'),
     path('chat/messages/conversation/', GetConversationView.as_view(), name='get-conversation'),
     path('chat/messages/conversations/', GetConversationsListView.as_view(), name='get-conversations-list'),
+    path('chat/messages/search/', MessageSearchView.as_view(), name='search-messages'),
     # Message request endpoints
     path('chat/message-requests/', GetMessageRequestsView.as_view(), name='get-message-requests'),
     path('chat/message-requests/accept/', AcceptMessageRequestView.as_view(), name='accept-message-request'),
@@ -77,6 +78,7 @@ urlpatterns = [
     path('chat/blocked-users/', BlockedUsersListView.as_view(), name='blocked-users-list'),
     path('chat/report/', ReportUserView.as_view(), name='report-user'),
     path('chat/reports/', UserReportsListView.as_view(), name='user-reports-list'),
+    path('chat/reports/export/', UserReportsExportView.as_view(), name='user-reports-export'),
     path('chat/reports/<int:report_id>/update/', UpdateReportStatusView.as_view(), name='update-report-status'),
     path('chat/reports/<int:report_id>/', DeleteUserReportView.as_view(), name='delete-user-report'),
     # Admin conversations endpoints
@@ -84,6 +86,7 @@ urlpatterns = [
     path('chat/admin/conversation/messages/', AdminGetConversationMessagesView.as_view(), name='admin-conversation-messages'),
     path('chat/admin/conversation/delete/', AdminDeleteConversationView.as_view(), name='admin-delete-conversation'),
     path('chat/admin/history/', AdminChatHistoryView.as_view(), name='admin-chat-history'),
+    path('chat/admin/messages/search/', AdminMessageSearchView.as_view(), name='admin-search-messages'),
     # Unified reports endpoint (must import UnifiedReportsView from post.views)
     path('reports/all/', UnifiedReportsView.as_view(), name='unified-reports'),
     # Router URLs (must be last to avoid conflicts with specific paths)
@@ -130,6 +130,35 @@ DATABASES = {
     }
 }
 
+# =============================================================================
+# CACHE
+# =============================================================================
+
+# Presence, unread counters, block sets and contact states live in the cache.
+# Several workers (USE_LOCAL_CHANNELS) need one shared cache: Redis when
+# CACHE_URL is set, otherwise the channel broker they already share. The
+# per-process LocMemCache only suits a single worker (see utils/caches.py).
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_URL'),
+        },
+    }
+elif os.environ.get('USE_LOCAL_CHANNELS', 'False').lower() == 'true':
+    CACHES = {
+        'default': {
+            'BACKEND': 'utils.broker_cache.BrokerCache',
+            'LOCATION': os.environ.get('CHANNEL_BROKER_SOCKET', '/tmp/channels.sock'),
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
 # =============================================================================
 # CHANNEL LAYERS (Redis for WebSockets)
 # =============================================================================
@@ -147,6 +176,18 @@ if os.environ.get('USE_REDIS_CHANNELS', 'False').lower() == 'true':
             },
         },
     }
+elif os.environ.get('USE_LOCAL_CHANNELS', 'False').lower() == 'true':
+    # Several workers on one host: broker process on a Unix socket (manage.py run_channel_broker)
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'utils.local_channel_layer.LocalChannelLayer',
+            'CONFIG': {
+                'path': os.environ.get('CHANNEL_BROKER_SOCKET', '/tmp/channels.sock'),
+                'capacity': int(os.environ.get('CHANNEL_LAYER_CAPACITY', 100)),
+                'expiry': int(os.environ.get('CHANNEL_LAYER_EXPIRY', 60)),
+            },
+        },
+    }
 else:
     # Use in-memory channel layer for development/simple deployments
     CHANNEL_LAYERS = {
@@ -328,6 +369,168 @@ STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
 PAY_PER_POST_PRICE = 2.99  # USD
 FREE_TIER_POSTS = 1  # Free tier posts per month
 
+# =============================================================================
+# UNREAD COUNTERS
+# =============================================================================
+
+# Seconds a cached notification/message badge counter lives before it is
+# recomputed from the database; this bounds how long a drifted count lasts.
+# reconcile_unread_counters refreshes them at once (shared CACHES only)
+UNREAD_COUNTER_TIMEOUT = int(os.environ.get('UNREAD_COUNTER_TIMEOUT', 600))
+
+# =============================================================================
+# FOLLOW SUGGESTIONS
+# =============================================================================
+
+# Seconds a user's ranked suggestion list is cached (dropped early on follow/unfollow)
+FOLLOW_SUGGESTIONS_CACHE_TIMEOUT = int(os.environ.get('FOLLOW_SUGGESTIONS_CACHE_TIMEOUT', 900))
+
+# =============================================================================
+# FOLLOW GRAPH (post/follow_graph.py)
+# =============================================================================
+
+# Per-process memory budget for cached adjacency lists; cold users are evicted first
+FOLLOW_GRAPH_MAX_BYTES = int(os.environ.get('FOLLOW_GRAPH_MAX_BYTES', 32 * 1024 * 1024))
+
+# Share versions and adjacency lists through the Django cache so that several
+# worker processes stay consistent (needs a cache shared between processes).
+# On by default when USE_LOCAL_CHANNELS runs several workers (see post/checks.py)
+FOLLOW_GRAPH_SHARED = os.environ.get(
+    'FOLLOW_GRAPH_SHARED', os.environ.get('USE_LOCAL_CHANNELS', 'False')
+).lower() == 'true'
+FOLLOW_GRAPH_SHARED_TIMEOUT = int(os.environ.get('FOLLOW_GRAPH_SHARED_TIMEOUT', 3600))
+
+# Without sharing, seconds a worker trusts its own copy of a user's lists; bounds
+# how long it can miss a follow/unfollow that another process handled
+FOLLOW_GRAPH_LOCAL_TTL = int(os.environ.get('FOLLOW_GRAPH_LOCAL_TTL', 30))
+
+# =============================================================================
+# LIKE WRITE BUFFER (post/like_buffer.py)
+# =============================================================================
+
+# Seconds between background flushes of buffered toggle_like writes (0 = write immediately)
+LIKE_FLUSH_INTERVAL = float(os.environ.get('LIKE_FLUSH_INTERVAL', 1.0))
+# Flush inline once this many (user, post) pairs are waiting
+LIKE_FLUSH_MAX_PENDING = int(os.environ.get('LIKE_FLUSH_MAX_PENDING', 1000))
+# Seconds a user's pending like states stay in the cache (must exceed the flush interval)
+LIKE_STATE_TIMEOUT = int(os.environ.get('LIKE_STATE_TIMEOUT', 300))
+
+# =============================================================================
+# CONDITIONAL GET (utils/conditional.py)
+# =============================================================================
+
+# Seconds a content version (ETag input for likes, memberships, ...) is kept;
+# an expired version only costs clients one full response
+CONTENT_VERSION_TIMEOUT = int(os.environ.get('CONTENT_VERSION_TIMEOUT', 7 * 24 * 3600))
+
+# =============================================================================
+# RESPONSE CACHE (utils/response_cache.py)
+# =============================================================================
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+# Seconds the first request on a miss holds the single-flight lock
+RESPONSE_CACHE_LOCK_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_LOCK_TIMEOUT', 10))
+# Seconds other requests wait for that result before computing it themselves
+RESPONSE_CACHE_WAIT_TIMEOUT = float(os.environ.get('RESPONSE_CACHE_WAIT_TIMEOUT', 2))
+
+# =============================================================================
+# ADMIN EXPORTS (utils/exports.py)
+# =============================================================================
+
+# Rows fetched per round trip from the (server-side) cursor while streaming
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# =============================================================================
+# CHAT HISTORY (chats/history.py)
+# =============================================================================
+
+# Messages returned per history window when no ?limit= is given
+CHAT_HISTORY_WINDOW = int(os.environ.get('CHAT_HISTORY_WINDOW', 100))
+# Largest ?limit= a client may ask for
+CHAT_HISTORY_MAX_WINDOW = int(os.environ.get('CHAT_HISTORY_MAX_WINDOW', 200))
+
+# =============================================================================
+# ROOM LIST (chats/room_list.py)
+# =============================================================================
+
+# Participants (and admins) listed per room in GET /api/chat/rooms/; participant_count has the total
+ROOM_LIST_PARTICIPANTS = int(os.environ.get('ROOM_LIST_PARTICIPANTS', 10))
+
+# =============================================================================
+# PRESENCE (chats/presence.py)
+# =============================================================================
+
+# Seconds a user stays online without a heartbeat from any of their sockets
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', 300))
+# Seconds status changes are buffered before one digest goes to each contact
+PRESENCE_DIGEST_INTERVAL = float(os.environ.get('PRESENCE_DIGEST_INTERVAL', 2))
+# Seconds a user's contact list is cached
+PRESENCE_CONTACTS_TTL = int(os.environ.get('PRESENCE_CONTACTS_TTL', 60))
+# Seconds between sweeps that announce users whose sockets died without disconnecting
+PRESENCE_SWEEP_INTERVAL = int(os.environ.get('PRESENCE_SWEEP_INTERVAL', 60))
+
+# =============================================================================
+# BLOCK LISTS (chats/blocks.py)
+# =============================================================================
+
+# Seconds a user's blocked / blocked-by sets are cached (dropped early on block/unblock)
+BLOCK_LIST_TTL = int(os.environ.get('BLOCK_LIST_TTL', 600))
+
+# =============================================================================
+# DIRECT MESSAGES (chats/direct_messages.py, chats/contacts.py)
+# =============================================================================
+
+# Seconds a pair's contact state (blocks, accepted, requests) is kept in the shared cache
+CONTACT_STATE_TTL = int(os.environ.get('CONTACT_STATE_TTL', 600))
+# Seconds a worker reuses its own copy; other workers' changes show up after at most this long
+CONTACT_STATE_LOCAL_TTL = int(os.environ.get('CONTACT_STATE_LOCAL_TTL', 5))
+# Threads per process running the consumers' database work
+CHAT_WS_DB_WORKERS = int(os.environ.get('CHAT_WS_DB_WORKERS', 8))
+
+# =============================================================================
+# GROUP CHAT WRITE-BEHIND (chats/message_writer.py)
+# =============================================================================
+
+# Seconds queued room messages wait before being written as one batch
+CHAT_WRITE_BEHIND_WINDOW = float(os.environ.get('CHAT_WRITE_BEHIND_WINDOW', 0.05))
+# Queue length that triggers a write before the window ends
+CHAT_WRITE_BEHIND_BATCH = int(os.environ.get('CHAT_WRITE_BEHIND_BATCH', 200))
+
+# =============================================================================
+# CHAT SEARCH (chats/search.py)
+# =============================================================================
+
+# Results per search page when no ?limit= is given
+CHAT_SEARCH_PAGE = int(os.environ.get('CHAT_SEARCH_PAGE', 20))
+# Largest ?limit= a client may ask for
+CHAT_SEARCH_MAX_PAGE = int(os.environ.get('CHAT_SEARCH_MAX_PAGE', 50))
+
+# =============================================================================
+# RETENTION (apply_retention management command)
+# =============================================================================
+
+# Days to keep each notification type; 'default' covers unlisted types and
+# None keeps a type forever
+NOTIFICATION_RETENTION_DAYS = {
+    'default': int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90)),
+    'like': 30,
+    'share': 30,
+    'follow': 60,
+}
+POST_VIEW_RETENTION_DAYS = int(os.environ.get('POST_VIEW_RETENTION_DAYS', 30))
+RETENTION_ARCHIVE_DIR = os.environ.get('RETENTION_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
+# =============================================================================
+# DAILY METRICS (accounts/daily_metrics.py)
+# =============================================================================
+
+# Past days that are recounted on every rollup run; statuses, deletions and
+# late rows keep changing their counts for a while after the day ends
+DAILY_METRICS_REROLL_DAYS = int(os.environ.get('DAILY_METRICS_REROLL_DAYS', 7))
+# Seconds before the dashboard counts a day in that window live instead of
+# trusting its row (it never writes; rollup_daily_metrics does)
+DAILY_METRICS_STALE_AFTER = int(os.environ.get('DAILY_METRICS_STALE_AFTER', 3600))
+
 # =============================================================================
 # CKEDITOR CONFIGURATION
 # =============================================================================
@@ -6,4 +6,5 @@ from .models import *
 admin.site.register(Room)
 admin.site.register(Message)
 admin.site.register(BlockedUser)
-admin.site.register(UserReport)
\ No newline at end of file
+admin.site.register(UserReport)
+admin.site.register(DirectConversation)
@@ -0,0 +1,229 @@
+# chats/admin_conversations.py
+"""
+The admin conversation index (AdminAllConversationsView), computed in SQL.
+
+Direct conversations come from the DirectConversation summaries (one row
+per pair with its last message and message count, see
+chats/conversations.py). Rooms come from the Room table, ordered by
+Room.updated_at, which every new message bumps, with their maintained
+message_count. Each source is read newest first through its
+(-activity, -id) index, with the type and search filters in the WHERE
+clause, and the two are merged here. A page reads `limit + 1` rows from
+each, however many messages there are.
+
+Pages use a keyset cursor on (activity time, type, id). ?page= still
+works for the admin table's page numbers: cursor_at() first reads just
+the sort keys of the rows before the page (two indexed columns, none of
+the per-room subqueries), and the page itself is then read after the
+last of them like a cursor page.
+
+The total is a COUNT over both sources, so the view only runs it for the
+first page, or when the client asks with ?count=true.
+
+Query params understood by options():
+    type     'direct', 'room' or 'all'
+    search   part of a room name or of a participant's username, email or display name
+    limit    conversations per page (max 100)
+    cursor   `cursor` of the previous page
+    page     page number, when no cursor is given
+    count    'true' to include the total on a page other than the first
+"""
+import base64
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from . import reactions, room_list
+
+TYPES = ('direct', 'room')
+
+
+def encode_cursor(activity_at, kind, item_id):
+    raw = f"{activity_at.isoformat()}|{kind}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (activity_at, type, id) from a cursor; ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        activity_at, kind, item_id = raw.rsplit('|', 2)
+        if kind not in TYPES:
+            raise ValueError(kind)
+        return datetime.fromisoformat(activity_at), kind, int(item_id)
+    except (TypeError, UnicodeDecodeError, ValueError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+
+
+def options(request):
+    """Return (types, search, limit, cursor, page) from the query params; ValueError on bad input"""
+    params = request.query_params
+    type_filter = params.get('type') or 'all'
+    types = TYPES if type_filter == 'all' else (type_filter,)
+    if not set(types) <= set(TYPES):
+        raise ValueError("type must be 'direct', 'room' or 'all'")
+    try:
+        limit = min(max(1, int(params.get('limit', 10))), 100)
+        page = max(1, int(params.get('page', 1)))
+    except ValueError:
+        raise ValueError('limit and page must be integers')
+    cursor = params.get('cursor')
+    search = (params.get('search') or '').strip()
+    return types, search, limit, decode_cursor(cursor) if cursor else None, page
+
+
+def _matching_users(search):
+    return get_user_model().objects.filter(
+        Q(username__icontains=search) | Q(email__icontains=search) |
+        Q(profile__display_name__icontains=search)
+    ).values('id')
+
+
+def _direct(search):
+    from .models import DirectConversation
+
+    conversations = DirectConversation.objects.filter(last_message_at__isnull=False).annotate(
+        activity_at=F('last_message_at')
+    )
+    if search:
+        users = _matching_users(search)
+        conversations = conversations.filter(Q(user_low_id__in=users) | Q(user_high_id__in=users))
+    return conversations
+
+
+def _rooms(search):
+    from .models import Message, Room
+
+    rooms = Room.objects.annotate(
+        activity_at=F('updated_at'),
+        last_message_ref=Subquery(
+            Message.objects.filter(room=OuterRef('pk')).order_by('-created_at', '-id').values('id')[:1]
+        ),
+    )
+    if search:
+        members = Room.participants.through.objects.filter(user_id__in=_matching_users(search))
+        rooms = rooms.filter(Q(name__icontains=search) | Q(id__in=members.values('room_id')))
+    return rooms
+
+
+def _sources(types, search):
+    return [(kind, _direct(search) if kind == 'direct' else _rooms(search)) for kind in types]
+
+
+def _after(queryset, kind, cursor):
+    """The part of one source that sorts after the cursor in (activity, type, id) descending order"""
+    activity_at, cursor_kind, item_id = cursor
+    if kind < cursor_kind:
+        return queryset.filter(activity_at__lte=activity_at)
+    if kind == cursor_kind:
+        return queryset.filter(Q(activity_at__lt=activity_at) | Q(activity_at=activity_at, id__lt=item_id))
+    return queryset.filter(activity_at__lt=activity_at)
+
+
+def cursor_at(types, search, offset):
+    """The cursor of the row just before position `offset` (None for the first page)"""
+    if not offset:
+        return None
+    runs = [
+        [(activity_at, kind, item_id) for activity_at, item_id in (
+            queryset.order_by('-activity_at', '-id').values_list('activity_at', 'id')[:offset]
+        )]
+        for kind, queryset in _sources(types, search)
+    ]
+    keys = list(heapq.merge(*runs, reverse=True))[:offset]
+    return keys[-1] if keys else None
+
+
+def window(types, search, limit, cursor=None):
+    """Return ([(type, row)], has_more), newest activity first"""
+    runs = []
+    for kind, queryset in _sources(types, search):
+        if cursor is not None:
+            queryset = _after(queryset, kind, cursor)
+        rows = queryset.order_by('-activity_at', '-id')[:limit + 1]
+        runs.append([(kind, row) for row in rows])
+    merged = list(heapq.merge(
+        *runs, key=lambda item: (item[1].activity_at, item[0], item[1].id), reverse=True
+    ))
+    return merged[:limit], len(merged) > limit
+
+
+def count(types, search):
+    return sum(queryset.count() for _, queryset in _sources(types, search))
+
+
+def serialize(items, request):
+    """The index entries, with every related row loaded in a few batched queries"""
+    from accounts.serializers import UserSerializer
+    from .models import Message, Room
+    from .serializers import MessageSerializer
+
+    directs = [row for kind, row in items if kind == 'direct']
+    rooms = {row.id: row for kind, row in items if kind == 'room'}
+    limit = getattr(settings, 'ROOM_LIST_PARTICIPANTS', 10)
+    participants = room_list.first_members(Room.participants.through, list(rooms), limit)
+    admins = room_list.first_members(Room.admins.through, list(rooms), limit)
+    participant_counts = dict(
+        Room.participants.through.objects.filter(room_id__in=list(rooms))
+        .values('room_id').annotate(count=Count('id')).values_list('room_id', 'count')
+    )
+
+    message_ids = [row.last_message_id for row in directs if row.last_message_id]
+    message_ids += [row.last_message_ref for row in rooms.values() if row.last_message_ref]
+    messages = {
+        message.id: message
+        for message in Message.objects.filter(id__in=message_ids).select_related('sender__profile', 'receiver__profile')
+    }
+    for message in messages.values():
+        if message.room_id is not None:
+            message.room = rooms.get(message.room_id)
+
+    user_ids = {user_id for row in directs for user_id in (row.user_low_id, row.user_high_id)}
+    user_ids.update(user_id for ids in participants.values() for user_id in ids)
+    user_ids.update(user_id for ids in admins.values() for user_id in ids)
+    users = {user.id: user for user in get_user_model().objects.filter(id__in=user_ids).select_related('profile')}
+    context = {
+        'request': request,
+        **room_list.viewer_context(user_ids, request.user),
+        **reactions.reaction_context(list(messages.values()), request.user),
+    }
+
+    def user_data(user_id):
+        user = users.get(user_id)
+        return UserSerializer(user, context=context).data if user else None
+
+    def message_data(message_id):
+        message = messages.get(message_id)
+        return MessageSerializer(message, context=context).data if message else None
+
+    data = []
+    for kind, row in items:
+        if kind == 'direct':
+            data.append({
+                'id': f'direct_{row.user_low_id}_{row.user_high_id}',
+                'type': 'direct',
+                'user1': user_data(row.user_low_id),
+                'user2': user_data(row.user_high_id),
+                'last_message': message_data(row.last_message_id),
+                'message_count': max(0, row.message_count),
+                'created_at': row.last_message_at.isoformat(),
+            })
+        else:
+            last_message = messages.get(row.last_message_ref)
+            data.append({
+                'id': f'room_{row.id}',
+                'type': 'room',
+                'room_id': row.id,
+                'name': row.name,
+                'is_group': row.is_group,
+                'participants': [user_data(user_id) for user_id in participants.get(row.id, []) if user_id in users],
+                'participant_count': participant_counts.get(row.id, 0),
+                'admins': [user_data(user_id) for user_id in admins.get(row.id, []) if user_id in users],
+                'last_message': message_data(row.last_message_ref),
+                'message_count': max(0, row.message_count),
+                'created_at': (last_message.created_at if last_message else row.created_at).isoformat(),
+            })
+    return data
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ChatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chats'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the system checks)
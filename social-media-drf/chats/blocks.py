@@ -0,0 +1,126 @@
+# chats/blocks.py
+"""
+Who blocked whom, cached per user.
+
+Each user has two cached id sets: the users they blocked (blocking()) and
+the users who blocked them (blocked_by()). A miss loads both with one
+query, and they live for BLOCK_LIST_TTL seconds.
+
+Every user also has a version number in the cache, and the sets are
+stored tagged with the version read before they were loaded. The
+BlockedUser receivers in chats/models.py call forget(), which bumps both
+users' versions now and again once the transaction commits. Sets tagged
+with an older version are ignored, so a read that loaded the old rows
+while a block was being written can't serve them after it commits.
+
+A check between two users only needs one side's sets, so status() and
+is_blocked_either_way() cost one cache round trip. exclude_blocked() and
+visible_ids() filter querysets and id lists for a whole page at once.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+
+def _key(user_id):
+    return f'blocks_{user_id}'
+
+
+def _version_key(user_id):
+    return f'blocks_v_{user_id}'
+
+
+def _new_version():
+    # Seeds a missing version; a timestamp won't repeat one that stored sets still carry
+    return time.time_ns() // 1000
+
+
+def _load(user_id):
+    from .models import BlockedUser
+
+    blocking, blocked_by = set(), set()
+    for blocker_id, blocked_id in BlockedUser.objects.filter(
+        Q(blocker_id=user_id) | Q(blocked_id=user_id)
+    ).values_list('blocker_id', 'blocked_id'):
+        if blocker_id == user_id:
+            blocking.add(blocked_id)
+        else:
+            blocked_by.add(blocker_id)
+    return frozenset(blocking), frozenset(blocked_by)
+
+
+def sets(user_id):
+    """(ids `user_id` blocked, ids that blocked `user_id`)"""
+    key, version_key = _key(user_id), _version_key(user_id)
+    cached = cache.get_many([key, version_key])
+    version = cached.get(version_key)
+    entry = cached.get(key)
+    if version is None:
+        # Sets stored under an evicted version can't be trusted
+        entry = None
+        version = _new_version()
+        if not cache.add(version_key, version, timeout=None):
+            version = cache.get(version_key, version)
+    if entry is not None and entry[0] == version:
+        return entry[1], entry[2]
+    blocking, blocked_by = _load(user_id)
+    cache.set(key, (version, blocking, blocked_by), getattr(settings, 'BLOCK_LIST_TTL', 600))
+    return blocking, blocked_by
+
+
+def blocking(user_id):
+    return sets(user_id)[0]
+
+
+def blocked_by(user_id):
+    return sets(user_id)[1]
+
+
+def hidden_ids(user_id):
+    """Everyone `user_id` blocked or was blocked by"""
+    out, incoming = sets(user_id)
+    return out | incoming
+
+
+def status(user_id, other_id):
+    """(user blocked other, other blocked user)"""
+    out, incoming = sets(user_id)
+    return other_id in out, other_id in incoming
+
+
+def has_blocked(blocker_id, blocked_id):
+    return blocked_id in blocking(blocker_id)
+
+
+def is_blocked_either_way(user_id, other_id):
+    return any(status(user_id, other_id))
+
+
+def visible_ids(user_id, ids):
+    """`ids` without the users blocked by or blocking `user_id`, in order"""
+    hidden = hidden_ids(user_id)
+    return [other_id for other_id in ids if other_id not in hidden]
+
+
+def exclude_blocked(queryset, user_id, field='id', either_way=False):
+    """`queryset` without rows whose `field` is a user `user_id` blocked (or, with either_way, who blocked them)"""
+    ids = hidden_ids(user_id) if either_way else blocking(user_id)
+    return queryset.exclude(**{f'{field}__in': ids}) if ids else queryset
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), _new_version(), timeout=None)
+
+
+def forget(blocker_id, blocked_id):
+    """Invalidate the cached sets of both users of a block or unblock"""
+    user_ids = (blocker_id, blocked_id)
+    _bump(user_ids)
+    transaction.on_commit(lambda: _bump(user_ids))
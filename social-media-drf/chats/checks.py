@@ -0,0 +1,29 @@
+# chats/checks.py
+"""
+System checks for multi-worker deployments.
+
+With USE_LOCAL_CHANNELS, several daphne processes serve the site, so the
+default cache must be one they all share (see utils/caches.py).
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+from utils import caches
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    layer = settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND', '')
+    if layer != 'utils.local_channel_layer.LocalChannelLayer':
+        return []
+    if caches.is_per_process():
+        return [Error(
+            f'USE_LOCAL_CHANNELS runs several workers, but the default cache ({caches.default_backend()}) '
+            'is per process.',
+            hint=(
+                'Use utils.broker_cache.BrokerCache (the default with USE_LOCAL_CHANNELS and no '
+                'CACHE_URL), or set CACHE_URL to Redis.'
+            ),
+            id='chats.E001',
+        )]
+    return []
@@ -1,4 +1,6 @@
+import asyncio
 import json
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
@@ -10,9 +12,15 @@ import jwt
 from django.conf import settings
 from django.core.cache import cache
 from .models import Room, Message
+from . import contacts, direct_messages, message_writer, presence, read_state
 
 User = get_user_model()
 
+# Seconds a direct message client_id is remembered, and how long a retry waits for a send in flight
+CLIENT_ID_TTL = 600
+CLIENT_ID_WAIT = 5
+CLIENT_ID_PENDING = 'pending'
+
 
 class JWTAuthMiddleware(BaseMiddleware):
     """Custom middleware to authenticate WebSocket connections using JWT"""
@@ -59,8 +67,48 @@ class JWTAuthMiddleware(BaseMiddleware):
             return None
 
 
+class PresenceMixin:
+    """
+    Presence for a consumer (see chats/presence.py): reference-counted
+    online state, heartbeat renewal and digests from the user's contacts.
+    """
+
+    async def join_presence(self):
+        self.presence_joined = True
+        presence.ensure_sweeper()
+        await self.channel_layer.group_add(presence.group_name(self.user.id), self.channel_name)
+        came_online = await database_sync_to_async(presence.connect)(self.user.id)
+        if came_online:
+            await presence.publish(self.user.id, self.user.username)
+
+    async def renew_presence(self):
+        if getattr(self, 'presence_joined', False):
+            came_back = await database_sync_to_async(presence.heartbeat)(self.user.id)
+            if came_back:
+                await presence.publish(self.user.id, self.user.username)
+
+    async def leave_presence(self):
+        if not getattr(self, 'presence_joined', False):
+            return
+        self.presence_joined = False
+        await self.channel_layer.group_discard(presence.group_name(self.user.id), self.channel_name)
+        went_offline = await database_sync_to_async(presence.disconnect)(self.user.id)
+        if went_offline:
+            await presence.publish(self.user.id, self.user.username)
+
+    async def presence_digest(self, event):
+        """Status changes of the user's contacts, coalesced per digest interval"""
+        for status in event['statuses']:
+            await self.send(text_data=json.dumps({
+                'type': 'online_status',
+                'user_id': status['user_id'],
+                'username': status['username'],
+                'is_online': status['is_online'],
+            }))
+
+
 """ Direct Message Consumer """
-class DirectMessageConsumer(AsyncWebsocketConsumer):
+class DirectMessageConsumer(PresenceMixin, AsyncWebsocketConsumer):
     """ Consumer for Direct Messages with JWT authentication """
     
     async def connect(self):
@@ -71,70 +119,200 @@ class DirectMessageConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        # Mark user as online
-        await self.mark_user_online()
-        
-        # Join online status channel to receive updates
-        await self.channel_layer.group_add('online_status', self.channel_name)
-        
-        # Broadcast online status to all users
-        await self.broadcast_online_status(True)
+        # Mark user as online and subscribe to their contacts' status changes
+        await self.join_presence()
 
         # Join user's personal channel for direct messages
         self.user_group = f'user_{self.user.id}'
         await self.channel_layer.group_add(self.user_group, self.channel_name)
         await self.accept()
-    
-    async def online_status_change(self, event):
-        """Handle online status change broadcasts"""
-        await self.send(text_data=json.dumps({
-            'type': 'online_status',
-            'user_id': event['user_id'],
-            'username': event['username'],
-            'is_online': event['is_online'],
-        }))
 
     async def disconnect(self, code):
-        # Mark user as offline
-        await self.mark_user_offline()
-        
-        # Broadcast offline status to all users
-        await self.broadcast_online_status(False)
-        
-        # Leave online status channel
-        await self.channel_layer.group_discard('online_status', self.channel_name)
+        # Mark user as offline (only if no other connections)
+        await self.leave_presence()
         
         # Leave user's personal channel
         if hasattr(self, 'user_group'):
             await self.channel_layer.group_discard(self.user_group, self.channel_name)
-    
-    @database_sync_to_async
-    def mark_user_online(self):
-        """Mark user as online in cache"""
-        cache.set(f'user_online_{self.user.id}', True, timeout=300)  # 5 minutes timeout
-    
-    @database_sync_to_async
-    def mark_user_offline(self):
-        """Mark user as offline in cache"""
-        cache.delete(f'user_online_{self.user.id}')
-    
-    async def broadcast_online_status(self, is_online):
-        """Broadcast online status change to all connected users"""
-        # Get all connected users and notify them
-        from channels.layers import get_channel_layer
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            # Broadcast to a general online status channel
-            await channel_layer.group_send(
-                'online_status',
-                {
-                    'type': 'online_status_change',
-                    'user_id': self.user.id,
-                    'username': self.user.username,
-                    'is_online': is_online,
-                }
-            )
+
+    async def receive(self, text_data):
+        """
+        Frames from the client, each with a `type`:
+        - send    {client_id, receiver_id, content}
+        - edit    {client_id, message_id, content}
+        - delete  {client_id, message_id}
+        - typing  {receiver_id, is_typing}
+        - read    {user_id, message_id}: read that user's messages up to message_id
+        - heartbeat / ping
+        send, edit and delete are answered with an ack carrying the client_id.
+        Any frame keeps the connection's presence alive.
+        """
+        await self.renew_presence()
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({'type': 'error', 'error': 'Invalid JSON format'}))
+            return
+
+        frame_type = data.get('type')
+        if frame_type in ('heartbeat', 'ping'):
+            await self.send(text_data=json.dumps({'type': 'pong'}))
+        elif frame_type == 'typing':
+            await self.send_typing(data)
+        elif frame_type == 'read':
+            await self.mark_read(data)
+        elif frame_type in ('send', 'edit', 'delete'):
+            await self.handle_message_frame(frame_type, data)
+        else:
+            await self.send(text_data=json.dumps({'type': 'error', 'error': f'Unknown frame type: {frame_type}'}))
+
+    async def send_ack(self, action, client_id, ok=True, **extra):
+        await self.send(text_data=json.dumps({
+            'type': 'ack',
+            'action': action,
+            'client_id': client_id,
+            'ok': ok,
+            **extra,
+        }))
+
+    async def handle_message_frame(self, action, data):
+        client_id = data.get('client_id')
+        try:
+            if action == 'send':
+                message, duplicate = await direct_messages.run_db(
+                    self.send_direct_message, data.get('receiver_id'), data.get('content'), client_id
+                )
+                if not duplicate:
+                    await self.notify_pair(message.receiver_id, {
+                        'type': 'direct_message',
+                        'message': direct_messages.payload(message),
+                    })
+                await self.send_ack(action, client_id, message_id=message.id,
+                                    created_at=message.created_at.isoformat())
+            elif action == 'edit':
+                message = await direct_messages.run_db(
+                    direct_messages.edit, self.user, data.get('message_id'), data.get('content')
+                )
+                await self.notify_pair(message.receiver_id, {
+                    'type': 'message_updated',
+                    'message': {
+                        'id': message.id,
+                        'content': message.content,
+                        'sender_id': self.user.id,
+                        'receiver_id': message.receiver_id,
+                    }
+                })
+                await self.send_ack(action, client_id, message_id=message.id)
+            else:
+                message_id = data.get('message_id')
+                receiver_id = await direct_messages.run_db(direct_messages.delete, self.user, message_id)
+                await self.notify_pair(receiver_id, {
+                    'type': 'message_deleted',
+                    'message_id': int(message_id),
+                    'sender_id': self.user.id,
+                    'receiver_id': receiver_id,
+                })
+                await self.send_ack(action, client_id, message_id=int(message_id))
+        except direct_messages.DirectMessageError as e:
+            await self.send_ack(action, client_id, ok=False, code=e.code, error=e.message)
+        except (TypeError, ValueError):
+            await self.send_ack(action, client_id, ok=False, code='invalid', error='message_id is required')
+
+    def send_direct_message(self, receiver_id, content, client_id):
+        """Create the message once per client_id, so a retried frame is not stored twice"""
+        if not client_id:
+            return direct_messages.send(self.user, receiver_id, content), False
+        key = f'dm_client_{self.user.id}_{client_id}'
+        # Reserve the client_id before sending, so of two concurrent retries only one sends
+        deadline = time.monotonic() + CLIENT_ID_WAIT
+        while not cache.add(key, CLIENT_ID_PENDING, CLIENT_ID_TTL):
+            stored = cache.get(key)
+            if stored == CLIENT_ID_PENDING:
+                if time.monotonic() > deadline:
+                    raise direct_messages.DirectMessageError('pending', 'This message is still being sent')
+                time.sleep(0.05)
+                continue
+            message = Message.objects.filter(id=stored).first() if stored else None
+            if message is not None:
+                return message, True
+            cache.delete(key)  # The earlier message was deleted; send this one
+        try:
+            message = direct_messages.send(self.user, receiver_id, content)
+        except BaseException:
+            cache.delete(key)
+            raise
+        cache.set(key, message.id, CLIENT_ID_TTL)
+        return message, False
+
+    async def notify_pair(self, receiver_id, event):
+        """Deliver an event to the receiver and to the sender's other sockets"""
+        if receiver_id:
+            await self.channel_layer.group_send(f'user_{receiver_id}', event)
+        await self.channel_layer.group_send(self.user_group, event)
+
+    async def send_typing(self, data):
+        try:
+            receiver_id = int(data.get('receiver_id'))
+        except (TypeError, ValueError):
+            return
+        allowed = await direct_messages.run_db(self.may_notify, receiver_id)
+        if allowed:
+            await self.channel_layer.group_send(f'user_{receiver_id}', {
+                'type': 'typing_indicator',
+                'user_id': self.user.id,
+                'username': self.user.username,
+                'is_typing': bool(data.get('is_typing', True)),
+            })
+
+    async def mark_read(self, data):
+        try:
+            other_id, message_id = int(data.get('user_id')), int(data.get('message_id'))
+        except (TypeError, ValueError):
+            return
+        read_upto = await direct_messages.run_db(read_state.mark_direct_read, self.user.id, other_id, message_id)
+        if read_upto is not None:
+            for group, event in read_state.direct_events(self.user.id, other_id, read_upto):
+                await self.channel_layer.group_send(group, event)
+
+    async def read_up_to(self, event):
+        """A user read a conversation up to a message"""
+        await self.send(text_data=json.dumps({
+            'type': 'read_up_to',
+            'room_id': event['room_id'],
+            'user_id': event['user_id'],
+            'other_user_id': event.get('other_user_id'),
+            'message_id': event['message_id'],
+        }))
+
+    def may_notify(self, receiver_id):
+        if receiver_id == self.user.id:
+            return False
+        state = contacts.state(self.user.id, receiver_id)
+        return not state.blocked and state.can_message
+
+    async def typing_indicator(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'typing',
+            'user_id': event['user_id'],
+            'username': event['username'],
+            'is_typing': event['is_typing'],
+        }))
+
+    async def message_updated(self, event):
+        """Send an edited direct message to WebSocket"""
+        await self.send(text_data=json.dumps({
+            'type': 'message_updated',
+            'message': event['message']
+        }))
+
+    async def message_deleted(self, event):
+        """Send a direct message deletion to WebSocket"""
+        await self.send(text_data=json.dumps({
+            'type': 'message_deleted',
+            'message_id': event['message_id'],
+            'sender_id': event['sender_id'],
+            'receiver_id': event['receiver_id'],
+        }))
 
     async def direct_message(self, event):
         """Send direct message to WebSocket"""
@@ -180,90 +358,53 @@ class DirectMessageConsumer(AsyncWebsocketConsumer):
 
 
 """ Room-based Chat Consumer (for group chats) """
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(PresenceMixin, AsyncWebsocketConsumer):
     """ Consumer for Chat with JWT authentication """
     
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group = f'chat_{self.room_id}'
         self.user = self.scope.get('user')
+        # Pending ack_when_durable() tasks
+        self.ack_tasks = set()
 
         # Check authentication
         if not self.user or not self.user.is_authenticated:
             await self.close()
             return
 
-        # Mark user as online
-        await self.mark_user_online()
-        
-        # Join online status channel to receive updates
-        await self.channel_layer.group_add('online_status', self.channel_name)
-        
-        # Broadcast online status to all users
-        await self.broadcast_online_status(True)
-
         # Check if user has access to this room
         has_access = await self.check_room_access()
         if not has_access:
             await self.close()
             return
 
+        # Mark user as online and subscribe to their contacts' status changes
+        await self.join_presence()
+
         # Join room
         await self.channel_layer.group_add(self.room_group, self.channel_name)
         await self.accept()
-    
-    async def online_status_change(self, event):
-        """Handle online status change broadcasts"""
-        await self.send(text_data=json.dumps({
-            'type': 'online_status',
-            'user_id': event['user_id'],
-            'username': event['username'],
-            'is_online': event['is_online'],
-        }))
 
     async def disconnect(self, code):
         # Mark user as offline (only if no other connections)
-        await self.mark_user_offline()
-        
-        # Broadcast offline status to all users
-        await self.broadcast_online_status(False)
-        
-        # Leave online status channel
-        await self.channel_layer.group_discard('online_status', self.channel_name)
+        await self.leave_presence()
         
         # Leave room
         if hasattr(self, 'room_group'):
             await self.channel_layer.group_discard(self.room_group, self.channel_name)
-    
-    @database_sync_to_async
-    def mark_user_online(self):
-        """Mark user as online in cache"""
-        cache.set(f'user_online_{self.user.id}', True, timeout=300)  # 5 minutes timeout
-    
-    @database_sync_to_async
-    def mark_user_offline(self):
-        """Mark user as offline in cache"""
-        cache.delete(f'user_online_{self.user.id}')
-    
-    async def broadcast_online_status(self, is_online):
-        """Broadcast online status change to all connected users"""
-        from channels.layers import get_channel_layer
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            await channel_layer.group_send(
-                'online_status',
-                {
-                    'type': 'online_status_change',
-                    'user_id': self.user.id,
-                    'username': self.user.username,
-                    'is_online': is_online,
-                }
-            )
 
     async def receive(self, text_data):
+        await self.renew_presence()
         try:
             data = json.loads(text_data)
+            if data.get('type') in ('heartbeat', 'ping'):
+                await self.send(text_data=json.dumps({'type': 'pong'}))
+                return
+            if data.get('type') == 'read':
+                await self.mark_read(data.get('message_id'))
+                return
+
             message_content = data.get('message', '').strip()
             
             if not message_content:
@@ -275,26 +416,31 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }))
                 return
 
-            # Save to database
-            message = await self.save_message(self.user, message_content)
+            # Queue for the batched writer; the id is known once its batch is written
+            pending = await message_writer.get_writer().submit(int(self.room_id), self.user.id, message_content)
+            message_id = await pending.assigned
             
-            if message:
+            if message_id is not None:
                 # Broadcast to everyone in room
                 await self.channel_layer.group_send(
                     self.room_group,
                     {
                         'type': 'chat_message',
                         'message': {
-                            'id': message.id,
-                            'content': message.content,
+                            'id': message_id,
+                            'content': pending.content,
                             'sender_id': self.user.id,
                             'sender_username': self.user.username,
                             'room_id': self.room_id,
-                            'created_at': message.created_at.isoformat(),
-                            'is_read': message.is_read,
+                            'created_at': pending.created_at.isoformat(),
+                            'is_read': False,
                         },
                     }
                 )
+            # The sender's ack waits for the commit; keep the task referenced until it is sent
+            task = asyncio.ensure_future(self.ack_when_durable(pending, data.get('client_id')))
+            self.ack_tasks.add(task)
+            task.add_done_callback(self.ack_tasks.discard)
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
                 'error': 'Invalid JSON format'
@@ -304,6 +450,40 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'error': str(e)
             }))
 
+    async def ack_when_durable(self, pending, client_id):
+        """Ack the sender once the message is committed, or report that it could not be stored"""
+        try:
+            await pending.durable
+        except RuntimeError as e:
+            ack = {'type': 'ack', 'action': 'send', 'client_id': client_id, 'ok': False, 'error': str(e)}
+        else:
+            ack = {'type': 'ack', 'action': 'send', 'client_id': client_id, 'ok': True, 'message_id': pending.id}
+        try:
+            await self.send(text_data=json.dumps(ack))
+        except Exception:
+            # The socket closed before the batch was written
+            pass
+
+    async def mark_read(self, message_id):
+        """Move this user's watermark in the room and tell the other participants"""
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            return
+        read_upto = await direct_messages.run_db(read_state.mark_room_read, int(self.room_id), self.user.id, message_id)
+        if read_upto is not None:
+            group, event = read_state.room_event(self.room_id, self.user.id, read_upto)
+            await self.channel_layer.group_send(group, event)
+
+    async def read_up_to(self, event):
+        """A participant read the room up to a message"""
+        await self.send(text_data=json.dumps({
+            'type': 'read_up_to',
+            'room_id': event['room_id'],
+            'user_id': event['user_id'],
+            'message_id': event['message_id'],
+        }))
+
     async def chat_message(self, event):
         """Send message to WebSocket"""
         await self.send(text_data=json.dumps({
@@ -326,21 +506,5 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return self.user in room.participants.all()
         except Room.DoesNotExist:
             return False
-
-    @database_sync_to_async
-    def save_message(self, user, content):
-        """Save message to database"""
-        try:
-            room = Room.objects.get(id=self.room_id)
-            message = Message.objects.create(
-                room=room,
-                sender=user,
-                content=content
-            )
-            # Update room's updated_at
-            room.save()
-            return message
-        except Room.DoesNotExist:
-            return None
     
 """ End of Chat Consumer """
\ No newline at end of file
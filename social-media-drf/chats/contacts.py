@@ -0,0 +1,211 @@
+# chats/contacts.py
+"""
+Messaging permission state of a user pair, for the direct message send path.
+
+The pair's DirectConversation row, keyed by (lower id, higher id), holds
+everything the send checks need:
+- blocks in both directions;
+- whether the pair is an accepted contact (AcceptedMessage);
+- whether they have exchanged messages;
+- each side's outstanding message request.
+state() reads those columns with one indexed lookup. It caches the
+result as a ContactState in this process for CONTACT_STATE_LOCAL_TTL
+seconds and in the shared cache for CONTACT_STATE_TTL seconds. A warm
+check costs no query, and a miss costs exactly one.
+
+Each pair also has a version number in the shared cache, and a state
+is stored there tagged with the version read before it was loaded. A
+state tagged with an older version is ignored, so a read that loaded
+the row just before a write can't overwrite the fresh state.
+
+The receivers in chats/models.py write through after they update the
+row. Accepting, rejecting or cancelling a request, an AcceptedMessage
+change and a block or unblock all call refresh(). refresh() bumps the
+version and drops the local copy at once, then bumps again and reloads
+the state into both caches once the transaction commits. A pair's first
+message sets has_messages the same way (message_sent()). Other processes
+keep their local copy for up to CONTACT_STATE_LOCAL_TTL seconds, so keep
+that setting short.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .conversations import ordered
+
+# Pairs kept in this process; the least recently used are dropped first
+LOCAL_MAX_ENTRIES = 10000
+
+_local = OrderedDict()  # key -> (expires at, ContactState)
+_lock = threading.Lock()
+
+NO_REQUEST = ('', None)
+
+
+class ContactState(namedtuple('ContactState', [
+    'low_id', 'high_id', 'low_blocked_high', 'high_blocked_low',
+    'accepted', 'has_messages', 'low_request', 'high_request',
+])):
+    """What a pair may do; `*_request` is (status, request id) of the request that side sent"""
+    __slots__ = ()
+
+    def blocks(self, user_id):
+        """(user blocked the other, the other blocked user)"""
+        if user_id == self.low_id:
+            return self.low_blocked_high, self.high_blocked_low
+        return self.high_blocked_low, self.low_blocked_high
+
+    @property
+    def blocked(self):
+        return self.low_blocked_high or self.high_blocked_low
+
+    @property
+    def can_message(self):
+        """Accepted contacts, or users who already have a conversation"""
+        return self.accepted or self.has_messages
+
+    def request_of(self, user_id):
+        """('pending' / 'rejected' / '', request id) of the request `user_id` sent the other"""
+        return self.low_request if user_id == self.low_id else self.high_request
+
+
+def _key(low_id, high_id):
+    return f'contact_state_{low_id}_{high_id}'
+
+
+def _version_key(key):
+    return f'{key}_v'
+
+
+def _new_version():
+    # Seeds a missing version; a timestamp won't repeat one that stored states still carry
+    return time.time_ns() // 1000
+
+
+def _load(low_id, high_id):
+    from .models import DirectConversation
+
+    row = DirectConversation.objects.filter(user_low_id=low_id, user_high_id=high_id).values(
+        'low_blocked_high', 'high_blocked_low', 'accepted', 'message_count',
+        'low_request_status', 'low_request_id', 'high_request_status', 'high_request_id',
+    ).first()
+    if row is None:
+        return ContactState(low_id, high_id, False, False, False, False, NO_REQUEST, NO_REQUEST)
+    return ContactState(
+        low_id, high_id, row['low_blocked_high'], row['high_blocked_low'], row['accepted'],
+        row['message_count'] > 0,
+        (row['low_request_status'], row['low_request_id']),
+        (row['high_request_status'], row['high_request_id']),
+    )
+
+
+def _local_get(key):
+    with _lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return entry[1]
+
+
+def _remember(key, state):
+    with _lock:
+        _local[key] = (time.monotonic() + getattr(settings, 'CONTACT_STATE_LOCAL_TTL', 5), state)
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _shared_get(key):
+    """(the shared cache's state or None, the pair's current version)"""
+    version_key = _version_key(key)
+    cached = cache.get_many([key, version_key])
+    version = cached.get(version_key)
+    entry = cached.get(key)
+    if version is None:
+        # A state stored under an evicted version can't be trusted
+        entry = None
+        version = _new_version()
+        if not cache.add(version_key, version, timeout=None):
+            version = cache.get(version_key, version)
+    if entry is not None and entry[0] == version:
+        return entry[1], version
+    return None, version
+
+
+def _store(key, version, state):
+    cache.set(key, (version, state), getattr(settings, 'CONTACT_STATE_TTL', 600))
+    _remember(key, state)
+
+
+def _bump(key):
+    """Invalidate the shared state; returns the new version"""
+    try:
+        return cache.incr(_version_key(key))
+    except ValueError:
+        version = _new_version()
+        cache.set(_version_key(key), version, timeout=None)
+        return version
+
+
+def _forget(key):
+    with _lock:
+        _local.pop(key, None)
+    _bump(key)
+
+
+def state(user_id, other_id):
+    """The pair's ContactState: from this process, else the shared cache, else one query"""
+    low_id, high_id = ordered(user_id, other_id)
+    key = _key(low_id, high_id)
+    current = _local_get(key)
+    if current is not None:
+        return current
+    current, version = _shared_get(key)
+    if current is None:
+        current = _load(low_id, high_id)
+        _store(key, version, current)
+    else:
+        _remember(key, current)
+    return current
+
+
+def forget_pairs(pairs):
+    """Drop the cached states of (user id, user id) pairs whose rows were recomputed"""
+    for user_id, other_id in pairs:
+        _forget(_key(*ordered(user_id, other_id)))
+
+
+def refresh(user_id, other_id):
+    """The pair's row changed: drop the cached state now, write the new one through on commit"""
+    low_id, high_id = ordered(user_id, other_id)
+    key = _key(low_id, high_id)
+    _forget(key)
+
+    def write_through():
+        version = _bump(key)
+        _store(key, version, _load(low_id, high_id))
+    transaction.on_commit(write_through)
+
+
+def message_sent(sender_id, receiver_id):
+    """A direct message was created: a cached state without messages gets has_messages"""
+    low_id, high_id = ordered(sender_id, receiver_id)
+    key = _key(low_id, high_id)
+
+    def write_through():
+        current, version = _shared_get(key)
+        if current is None:
+            # Nothing current to patch; the next read loads the row
+            with _lock:
+                _local.pop(key, None)
+        elif not current.has_messages:
+            _store(key, version, current._replace(has_messages=True))
+    transaction.on_commit(write_through)
@@ -0,0 +1,341 @@
+# chats/conversations.py
+"""
+Maintain the DirectConversation summary rows behind the conversation list.
+
+There is one row per user pair, stored as (lower id, higher id). Message,
+MessageRequest, AcceptedMessage and BlockedUser receivers in chats/models.py
+keep it current:
+- a new direct message moves the last message, adds one to the message
+  count and one unread to the receiver's side;
+- edits refresh the preview;
+- deleting the last message falls back to the previous one;
+- requests, accepted contacts and blocks set their fields, which are
+  also the pair's contact state for the send checks (chats/contacts.py).
+Each side also has a read watermark, the id of the last message it has
+read. mark_read() moves it forward and recounts that side's unread, so
+opening a conversation writes this one row instead of every message.
+Counters move with F() expressions, so concurrent writers don't
+lose updates. The rebuild_direct_conversations command recomputes rows
+from the source tables.
+"""
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+PREVIEW_LENGTH = 255
+
+
+def ordered(user_a_id, user_b_id):
+    """Return the pair as (lower id, higher id)"""
+    return (user_a_id, user_b_id) if user_a_id < user_b_id else (user_b_id, user_a_id)
+
+
+def _pair_filter(low_id, high_id):
+    return Q(user_low_id=low_id, user_high_id=high_id)
+
+
+def _between(user_a_id, user_b_id, sender='sender_id', receiver='receiver_id'):
+    return (
+        Q(**{sender: user_a_id, receiver: user_b_id}) |
+        Q(**{sender: user_b_id, receiver: user_a_id})
+    )
+
+
+def _preview(content):
+    return (content or '')[:PREVIEW_LENGTH]
+
+
+def _unread_field(low_id, receiver_id):
+    return 'unread_low' if receiver_id == low_id else 'unread_high'
+
+
+def _read_field(low_id, reader_id):
+    return 'low_read_upto' if reader_id == low_id else 'high_read_upto'
+
+
+def _request_fields(low_id, high_id):
+    """The latest pending request between the pair, and each side's outstanding request"""
+    from .models import MessageRequest
+
+    requests = list(
+        MessageRequest.objects.filter(_between(low_id, high_id), status__in=('pending', 'rejected'))
+        .order_by('-created_at', '-id')
+    )
+    fields = {'pending_request': next((r for r in requests if r.status == 'pending'), None)}
+    for side, sender_id in (('low', low_id), ('high', high_id)):
+        sent = [r for r in requests if r.sender_id == sender_id]
+        # A pending request decides the answer before an older rejection (SendDirectMessageView)
+        request = next((r for r in sent if r.status == 'pending'), None) or next(iter(sent), None)
+        fields[f'{side}_request_status'] = request.status if request else ''
+        fields[f'{side}_request_id'] = request.id if request else None
+    return fields
+
+
+def _contact_fields(low_id, high_id):
+    """Blocks and accepted contact of the pair, from the source tables"""
+    from .models import AcceptedMessage, BlockedUser
+
+    blocks = set(
+        BlockedUser.objects.filter(_between(low_id, high_id, 'blocker_id', 'blocked_id'))
+        .values_list('blocker_id', flat=True)
+    )
+    return {
+        'low_blocked_high': low_id in blocks,
+        'high_blocked_low': high_id in blocks,
+        'accepted': AcceptedMessage.objects.filter(_between(low_id, high_id, 'user1_id', 'user2_id')).exists(),
+    }
+
+
+def _get_or_create(low_id, high_id):
+    from .models import DirectConversation
+
+    conversation = DirectConversation.objects.filter(_pair_filter(low_id, high_id)).first()
+    if conversation is not None:
+        return conversation
+    fields = _request_fields(low_id, high_id)
+    fields.pop('pending_request')
+    conversation, _ = DirectConversation.objects.get_or_create(
+        user_low_id=low_id,
+        user_high_id=high_id,
+        defaults={**_contact_fields(low_id, high_id), **fields}
+    )
+    return conversation
+
+
+def record_message(message):
+    """A direct message was created"""
+    from .models import DirectConversation
+
+    low_id, high_id = ordered(message.sender_id, message.receiver_id)
+    _get_or_create(low_id, high_id)
+    counters = {'message_count': F('message_count') + 1}
+    if not message.is_read:
+        field = _unread_field(low_id, message.receiver_id)
+        counters[field] = F(field) + 1
+    # Never move the summary back to an older message (out-of-order writers)
+    DirectConversation.objects.filter(_pair_filter(low_id, high_id)).filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+    ).update(
+        last_message_id=message.id,
+        last_message_at=message.created_at,
+        last_message_preview=_preview(message.content),
+        last_sender_id=message.sender_id,
+        last_activity_at=message.created_at,
+        updated_at=timezone.now(),
+        **counters
+    )
+    # Count the message even when a newer one already won the summary
+    DirectConversation.objects.filter(
+        _pair_filter(low_id, high_id), last_message_at__gt=message.created_at
+    ).update(**counters)
+
+
+def message_edited(message):
+    """A direct message's content changed"""
+    from .models import DirectConversation
+
+    low_id, high_id = ordered(message.sender_id, message.receiver_id)
+    DirectConversation.objects.filter(
+        _pair_filter(low_id, high_id), last_message_id=message.id
+    ).update(last_message_preview=_preview(message.content), updated_at=timezone.now())
+
+
+def message_deleted(message):
+    """A direct message was deleted"""
+    from .models import DirectConversation
+
+    low_id, high_id = ordered(message.sender_id, message.receiver_id)
+    conversation = DirectConversation.objects.filter(_pair_filter(low_id, high_id)).first()
+    if conversation is None:
+        return
+
+    updates = {'updated_at': timezone.now(), 'message_count': F('message_count') - 1}
+    was_unread = message.id > read_upto(conversation, message.receiver_id)
+    if was_unread:
+        field = _unread_field(low_id, message.receiver_id)
+        updates[field] = F(field) - 1
+    # SET_NULL has already cleared last_message_id when the deleted message was the last one
+    if conversation.last_message_id in (None, message.id):
+        pending = conversation.pending_request if conversation.pending_request_id else None
+        updates.update(_last_message_fields(low_id, high_id, pending))
+    DirectConversation.objects.filter(pk=conversation.pk).update(**updates)
+    return was_unread
+
+
+def _last_message_fields(low_id, high_id, pending_request):
+    from .models import Message
+
+    last = (
+        Message.objects.filter(_between(low_id, high_id), room__isnull=True)
+        .order_by('-created_at', '-id')
+        .only('id', 'created_at', 'content', 'sender_id')
+        .first()
+    )
+    if last is None:
+        return {
+            'last_message_id': None,
+            'last_message_at': None,
+            'last_message_preview': '',
+            'last_sender_id': None,
+            'last_activity_at': pending_request.created_at if pending_request else None,
+        }
+    return {
+        'last_message_id': last.id,
+        'last_message_at': last.created_at,
+        'last_message_preview': _preview(last.content),
+        'last_sender_id': last.sender_id,
+        'last_activity_at': last.created_at,
+    }
+
+
+def mark_read(reader_id, other_id, message_id=None):
+    """
+    `reader_id` has read what `other_id` sent up to `message_id` (default:
+    the last message). Returns (new watermark, unread messages cleared);
+    the watermark is None when it did not move.
+    """
+    from .models import DirectConversation, Message
+
+    low_id, high_id = ordered(reader_id, other_id)
+    unread_field, read_field = _unread_field(low_id, reader_id), _read_field(low_id, reader_id)
+    with transaction.atomic():
+        conversation = (
+            DirectConversation.objects.select_for_update()
+            .filter(_pair_filter(low_id, high_id))
+            .only('id', 'last_message_id', unread_field, read_field)
+            .first()
+        )
+        if conversation is None or conversation.last_message_id is None:
+            return None, 0
+        upto = conversation.last_message_id if message_id is None else min(message_id, conversation.last_message_id)
+        if upto <= getattr(conversation, read_field):
+            return None, 0
+        if upto == conversation.last_message_id:
+            unread = 0
+        else:
+            unread = Message.objects.filter(
+                sender_id=other_id, receiver_id=reader_id, room__isnull=True, id__gt=upto
+            ).count()
+        DirectConversation.objects.filter(pk=conversation.pk).update(
+            **{read_field: upto, unread_field: unread}
+        )
+    return upto, max(0, getattr(conversation, unread_field) - unread)
+
+
+def set_blocked(blocker_id, blocked_id, blocked):
+    """Mirror a BlockedUser row onto the pair's summary"""
+    from .models import DirectConversation
+
+    low_id, high_id = ordered(blocker_id, blocked_id)
+    if blocked:
+        # A block is contact state even between users who never wrote to each other
+        _get_or_create(low_id, high_id)
+    field = 'low_blocked_high' if blocker_id == low_id else 'high_blocked_low'
+    DirectConversation.objects.filter(_pair_filter(low_id, high_id)).update(**{field: blocked})
+
+
+def refresh_accepted(user_a_id, user_b_id):
+    """Mirror the pair's AcceptedMessage rows (either column order) onto its summary"""
+    from .models import AcceptedMessage, DirectConversation
+
+    low_id, high_id = ordered(user_a_id, user_b_id)
+    accepted = AcceptedMessage.objects.filter(_between(low_id, high_id, 'user1_id', 'user2_id')).exists()
+    if accepted:
+        _get_or_create(low_id, high_id)
+    DirectConversation.objects.filter(_pair_filter(low_id, high_id)).update(accepted=accepted)
+
+
+def refresh_requests(sender_id, receiver_id):
+    """
+    Point the summary at the latest pending request between the two users
+    and record each side's outstanding (pending or rejected) request.
+    """
+    from .models import DirectConversation
+
+    low_id, high_id = ordered(sender_id, receiver_id)
+    fields = _request_fields(low_id, high_id)
+    if not (fields['low_request_id'] or fields['high_request_id']):
+        conversation = DirectConversation.objects.filter(_pair_filter(low_id, high_id)).first()
+        if conversation is None:
+            return
+    else:
+        conversation = _get_or_create(low_id, high_id)
+
+    pending = fields['pending_request']
+    DirectConversation.objects.filter(pk=conversation.pk).update(
+        **fields,
+        # A message, when there is one, decides the position in the list
+        last_activity_at=conversation.last_message_at or (pending.created_at if pending else None),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild(pairs):
+    """Recompute the summaries of the given (user id, user id) pairs from the source tables"""
+    from .models import DirectConversation, Message
+
+    rebuilt = 0
+    for user_a_id, user_b_id in pairs:
+        low_id, high_id = ordered(user_a_id, user_b_id)
+        requests = _request_fields(low_id, high_id)
+        fields = _last_message_fields(low_id, high_id, requests['pending_request'])
+        # Keep the watermarks, or start them from the old per-message is_read flags
+        existing = DirectConversation.objects.filter(_pair_filter(low_id, high_id)).first()
+        legacy = dict(
+            Message.objects.filter(_between(low_id, high_id), room__isnull=True, is_read=True)
+            .values('receiver_id').annotate(upto=Max('id'))
+            .values_list('receiver_id', 'upto')
+        )
+        marks = {
+            user_id: max(read_upto(existing, user_id) if existing else 0, legacy.get(user_id) or 0)
+            for user_id in (low_id, high_id)
+        }
+        unread = {
+            user_id: Message.objects.filter(
+                sender_id=other_id, receiver_id=user_id, room__isnull=True, id__gt=marks[user_id]
+            ).count()
+            for user_id, other_id in ((low_id, high_id), (high_id, low_id))
+        }
+        DirectConversation.objects.update_or_create(
+            user_low_id=low_id,
+            user_high_id=high_id,
+            defaults={
+                **fields,
+                **requests,
+                **_contact_fields(low_id, high_id),
+                'unread_low': unread.get(low_id, 0),
+                'unread_high': unread.get(high_id, 0),
+                'message_count': Message.objects.filter(_between(low_id, high_id), room__isnull=True).count(),
+                'low_read_upto': marks[low_id],
+                'high_read_upto': marks[high_id],
+            }
+        )
+        rebuilt += 1
+    return rebuilt
+
+
+def for_user(conversation, user_id):
+    """The summary from `user_id`'s side: (other user, unread, i_blocked_them, they_blocked_me)"""
+    if conversation.user_low_id == user_id:
+        return (
+            conversation.user_high,
+            unread_of(conversation, user_id),
+            conversation.low_blocked_high,
+            conversation.high_blocked_low,
+        )
+    return (
+        conversation.user_low,
+        max(0, conversation.unread_high),
+        conversation.high_blocked_low,
+        conversation.low_blocked_high,
+    )
+
+
+def unread_of(conversation, user_id):
+    """Unread messages addressed to `user_id` in the conversation"""
+    return max(0, conversation.unread_low if conversation.user_low_id == user_id else conversation.unread_high)
+
+
+def read_upto(conversation, user_id):
+    """Id of the last message `user_id` has read in the conversation"""
+    return conversation.low_read_upto if conversation.user_low_id == user_id else conversation.high_read_upto
@@ -0,0 +1,116 @@
+# chats/direct_messages.py
+"""
+Direct message operations shared by the REST views and DirectMessageConsumer.
+
+The permission checks read the pair's cached ContactState
+(chats/contacts.py), because the WebSocket path checks them on every
+frame.
+
+send() / edit() / delete() raise DirectMessageError with a short code the
+consumer puts in its ack; run_db() runs them on a bounded thread pool.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+
+from . import contacts
+
+_executor = None
+
+
+class DirectMessageError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def payload(message):
+    """The message as broadcast to both users' `user_<id>` groups"""
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender_id': message.sender_id,
+        'sender_username': message.sender.username,
+        'receiver_id': message.receiver_id,
+        'created_at': message.created_at.isoformat(),
+        'is_read': message.is_read,
+    }
+
+
+def send(sender, receiver_id, content):
+    """Create a direct message after the same checks as SendDirectMessageView"""
+    from .models import Message
+
+    content = (content or '').strip()
+    if not content:
+        raise DirectMessageError('invalid', 'Message content is required')
+    try:
+        receiver_id = int(receiver_id)
+    except (TypeError, ValueError):
+        raise DirectMessageError('invalid', 'receiver_id is required')
+    if receiver_id == sender.id:
+        raise DirectMessageError('invalid', 'Cannot send message to yourself')
+
+    state = contacts.state(sender.id, receiver_id)
+    i_blocked, they_blocked = state.blocks(sender.id)
+    if i_blocked:
+        raise DirectMessageError('blocked', 'You have blocked this user')
+    if they_blocked:
+        raise DirectMessageError('blocked', 'This user has blocked you')
+    if not state.can_message:
+        from django.contrib.auth import get_user_model
+        if not get_user_model().objects.filter(id=receiver_id).exists():
+            raise DirectMessageError('not_found', 'Receiver user not found')
+        # Message requests keep going through POST /api/chat/messages/send/
+        raise DirectMessageError('request_required', 'Send a message request to this user first')
+
+    message = Message.objects.create(sender=sender, receiver_id=receiver_id, content=content)
+    message.sender = sender
+    return message
+
+
+def edit(user, message_id, content):
+    """Change the content of one of `user`'s direct messages"""
+    from .models import Message
+
+    content = (content or '').strip()
+    if not content:
+        raise DirectMessageError('invalid', 'Message content is required')
+    message = Message.objects.filter(id=message_id, sender=user, room__isnull=True).first()
+    if message is None:
+        raise DirectMessageError('not_found', "Message not found or you don't have permission to edit it")
+    message.content = content
+    message.save()
+    return message
+
+
+def delete(user, message_id):
+    """Delete one of `user`'s direct messages; returns the receiver id"""
+    from .models import Message
+
+    message = Message.objects.filter(id=message_id, sender=user, room__isnull=True).first()
+    if message is None:
+        raise DirectMessageError('not_found', "Message not found or you don't have permission to delete it")
+    receiver_id = message.receiver_id
+    message.delete()
+    return receiver_id
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'CHAT_WS_DB_WORKERS', 8),
+            thread_name_prefix='chat-ws-db',
+        )
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run blocking ORM work for a consumer on a bounded thread pool
+    (CHAT_WS_DB_WORKERS), instead of the single thread-sensitive thread.
+    """
+    return await DatabaseSyncToAsync(func, thread_sensitive=False, executor=_get_executor())(*args, **kwargs)
@@ -0,0 +1,139 @@
+# chats/history.py
+"""
+Cursor-paginated message history for rooms and direct conversations.
+
+A window holds the newest `limit` messages, or the ones just before or
+after a cursor. Cursors are opaque strings that encode a message's
+(created_at, id). Keyset filters on those two columns walk the
+(room, -created_at) and (sender, receiver, -created_at) indexes, so a
+window costs the same whatever the length of the history.
+
+Query params understood by window_options():
+    limit    messages per window (CHAT_HISTORY_WINDOW, capped at CHAT_HISTORY_MAX_WINDOW)
+    before   cursor; return the messages older than it (scrolling back)
+    after    cursor; return the messages newer than it (catching up)
+
+Rows are a compact projection (ids and usernames, no nested user
+objects), returned oldest to newest like the previous responses.
+"""
+import base64
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .reactions import ReactionSummaries
+
+FIELDS = (
+    'id', 'room_id', 'sender_id', 'sender__username', 'receiver_id', 'content', 'is_read', 'created_at',
+    'reaction_counts',
+)
+
+
+def encode_cursor(created_at, message_id):
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor; ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (TypeError, UnicodeDecodeError, ValueError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+
+
+def window_options(request):
+    """Return (limit, before, after) from the query params; ValueError on bad input"""
+    default = getattr(settings, 'CHAT_HISTORY_WINDOW', 100)
+    maximum = getattr(settings, 'CHAT_HISTORY_MAX_WINDOW', 200)
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    limit = min(max(1, limit), maximum)
+
+    before = request.query_params.get('before')
+    after = request.query_params.get('after')
+    if before and after:
+        raise ValueError('Use either before or after, not both')
+    return limit, decode_cursor(before) if before else None, decode_cursor(after) if after else None
+
+
+def _fetch(queryset, limit, before, after):
+    if after is not None:
+        created_at, message_id = after
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+        ).order_by('created_at', 'id')
+    else:
+        if before is not None:
+            created_at, message_id = before
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+            )
+        queryset = queryset.order_by('-created_at', '-id')
+    return list(queryset.values(*FIELDS)[:limit + 1])
+
+
+def window(querysets, limit, before=None, after=None):
+    """
+    Return (rows, has_more) for one window over the union of `querysets`.
+
+    Direct conversations pass one queryset per direction, so each one is a
+    plain index range scan, and the results are merged here. That avoids an
+    OR over both directions that the database has to sort in full.
+    """
+    newer_first = after is None
+    key = (lambda row: (row['created_at'], row['id']))
+    runs = [_fetch(queryset, limit, before, after) for queryset in querysets]
+    rows = list(heapq.merge(*runs, key=key, reverse=newer_first))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newer_first:
+        rows.reverse()
+    return rows, has_more
+
+
+def serialize(rows, user, is_read=None):
+    """
+    Compact message dicts, with reaction counts and `user`'s own reaction.
+    `is_read(row)` decides the read flag (see read_state.read_flags()).
+    """
+    summaries = ReactionSummaries({row['id']: row['reaction_counts'] for row in rows}, user)
+    return [
+        {
+            'id': row['id'],
+            'room_id': row['room_id'],
+            'sender_id': row['sender_id'],
+            'sender_username': row['sender__username'],
+            'receiver_id': row['receiver_id'],
+            'content': row['content'],
+            'is_read': is_read(row) if is_read else row['is_read'],
+            'created_at': row['created_at'],
+            'reactions': summaries.counts_of(row['id']),
+            'user_reaction': summaries.reaction_of(row['id']),
+        }
+        for row in rows
+    ]
+
+
+def page(querysets, request, limit, before=None, after=None, is_read=None):
+    """Return (data, pagination) for the window the request asked for"""
+    rows, has_more = window(querysets, limit, before, after)
+    return page_of(rows, has_more, request, limit, is_read)
+
+
+def page_of(rows, has_more, request, limit, is_read=None):
+    """(data, pagination) for a window already fetched with window()"""
+    pagination = {
+        'limit': limit,
+        'has_more': has_more,
+        # Pass as ?before= to load older messages, or ?after= to load newer ones
+        'before': encode_cursor(rows[0]['created_at'], rows[0]['id']) if rows else None,
+        'after': encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if rows else None,
+    }
+    return serialize(rows, request.user, is_read), pagination
@@ -0,0 +1,160 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+from utils.local_channel_layer import LocalChannelLayer
+
+
+async def _point_to_point(layer, count):
+    """Send `count` messages to one channel while a consumer drains it"""
+    channel = await layer.new_channel()
+
+    async def consume():
+        for _ in range(count):
+            await layer.receive(channel)
+
+    consumer = asyncio.ensure_future(consume())
+    started = time.perf_counter()
+    for i in range(count):
+        await layer.send(channel, {'type': 'bench.message', 'n': i})
+    await consumer
+    return count / (time.perf_counter() - started)
+
+
+async def _fanout(layer, count, members):
+    """group_send `count` messages to a group of `members` channels; returns deliveries/s"""
+    channels = [await layer.new_channel() for _ in range(members)]
+    for channel in channels:
+        await layer.group_add('bench', channel)
+
+    async def consume(channel):
+        for _ in range(count):
+            await layer.receive(channel)
+
+    consumers = [asyncio.ensure_future(consume(channel)) for channel in channels]
+    started = time.perf_counter()
+    for i in range(count):
+        await layer.group_send('bench', {'type': 'bench.message', 'n': i})
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - started
+    for channel in channels:
+        await layer.group_discard('bench', channel)
+    return count * members / elapsed
+
+
+def _worker(path, capacity, count, members, ready, done):
+    """Worker process: join the group with `members` channels and receive every message"""
+    async def run():
+        layer = LocalChannelLayer(path=path, capacity=capacity)
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add('bench.workers', channel)
+        ready.release()
+
+        async def consume(channel):
+            for _ in range(count):
+                await layer.receive(channel)
+
+        await asyncio.gather(*(consume(channel) for channel in channels))
+        done.release()
+
+    asyncio.run(run())
+
+
+async def _send_group(path, capacity, count):
+    layer = LocalChannelLayer(path=path, capacity=capacity)
+    for i in range(count):
+        await layer.group_send('bench.workers', {'type': 'bench.message', 'n': i})
+
+
+class Command(BaseCommand):
+    help = 'Measure channel layer throughput: InMemoryChannelLayer vs LocalChannelLayer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000, help='Messages per test (default: 20000)')
+        parser.add_argument('--group-size', type=int, default=20, help='Channels in the fan-out group (default: 20)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Worker processes for the cross-process LocalChannelLayer test (default: 4, 0 to skip)'
+        )
+        parser.add_argument(
+            '--socket',
+            help='Use a running broker at this path instead of starting one'
+        )
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        members = options['group_size']
+        capacity = max(count, 100) + 1
+
+        broker = None
+        path = options['socket']
+        if not path:
+            path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+            broker = subprocess.Popen([
+                sys.executable, sys.argv[0], 'run_channel_broker',
+                '--socket', path, '--capacity', str(capacity),
+            ], stdout=subprocess.DEVNULL)
+            for _ in range(100):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.1)
+            else:
+                broker.terminate()
+                raise CommandError('The channel broker did not start')
+
+        try:
+            rows = []
+            for name, layer in (
+                ('InMemoryChannelLayer', InMemoryChannelLayer(capacity=capacity)),
+                ('LocalChannelLayer', LocalChannelLayer(path=path, capacity=capacity)),
+            ):
+                rows.append((name, 'send/receive', asyncio.run(_point_to_point(layer, count))))
+                rows.append((name, f'group_send x{members}', asyncio.run(_fanout(layer, count // members or 1, members))))
+
+            workers = options['workers']
+            if workers:
+                rows.append((
+                    'LocalChannelLayer',
+                    f'group_send to {workers} processes x{members}',
+                    self._cross_process(path, capacity, count // members or 1, members, workers),
+                ))
+
+            self.stdout.write(f"{'layer':<22} {'test':<36} {'messages/s':>12}")
+            for name, test, rate in rows:
+                self.stdout.write(f'{name:<22} {test:<36} {rate:>12,.0f}')
+        finally:
+            if broker is not None:
+                broker.terminate()
+                broker.wait()
+
+    def _cross_process(self, path, capacity, count, members, workers):
+        """Deliveries/s when one process group_sends to channels spread over `workers` processes"""
+        context = multiprocessing.get_context('fork')
+        ready = context.Semaphore(0)
+        done = context.Semaphore(0)
+        processes = [
+            context.Process(target=_worker, args=(path, capacity, count, members, ready, done))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+
+        started = time.perf_counter()
+        asyncio.run(_send_group(path, capacity, count))
+        for _ in processes:
+            done.acquire()
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+        return count * members * workers / elapsed
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from chats import contacts, conversations
+from chats.models import AcceptedMessage, BlockedUser, DirectConversation, Message, MessageRequest
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DirectConversation summaries behind the conversation list'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild conversations of the given user id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+
+        messages = Message.objects.filter(room__isnull=True, sender__isnull=False, receiver__isnull=False)
+        requests = MessageRequest.objects.filter(status__in=('pending', 'rejected'))
+        accepted = AcceptedMessage.objects.all()
+        blocks = BlockedUser.objects.all()
+        summaries = DirectConversation.objects.all()
+        if user_ids:
+            messages = messages.filter(Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids))
+            requests = requests.filter(Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids))
+            accepted = accepted.filter(Q(user1_id__in=user_ids) | Q(user2_id__in=user_ids))
+            blocks = blocks.filter(Q(blocker_id__in=user_ids) | Q(blocked_id__in=user_ids))
+            summaries = summaries.filter(Q(user_low_id__in=user_ids) | Q(user_high_id__in=user_ids))
+
+        pairs = set()
+        for queryset, fields in (
+            (messages, ('sender_id', 'receiver_id')),
+            # Pairs with only contact state (chats/contacts.py) have a row too
+            (requests, ('sender_id', 'receiver_id')),
+            (accepted, ('user1_id', 'user2_id')),
+            (blocks, ('blocker_id', 'blocked_id')),
+            # Existing rows are recomputed too, so stale summaries get cleared
+            (summaries, ('user_low_id', 'user_high_id')),
+        ):
+            for user_a_id, user_b_id in queryset.order_by().values_list(*fields).distinct().iterator():
+                if user_a_id != user_b_id:
+                    pairs.add(conversations.ordered(user_a_id, user_b_id))
+
+        rebuilt = conversations.rebuild(sorted(pairs))
+        contacts.forget_pairs(pairs)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rebuilt} direct conversation summary row(s).')
+        )
@@ -0,0 +1,66 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run several daphne workers that accept connections from one shared listening socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='0.0.0.0', help='Address to listen on (default: 0.0.0.0)')
+        parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=int(os.environ.get('WEB_CONCURRENCY', 0)) or os.cpu_count() or 1,
+            help='Number of daphne processes (default: $WEB_CONCURRENCY, else one per core)'
+        )
+        parser.add_argument(
+            '--application',
+            default='app.asgi:application',
+            help='ASGI application path (default: app.asgi:application)'
+        )
+
+    def handle(self, *args, **options):
+        # Bound once here; every worker inherits the descriptor and accepts from it
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((options['bind'], options['port']))
+        listener.listen(socket.SOMAXCONN)
+        listener.set_inheritable(True)
+        fd = listener.fileno()
+
+        command = [sys.executable, '-m', 'daphne', '--fd', str(fd), options['application']]
+        workers = [subprocess.Popen(command, pass_fds=[fd]) for _ in range(options['workers'])]
+        listener.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Started {len(workers)} daphne workers on {options['bind']}:{options['port']}"
+        ))
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.send_signal(signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        # A worker that dies takes the others down, so the container restarts as a whole
+        exit_code = 0
+        while any(worker.poll() is None for worker in workers):
+            for worker in workers:
+                if worker.returncode is not None and not stopping:
+                    exit_code = worker.returncode or 1
+                    self.stderr.write(f'Daphne worker {worker.pid} exited with {worker.returncode}; stopping')
+                    stop(None, None)
+            time.sleep(0.5)
+        sys.exit(exit_code)
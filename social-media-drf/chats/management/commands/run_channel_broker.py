@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from utils.local_channel_layer import DEFAULT_PATH, Broker
+
+
+class Command(BaseCommand):
+    help = 'Run the channel broker used by utils.local_channel_layer.LocalChannelLayer'
+
+    def add_arguments(self, parser):
+        config = settings.CHANNEL_LAYERS.get('default', {}).get('CONFIG', {})
+        parser.add_argument(
+            '--socket',
+            default=config.get('path', DEFAULT_PATH),
+            help='Unix socket path to listen on (default: the default channel layer\'s CONFIG path)'
+        )
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=config.get('capacity', 100),
+            help='Messages kept per normal channel (default: 100)'
+        )
+        parser.add_argument(
+            '--expiry',
+            type=int,
+            default=config.get('expiry', 60),
+            help='Seconds a queued message stays deliverable (default: 60)'
+        )
+        parser.add_argument(
+            '--cache-entries',
+            type=int,
+            default=100000,
+            help='Entries kept for utils.broker_cache.BrokerCache before culling (default: 100000)'
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO)
+        broker = Broker(
+            path=options['socket'],
+            capacity=options['capacity'],
+            expiry=options['expiry'],
+            cache_max_entries=options['cache_entries'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Channel broker listening on {options['socket']}"))
+        try:
+            asyncio.run(broker.serve())
+        except KeyboardInterrupt:
+            pass
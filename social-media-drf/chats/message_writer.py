@@ -0,0 +1,143 @@
+# chats/message_writer.py
+"""
+Write-behind persistence for group chat messages (ChatConsumer).
+
+Each process has one writer per event loop. submit() queues a message
+and returns a PendingMessage. The writer flushes the queue every
+CHAT_WRITE_BEHIND_WINDOW seconds, or sooner once CHAT_WRITE_BEHIND_BATCH
+messages are waiting. A flush is one bulk_create plus one UPDATE of
+Room.updated_at and Room.message_count per room in the batch, in a single
+transaction.
+
+Ids come from bulk_create, and `created_at` is stamped when the batch is
+written, so both follow the order messages reach the table, like any
+other insert. The read watermarks (chats/read_state.py) and history
+cursors rely on that. `assigned` therefore resolves after the flush,
+and the consumer broadcasts then.
+
+`durable` resolves once the row is committed. The consumer acks the
+sender then, which makes the ack the durability guarantee. A message
+that is never acked was lost (process crash or a failed insert) and the
+client should resend it. When a batch fails, its rows are retried one by
+one, so only the bad ones fail.
+
+bulk_create sends no post_save; the room UPDATEs do what the
+touch_room_on_message receiver would, and no other receiver acts on room
+messages.
+"""
+import asyncio
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .direct_messages import run_db
+
+logger = logging.getLogger(__name__)
+
+_writers = {}
+
+
+class PendingMessage:
+    def __init__(self, room_id, sender_id, content):
+        loop = asyncio.get_running_loop()
+        self.room_id = room_id
+        self.sender_id = sender_id
+        self.content = content
+        self.created_at = None
+        self.id = None
+        # The id once it is written (None if the insert failed); True once committed
+        self.assigned = loop.create_future()
+        self.durable = loop.create_future()
+
+
+def _insert(pending):
+    """Insert the batch (and bump room activity and counts) in one transaction; returns the rows"""
+    from .models import Message, Room
+
+    now = timezone.now()
+    messages = [
+        Message(room_id=item.room_id, sender_id=item.sender_id, content=item.content, created_at=now)
+        for item in pending
+    ]
+    with transaction.atomic():
+        Message.objects.bulk_create(messages)
+        for room_id, count in Counter(item.room_id for item in pending).items():
+            Room.objects.filter(id=room_id).update(updated_at=now, message_count=F('message_count') + count)
+    return messages
+
+
+def _write(pending):
+    """[(item, row or None, error or None)] after inserting the batch, falling back to row by row"""
+    try:
+        return [(item, message, None) for item, message in zip(pending, _insert(pending))]
+    except Exception:
+        if len(pending) == 1:
+            logger.exception('Could not store chat message for room %s', pending[0].room_id)
+            return [(pending[0], None, 'Message could not be saved')]
+    results = []
+    for item in pending:
+        results.extend(_write([item]))
+    return results
+
+
+class MessageWriter:
+    def __init__(self):
+        self._queue = []
+        self._flusher = None
+        self._wake = asyncio.Event()
+
+    @staticmethod
+    def _setting(name, default):
+        return getattr(settings, name, default)
+
+    async def submit(self, room_id, sender_id, content):
+        """Queue a message; see PendingMessage for the futures to await"""
+        item = PendingMessage(room_id, sender_id, content)
+        self._queue.append(item)
+        if len(self._queue) >= self._setting('CHAT_WRITE_BEHIND_BATCH', 200):
+            self._wake.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+        return item
+
+    async def _run(self):
+        while self._queue:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._setting('CHAT_WRITE_BEHIND_WINDOW', 0.05))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        pending, self._queue = self._queue, []
+        if not pending:
+            return
+        try:
+            results = await run_db(_write, pending)
+        except Exception:
+            logger.exception('Chat message writer failed to flush %s message(s)', len(pending))
+            results = [(item, None, 'Message could not be saved') for item in pending]
+        for item, message, error in results:
+            if error is not None:
+                item.assigned.set_result(None)
+                item.durable.set_exception(RuntimeError(error))
+                continue
+            item.id, item.created_at = message.id, message.created_at
+            item.assigned.set_result(message.id)
+            item.durable.set_result(True)
+
+
+def get_writer():
+    """The writer of the running event loop"""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        for stale in [other for other in _writers if other.is_closed()]:
+            del _writers[stale]
+        writer = _writers[loop] = MessageWriter()
+    return writer
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chats', '0008_messagereaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectConversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('last_message_preview', models.CharField(blank=True, default='', max_length=255)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_low', models.IntegerField(default=0)),
+                ('unread_high', models.IntegerField(default=0)),
+                ('low_blocked_high', models.BooleanField(default=False)),
+                ('high_blocked_low', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chats.message')),
+                ('last_sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pending_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chats.messagerequest')),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_low', '-last_activity_at'], name='chats_direc_user_lo_03fbc5_idx'), models.Index(fields=['user_high', '-last_activity_at'], name='chats_direc_user_hi_3de407_idx')],
+                'unique_together': {('user_low', 'user_high')},
+            },
+        ),
+    ]
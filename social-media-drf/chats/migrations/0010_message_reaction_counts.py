@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:28
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_reaction_counts(apps, schema_editor):
+    """Fill reaction_counts for messages that already have reactions"""
+    Message = apps.get_model('chats', 'Message')
+    MessageReaction = apps.get_model('chats', 'MessageReaction')
+    counts = {}
+    for message_id, reaction_type, count in (
+        MessageReaction.objects.values('message_id', 'reaction_type')
+        .annotate(count=Count('id')).values_list('message_id', 'reaction_type', 'count').iterator()
+    ):
+        counts.setdefault(message_id, {})[reaction_type] = count
+    for message_id, reaction_counts in counts.items():
+        Message.objects.filter(id=message_id).update(reaction_counts=reaction_counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0009_directconversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='reaction_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(backfill_reaction_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Q
+import django.db.models.deletion
+
+
+def backfill_watermarks(apps, schema_editor):
+    """Start each watermark at the newest message the old is_read flag marked read"""
+    Message = apps.get_model('chats', 'Message')
+    DirectConversation = apps.get_model('chats', 'DirectConversation')
+    Room = apps.get_model('chats', 'Room')
+    RoomReadState = apps.get_model('chats', 'RoomReadState')
+
+    for conversation in DirectConversation.objects.iterator():
+        low_id, high_id = conversation.user_low_id, conversation.user_high_id
+        read = dict(
+            Message.objects.filter(
+                Q(sender_id=low_id, receiver_id=high_id) | Q(sender_id=high_id, receiver_id=low_id),
+                room__isnull=True, is_read=True
+            ).values('receiver_id').annotate(upto=Max('id')).values_list('receiver_id', 'upto')
+        )
+        DirectConversation.objects.filter(pk=conversation.pk).update(
+            low_read_upto=read.get(low_id) or 0,
+            high_read_upto=read.get(high_id) or 0,
+        )
+
+    # Rooms had one flag for everybody, so every participant starts from the same place
+    read_upto = dict(
+        Message.objects.filter(room__isnull=False, is_read=True)
+        .values('room_id').annotate(upto=Max('id')).values_list('room_id', 'upto')
+    )
+    states = [
+        RoomReadState(room_id=room_id, user_id=user_id, last_read_message_id=read_upto[room_id])
+        for room_id, user_id in Room.participants.through.objects.filter(
+            room_id__in=list(read_upto)
+        ).values_list('room_id', 'user_id')
+    ]
+    RoomReadState.objects.bulk_create(states, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chats', '0011_message_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='directconversation',
+            name='high_read_upto',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='directconversation',
+            name='low_read_upto',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'id'], name='chats_messa_room_id_4cae35_idx'),
+        ),
+        migrations.AddField(
+            model_name='roomreadstate',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chats.room'),
+        ),
+        migrations.AddField(
+            model_name='roomreadstate',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_read_states', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='roomreadstate',
+            unique_together={('room', 'user')},
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:02
+
+from django.db import migrations
+
+from chats.search import FTS_TABLE, SEARCH_CONFIG, SQLITE_INDEX_SQL
+
+INDEX_NAME = 'chats_message_search_idx'
+
+
+def _search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector('content', config=SEARCH_CONFIG), name=INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    """GIN index on PostgreSQL, FTS5 table and triggers on SQLite"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('chats', 'Message'), _search_index())
+    elif vendor == 'sqlite':
+        for statement in SQLITE_INDEX_SQL:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('chats', 'Message'), _search_index())
+    elif vendor == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0012_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:50
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_message_counts(apps, schema_editor):
+    """Count the messages of every room and direct conversation summary"""
+    Message = apps.get_model('chats', 'Message')
+    Room = apps.get_model('chats', 'Room')
+    DirectConversation = apps.get_model('chats', 'DirectConversation')
+    for room_id, count in (
+        Message.objects.filter(room__isnull=False).values('room_id')
+        .annotate(count=Count('id')).values_list('room_id', 'count').iterator()
+    ):
+        Room.objects.filter(pk=room_id).update(message_count=count)
+    for conversation in DirectConversation.objects.iterator():
+        low_id, high_id = conversation.user_low_id, conversation.user_high_id
+        count = Message.objects.filter(
+            Q(sender_id=low_id, receiver_id=high_id) | Q(sender_id=high_id, receiver_id=low_id),
+            room__isnull=True
+        ).count()
+        DirectConversation.objects.filter(pk=conversation.pk).update(message_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0013_message_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directconversation',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='directconversation',
+            index=models.Index(fields=['-last_message_at', '-id'], name='chats_direc_last_me_7579b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['-updated_at', '-id'], name='chats_room_updated_e885fc_idx'),
+        ),
+        migrations.RunPython(backfill_message_counts, migrations.RunPython.noop),
+    ]
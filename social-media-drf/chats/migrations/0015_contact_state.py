@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+def backfill_contact_state(apps, schema_editor):
+    """Give every pair with blocks, an accepted contact or requests a summary row carrying them"""
+    AcceptedMessage = apps.get_model('chats', 'AcceptedMessage')
+    BlockedUser = apps.get_model('chats', 'BlockedUser')
+    DirectConversation = apps.get_model('chats', 'DirectConversation')
+    MessageRequest = apps.get_model('chats', 'MessageRequest')
+
+    pairs = {}
+
+    def pair(user_a_id, user_b_id):
+        low_id, high_id = sorted((user_a_id, user_b_id))
+        return pairs.setdefault((low_id, high_id), {})
+
+    for blocker_id, blocked_id in BlockedUser.objects.values_list('blocker_id', 'blocked_id').iterator():
+        if blocker_id != blocked_id:
+            fields = pair(blocker_id, blocked_id)
+            fields['low_blocked_high' if blocker_id < blocked_id else 'high_blocked_low'] = True
+    for user1_id, user2_id in AcceptedMessage.objects.values_list('user1_id', 'user2_id').iterator():
+        if user1_id != user2_id:
+            pair(user1_id, user2_id)['accepted'] = True
+    # Oldest first, so the latest request of each status wins; a pending one beats a rejection
+    requests = MessageRequest.objects.filter(status__in=('pending', 'rejected')).order_by('created_at', 'id')
+    for request_id, sender_id, receiver_id, status in requests.values_list(
+        'id', 'sender_id', 'receiver_id', 'status'
+    ).iterator():
+        if sender_id == receiver_id:
+            continue
+        fields = pair(sender_id, receiver_id)
+        side = 'low' if sender_id < receiver_id else 'high'
+        if status == 'pending' or fields.get(f'{side}_request_status') != 'pending':
+            fields[f'{side}_request_status'] = status
+            fields[f'{side}_request_id'] = request_id
+
+    for (low_id, high_id), fields in pairs.items():
+        DirectConversation.objects.update_or_create(user_low_id=low_id, user_high_id=high_id, defaults=fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0014_conversation_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directconversation',
+            name='accepted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='directconversation',
+            name='high_request_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='directconversation',
+            name='high_request_status',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='directconversation',
+            name='low_request_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='directconversation',
+            name='low_request_status',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.RunPython(backfill_contact_state, migrations.RunPython.noop),
+    ]
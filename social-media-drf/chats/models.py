@@ -2,6 +2,8 @@ from django.db import models
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 
 User = get_user_model()
 
@@ -12,11 +14,17 @@ class Room(models.Model):
     participants = models.ManyToManyField(User, blank=True, related_name='chat_rooms')
     admins = models.ManyToManyField(User, blank=True, related_name='admin_rooms')
     is_group = models.BooleanField(default=False)
+    # Kept by the Message receivers below and chats/message_writer.py
+    message_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Admin conversation index (chats/admin_conversations.py)
+            models.Index(fields=['-updated_at', '-id']),
+        ]
 
     def __str__(self):
         if self.is_group:
@@ -43,13 +51,18 @@ class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='sent_messages')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='received_messages')
     content = models.TextField(null=True, blank=True)
+    # No longer written: reads are tracked by watermarks (chats/read_state.py)
     is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # {reaction_type: count}, kept in step with MessageReaction by chats/reactions.py
+    reaction_counts = models.JSONField(default=dict, blank=True)
+    # Not auto_now_add: the write-behind writer (chats/message_writer.py) stamps each batch it writes
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['room', '-created_at']),
+            models.Index(fields=['room', 'id']),  # Unread counts above a read watermark
             models.Index(fields=['sender', '-created_at']),
             models.Index(fields=['receiver', '-created_at']),
             models.Index(fields=['sender', 'receiver', '-created_at']),  # For direct message queries
@@ -162,7 +175,7 @@ class AcceptedMessage(models.Model):
     
     @classmethod
     def can_message(cls, user1, user2):
-        """Check if two users can message each other"""
+        """Check if two users can message each other (the send path reads chats/contacts.py instead)"""
         return cls.objects.filter(
             (Q(user1=user1, user2=user2) | Q(user1=user2, user2=user1))
         ).exists()
@@ -192,4 +205,188 @@ class MessageReaction(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user.username} reacted {self.reaction_type} to message {self.message.id}"
\ No newline at end of file
+        return f"{self.user.username} reacted {self.reaction_type} to message {self.message.id}"
+
+
+class DirectConversation(models.Model):
+    """
+    Summary of the direct conversation between two users (user_low.id < user_high.id).
+    Maintained by chats/conversations.py so the conversation list is one query.
+    Pairs with blocks, an accepted contact or requests but no messages have a
+    row too, hidden from the list (last_activity_at is NULL).
+    """
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=255, blank=True, default='')
+    last_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Latest pending MessageRequest between the two, in either direction
+    pending_request = models.ForeignKey(
+        MessageRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    # Last message time, else the pending request time; NULL hides the row from the list
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    # Messages in the conversation, both directions
+    message_count = models.IntegerField(default=0)
+    # Unread messages addressed to each side
+    unread_low = models.IntegerField(default=0)
+    unread_high = models.IntegerField(default=0)
+    # Read watermarks: id of the last message each side has read (chats/read_state.py)
+    low_read_upto = models.BigIntegerField(default=0)
+    high_read_upto = models.BigIntegerField(default=0)
+    low_blocked_high = models.BooleanField(default=False)
+    high_blocked_low = models.BooleanField(default=False)
+    # Contact state read by the send checks (chats/contacts.py)
+    accepted = models.BooleanField(default=False)  # An AcceptedMessage row exists for the pair
+    # Each side's outstanding request to the other: 'pending' or 'rejected' and its id
+    low_request_status = models.CharField(max_length=10, blank=True, default='')
+    low_request_id = models.BigIntegerField(null=True, blank=True)
+    high_request_status = models.CharField(max_length=10, blank=True, default='')
+    high_request_id = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user_low', 'user_high')
+        indexes = [
+            models.Index(fields=['user_low', '-last_activity_at']),
+            models.Index(fields=['user_high', '-last_activity_at']),
+            models.Index(fields=['-last_message_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"Conversation {self.user_low_id} <-> {self.user_high_id}"
+
+
+class RoomReadState(models.Model):
+    """A user's read watermark in a room: the id of the last message they have read"""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='room_read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('room', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} read room {self.room_id} up to {self.last_read_message_id}"
+
+
+@receiver(post_save, sender=Message)
+def increment_unread_messages(sender, instance, created, **kwargs):
+    """Keep the receiver's cached unread direct message counter in step"""
+    if created and instance.receiver_id and instance.room_id is None and not instance.is_read:
+        from post.unread_counters import increment, MESSAGES
+        increment(MESSAGES, instance.receiver_id)
+
+
+@receiver(post_save, sender=Message)
+def touch_room_on_message(sender, instance, created, **kwargs):
+    """A new message is room activity (Room.updated_at orders the admin conversation index)"""
+    if created and instance.room_id is not None:
+        Room.objects.filter(pk=instance.room_id).update(
+            updated_at=timezone.now(), message_count=models.F('message_count') + 1
+        )
+
+
+def _cascaded_from(origin, *models_):
+    """Whether a post_delete is part of deleting an instance or queryset of one of `models_`"""
+    model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return model in models_
+
+
+@receiver(post_delete, sender=Message)
+def count_room_message_delete(sender, instance, origin=None, **kwargs):
+    # A room being deleted takes its counter with it
+    if instance.room_id is not None and not _cascaded_from(origin, Room):
+        Room.objects.filter(pk=instance.room_id).update(message_count=models.F('message_count') - 1)
+
+
+@receiver(post_save, sender=Message)
+def update_conversation_on_message_save(sender, instance, created, **kwargs):
+    """Keep the DirectConversation summary in step with direct messages"""
+    if instance.room_id is not None or not instance.sender_id or not instance.receiver_id:
+        return
+    from . import contacts, conversations
+    if created:
+        conversations.record_message(instance)
+        contacts.message_sent(instance.sender_id, instance.receiver_id)
+    else:
+        conversations.message_edited(instance)
+
+
+@receiver(post_delete, sender=Message)
+def update_conversation_on_message_delete(sender, instance, **kwargs):
+    """Deleting a message above the receiver's read watermark also lowers their badge"""
+    if instance.room_id is not None or not instance.sender_id or not instance.receiver_id:
+        return
+    from . import conversations
+    if conversations.message_deleted(instance):
+        from post.unread_counters import decrement, MESSAGES
+        decrement(MESSAGES, instance.receiver_id)
+
+
+@receiver(post_save, sender=MessageRequest)
+@receiver(post_delete, sender=MessageRequest)
+def update_conversation_on_message_request(sender, instance, **kwargs):
+    """Pending requests show up in the conversation list; accepting, rejecting or cancelling changes the contact state"""
+    from . import contacts, conversations
+    conversations.refresh_requests(instance.sender_id, instance.receiver_id)
+    contacts.refresh(instance.sender_id, instance.receiver_id)
+
+
+@receiver(post_save, sender=BlockedUser)
+def update_conversation_on_block(sender, instance, created, **kwargs):
+    if created:
+        from . import blocks, contacts, conversations
+        blocks.forget(instance.blocker_id, instance.blocked_id)
+        conversations.set_blocked(instance.blocker_id, instance.blocked_id, True)
+        contacts.refresh(instance.blocker_id, instance.blocked_id)
+
+
+@receiver(post_delete, sender=BlockedUser)
+def update_conversation_on_unblock(sender, instance, **kwargs):
+    from . import blocks, contacts, conversations
+    blocks.forget(instance.blocker_id, instance.blocked_id)
+    conversations.set_blocked(instance.blocker_id, instance.blocked_id, False)
+    contacts.refresh(instance.blocker_id, instance.blocked_id)
+
+@receiver(post_save, sender=MessageReaction)
+@receiver(post_delete, sender=MessageReaction)
+def update_message_reaction_counts(sender, instance, origin=None, **kwargs):
+    """Keep Message.reaction_counts in step with the reaction rows"""
+    if _cascaded_from(origin, Message, Room):
+        return  # The message is being deleted too
+    from . import reactions
+    reactions.refresh_counts(instance.message_id)
+
+@receiver(post_save, sender=AcceptedMessage)
+@receiver(post_delete, sender=AcceptedMessage)
+def update_contacts_on_accept(sender, instance, **kwargs):
+    """Accepted DM partners may message and see each other's presence"""
+    from . import contacts, conversations, presence
+    presence.forget_contacts(instance.user1_id, instance.user2_id)
+    conversations.refresh_accepted(instance.user1_id, instance.user2_id)
+    contacts.refresh(instance.user1_id, instance.user2_id)
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def forget_presence_contacts_on_participants(sender, instance, action, pk_set, **kwargs):
+    """Room co-participants see each other's presence"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    from . import presence
+    if isinstance(instance, Room):
+        user_ids = set(instance.participants.values_list('id', flat=True)) | set(pk_set or ())
+    else:
+        user_ids = {instance.pk} | set(
+            Room.participants.through.objects.filter(
+                room_id__in=Room.participants.through.objects.filter(user_id=instance.pk).values('room_id')
+            ).values_list('user_id', flat=True)
+        )
+    presence.forget_contacts(*user_ids)
+
+# Shared response cache (utils/response_cache.py)
+from utils.response_cache import invalidate_on
+
+invalidate_on(BlockedUser, 'blocks')
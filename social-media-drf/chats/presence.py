@@ -0,0 +1,255 @@
+# chats/presence.py
+"""
+Presence for WebSocket users, shared through the cache.
+
+- Each user has a reference count of open sockets. A user comes online
+  with the first socket and goes offline with the last one, so closing
+  one of two tabs keeps them online.
+- The count and the `user_online_<id>` flag read by UserSerializer expire
+  after PRESENCE_TTL. Heartbeats (any frame a socket receives) renew
+  them, and a socket that dies without disconnecting ages out.
+- Status changes only go to the user's contacts: accepted DM partners,
+  room co-participants and followers who opted in (Follow.presence_updates).
+  Each contact's sockets join the `presence_<id>` group.
+- Changes are buffered per process and flushed every
+  PRESENCE_DIGEST_INTERVAL seconds, with one group message per contact.
+  A user who flaps offline and back within the interval sends nothing.
+- Users announced online are kept in a shared roster. Every
+  PRESENCE_SWEEP_INTERVAL seconds one worker sweeps it and announces
+  those whose presence expired, so contacts also see users go offline
+  whose sockets died without disconnecting (a crashed worker, a lost
+  network). The last announced status expires too, at twice PRESENCE_TTL.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import blocks
+
+ROSTER_KEY = 'presence_roster'
+# Seconds the roster lock lives if its holder dies before releasing it
+ROSTER_LOCK_TIMEOUT = 5
+
+_pending = {}
+_flusher = None
+_sweeper = None
+
+
+def group_name(user_id):
+    """Group a user's sockets join to receive their contacts' presence"""
+    return f'presence_{user_id}'
+
+
+def _ttl():
+    return getattr(settings, 'PRESENCE_TTL', 300)
+
+
+def _connections_key(user_id):
+    return f'presence_connections_{user_id}'
+
+
+def _online_key(user_id):
+    return f'user_online_{user_id}'
+
+
+def _published_key(user_id):
+    return f'presence_published_{user_id}'
+
+
+def _contacts_key(user_id):
+    return f'presence_contacts_{user_id}'
+
+
+def _sweep_interval():
+    return getattr(settings, 'PRESENCE_SWEEP_INTERVAL', 60)
+
+
+@contextmanager
+def _roster_lock():
+    key = ROSTER_KEY + '_lock'
+    while not cache.add(key, 1, timeout=ROSTER_LOCK_TIMEOUT):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def connect(user_id):
+    """Count one more open socket; True when the user just came online"""
+    key = _connections_key(user_id)
+    ttl = _ttl()
+    cache.add(key, 0, ttl)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, ttl)
+        count = 1
+    cache.touch(key, ttl)
+    cache.set(_online_key(user_id), True, ttl)
+    return count == 1
+
+
+def heartbeat(user_id):
+    """Renew a live socket's TTL; True when the user had expired and is back online"""
+    ttl = _ttl()
+    cache.set(_online_key(user_id), True, ttl)
+    if cache.touch(_connections_key(user_id), ttl):
+        return False
+    return cache.add(_connections_key(user_id), 1, ttl)
+
+
+def disconnect(user_id):
+    """Count one socket less; True when it was the user's last one"""
+    key = _connections_key(user_id)
+    try:
+        count = cache.decr(key)
+    except ValueError:
+        count = 0
+    if count > 0:
+        return False
+    cache.delete_many([key, _online_key(user_id)])
+    return True
+
+
+def is_online(user_id):
+    return bool(cache.get(_online_key(user_id)))
+
+
+def contact_ids(user_id):
+    """Users who receive `user_id`'s status changes (cached for PRESENCE_CONTACTS_TTL)"""
+    key = _contacts_key(user_id)
+    ids = cache.get(key)
+    if ids is not None:
+        return ids
+
+    from post.models import Follow
+    from .models import AcceptedMessage, Room
+
+    contacts = set()
+    for user1_id, user2_id in AcceptedMessage.objects.filter(
+        Q(user1_id=user_id) | Q(user2_id=user_id)
+    ).values_list('user1_id', 'user2_id'):
+        contacts.update((user1_id, user2_id))
+
+    participants = Room.participants.through.objects
+    contacts.update(
+        participants.filter(
+            room_id__in=participants.filter(user_id=user_id).values('room_id')
+        ).values_list('user_id', flat=True).distinct()
+    )
+    contacts.update(
+        Follow.objects.filter(following_id=user_id, presence_updates=True)
+        .values_list('follower_id', flat=True)
+    )
+
+    contacts.discard(user_id)
+    # Users this one blocked don't see them come and go
+    contacts.difference_update(blocks.blocking(user_id))
+    ids = sorted(contacts)
+    cache.set(key, ids, getattr(settings, 'PRESENCE_CONTACTS_TTL', 60))
+    return ids
+
+
+def forget_contacts(*user_ids):
+    """Drop cached contact lists after a relationship changed"""
+    cache.delete_many([_contacts_key(user_id) for user_id in user_ids])
+
+
+async def publish(user_id, username):
+    """Queue a status change of `user_id` for the next digest"""
+    global _flusher
+    _pending[user_id] = username
+    loop = asyncio.get_running_loop()
+    if _flusher is None or _flusher.done() or _flusher.get_loop() is not loop:
+        _flusher = loop.create_task(_flush_later())
+
+
+async def _flush_later():
+    await asyncio.sleep(getattr(settings, 'PRESENCE_DIGEST_INTERVAL', 2))
+    await flush()
+
+
+def ensure_sweeper():
+    """Start this event loop's periodic sweep for expired presence (see the module docstring)"""
+    global _sweeper
+    loop = asyncio.get_running_loop()
+    if _sweeper is None or _sweeper.done() or _sweeper.get_loop() is not loop:
+        _sweeper = loop.create_task(_sweep_forever())
+
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(_sweep_interval())
+        # One worker sweeps per interval
+        if await database_sync_to_async(cache.add)(ROSTER_KEY + '_sweep', 1, _sweep_interval()):
+            await sweep()
+
+
+def expired_users():
+    """{user_id: username} of rostered users who are no longer online"""
+    roster = cache.get(ROSTER_KEY) or {}
+    online = cache.get_many([_online_key(user_id) for user_id in roster])
+    return {user_id: username for user_id, username in roster.items() if not online.get(_online_key(user_id))}
+
+
+async def sweep():
+    """Announce users whose presence expired without a disconnect"""
+    for user_id, username in (await database_sync_to_async(expired_users)()).items():
+        _pending.setdefault(user_id, username)
+    await flush()
+
+
+def _update_roster(came_online, went_offline):
+    if not came_online and not went_offline:
+        return
+    with _roster_lock():
+        roster = cache.get(ROSTER_KEY) or {}
+        roster.update(came_online)
+        for user_id in went_offline:
+            roster.pop(user_id, None)
+        cache.set(ROSTER_KEY, roster, None)
+
+
+def _outbox(changes):
+    """{recipient_id: [status, ...]} for the users whose status really changed"""
+    outbox = {}
+    came_online, went_offline = {}, []
+    for user_id, username in changes.items():
+        online = is_online(user_id)
+        if cache.get(_published_key(user_id)) == online:
+            continue
+        cache.set(_published_key(user_id), online, 2 * _ttl())
+        if online:
+            came_online[user_id] = username
+        else:
+            went_offline.append(user_id)
+        status = {'user_id': user_id, 'username': username, 'is_online': online}
+        for contact_id in contact_ids(user_id):
+            outbox.setdefault(contact_id, []).append(status)
+    _update_roster(came_online, went_offline)
+    return outbox
+
+
+async def flush():
+    """Send the queued changes, one presence_digest per contact"""
+    if not _pending:
+        return
+    changes = dict(_pending)
+    _pending.clear()
+    outbox = await database_sync_to_async(_outbox)(changes)
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for recipient_id, statuses in outbox.items():
+        await channel_layer.group_send(group_name(recipient_id), {
+            'type': 'presence_digest',
+            'statuses': statuses,
+        })
@@ -0,0 +1,78 @@
+# chats/reactions.py
+"""
+Reaction summaries for messages.
+
+Message.reaction_counts holds {reaction_type: count} for each message.
+The MessageReaction receivers in chats/models.py refresh it whenever a
+reaction is added, changed or removed (toggle, admin, cascades). A single
+message can then be serialized without a GROUP BY.
+
+Lists use ReactionSummaries: the counts come from that same column, read
+with the page, and one query loads the viewer's own reactions for the
+whole page. MessageSerializer reads them from its context:
+
+    context = {'request': request, **reaction_context(messages, request.user)}
+"""
+from django.db import transaction
+from django.db.models import Count
+
+
+def counts_for(message_ids):
+    """{message_id: {reaction_type: count}} computed from the reaction rows"""
+    from .models import MessageReaction
+
+    counts = {}
+    for message_id, reaction_type, count in (
+        MessageReaction.objects.filter(message_id__in=message_ids)
+        .values('message_id', 'reaction_type').annotate(count=Count('id'))
+        .values_list('message_id', 'reaction_type', 'count')
+    ):
+        counts.setdefault(message_id, {})[reaction_type] = count
+    return counts
+
+
+def refresh_counts(message_id):
+    """
+    Recompute one message's reaction_counts column and return it.
+
+    The message row is locked before counting, so concurrent refreshes of
+    one message run one after another and the last write has counted every
+    committed reaction. FOR NO KEY UPDATE doesn't conflict with the key-share
+    lock that inserting a reaction takes on the message.
+    """
+    from .models import Message
+
+    with transaction.atomic():
+        if not list(Message.objects.select_for_update(no_key=True).filter(id=message_id).values_list('id')):
+            return {}
+        counts = counts_for([message_id]).get(message_id, {})
+        Message.objects.filter(id=message_id).update(reaction_counts=counts)
+    return counts
+
+
+class ReactionSummaries:
+    """Reaction counts and `user`'s own reaction for a page of messages"""
+
+    def __init__(self, counts, user=None):
+        """`counts` maps each message id on the page to its reaction_counts column"""
+        from .models import MessageReaction
+
+        self.counts = counts
+        self.mine = {}
+        if counts and user is not None and user.is_authenticated:
+            self.mine = dict(
+                MessageReaction.objects.filter(message_id__in=list(counts), user=user)
+                .values_list('message_id', 'reaction_type')
+            )
+
+    def counts_of(self, message_id):
+        return self.counts.get(message_id) or {}
+
+    def reaction_of(self, message_id):
+        return self.mine.get(message_id)
+
+
+def reaction_context(messages, user=None):
+    """Serializer context entry holding the reaction summaries of `messages`"""
+    counts = {message.id: message.reaction_counts for message in messages}
+    return {'reaction_summaries': ReactionSummaries(counts, user)}
@@ -0,0 +1,143 @@
+# chats/read_state.py
+"""
+Read watermarks: the id of the last message a user has read in a conversation.
+
+- Rooms keep one RoomReadState row per (room, user). Marking a room read
+  is a single UPDATE that only moves the watermark forward, or an INSERT
+  the first time. A room's unread count is the number of other people's
+  messages above the watermark, a range scan on the (room, id) index.
+- Direct conversations keep both sides' watermarks on their
+  DirectConversation row, next to the unread counters
+  (conversations.mark_read()).
+
+Message.is_read is no longer written. Rows in the history are read when
+their id is at or below the reader's watermark (see read_flags()).
+Watermarks compare ids, so every message must take its id from the
+sequence when it is inserted. No writer may reserve ids ahead of time
+(see chats/message_writer.py). Watermarks never move past the
+conversation's last message, whatever id a client sends.
+
+Marking read sends a `read_up_to` event to the room group, or to both
+users' `user_<id>` groups for a direct conversation.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db.models import Max, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import conversations
+
+
+def mark_room_read(room_id, user_id, message_id):
+    """
+    Move `user_id`'s watermark in the room up to `message_id`, but never
+    past the room's last message (clients send the id). Returns the new
+    watermark, or None when it did not move.
+    """
+    from .models import Message, RoomReadState
+
+    latest = Message.objects.filter(room_id=room_id).order_by('-id').values_list('id', flat=True).first()
+    if not message_id or latest is None:
+        return None
+    upto = min(message_id, latest)
+    moved = RoomReadState.objects.filter(
+        room_id=room_id, user_id=user_id, last_read_message_id__lt=upto
+    ).update(last_read_message_id=upto)
+    if moved:
+        return upto
+    _, created = RoomReadState.objects.get_or_create(
+        room_id=room_id, user_id=user_id, defaults={'last_read_message_id': upto}
+    )
+    return upto if created else None
+
+
+def room_read_upto(room_id, user_id):
+    from .models import RoomReadState
+
+    return RoomReadState.objects.filter(room_id=room_id, user_id=user_id).values_list(
+        'last_read_message_id', flat=True
+    ).first() or 0
+
+
+def room_unread_count(room_id, user_id):
+    """Messages from others above `user_id`'s watermark, in one query"""
+    from .models import Message, RoomReadState
+
+    upto = RoomReadState.objects.filter(room_id=room_id, user_id=user_id).values('last_read_message_id')[:1]
+    return Message.objects.filter(
+        room_id=room_id, id__gt=Coalesce(Subquery(upto), Value(0))
+    ).exclude(sender_id=user_id).count()
+
+
+def mark_direct_read(reader_id, other_id, message_id=None):
+    """
+    `reader_id` has read `other_id`'s messages up to `message_id` (default:
+    all of them). Lowers the reader's badge; returns the new watermark or
+    None when it did not move.
+    """
+    from post import unread_counters
+
+    upto, cleared = conversations.mark_read(reader_id, other_id, message_id)
+    if cleared:
+        unread_counters.decrement(unread_counters.MESSAGES, reader_id, cleared)
+    return upto
+
+
+def read_flags(user, room_id=None, other_id=None):
+    """
+    A function row -> is_read for history rows seen by `user`: messages to
+    them are read up to their own watermark; their own messages once the
+    other user (in a room: anyone else) has read past them.
+    """
+    from .models import DirectConversation, RoomReadState
+
+    if room_id is not None:
+        mine = room_read_upto(room_id, user.id)
+        theirs = RoomReadState.objects.filter(room_id=room_id).exclude(user_id=user.id).aggregate(
+            upto=Max('last_read_message_id')
+        )['upto'] or 0
+    else:
+        low_id, high_id = conversations.ordered(user.id, other_id)
+        conversation = DirectConversation.objects.filter(user_low_id=low_id, user_high_id=high_id).only(
+            'user_low_id', 'low_read_upto', 'high_read_upto'
+        ).first()
+        if conversation is None:
+            mine = theirs = 0
+        else:
+            mine = conversations.read_upto(conversation, user.id)
+            theirs = conversations.read_upto(conversation, other_id)
+
+    def is_read(row):
+        return row['id'] <= (theirs if row['sender_id'] == user.id else mine)
+    return is_read
+
+
+def room_event(room_id, user_id, message_id):
+    """(group, event) announcing a room watermark"""
+    return f'chat_{room_id}', {
+        'type': 'read_up_to',
+        'room_id': int(room_id),
+        'user_id': user_id,
+        'message_id': message_id,
+    }
+
+
+def direct_events(reader_id, other_id, message_id):
+    """[(group, event)] announcing a direct conversation watermark to both users"""
+    event = {
+        'type': 'read_up_to',
+        'room_id': None,
+        'user_id': reader_id,
+        'other_user_id': other_id,
+        'message_id': message_id,
+    }
+    return [(f'user_{other_id}', event), (f'user_{reader_id}', event)]
+
+
+def broadcast(*events):
+    """Send (group, event) pairs from synchronous code"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for group, event in events:
+        async_to_sync(channel_layer.group_send)(group, event)
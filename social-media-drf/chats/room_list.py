@@ -0,0 +1,144 @@
+# chats/room_list.py
+"""
+Room list loading for RoomViewSet.list, in a fixed number of queries.
+
+rooms_for() annotates each room with its last message, the user's unread
+count (messages above their read watermark, see chats/read_state.py),
+the other participant of a one-on-one room, the participant count and
+whether the user is an admin. All of these are correlated subqueries in
+the one page query.
+
+load() then fetches, for the whole page:
+- the first ROOM_LIST_PARTICIPANTS participants and admins of each room
+  (one ROW_NUMBER() query each, so a large group costs no more than a small one);
+- every user the page mentions, with their profiles (one query);
+- the last messages (their reaction counts are a column) and the user's
+  own reactions to them.
+RoomSerializer reads all of that from the `room_list` context entry and
+falls back to per-room queries when it is missing (retrieve, create).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, RowNumber
+from django.db.models.expressions import Window
+
+from . import blocks
+from .reactions import ReactionSummaries
+
+
+def _count(queryset):
+    """A correlated COUNT subquery over `queryset`"""
+    return Subquery(
+        queryset.order_by().annotate(count=Func(F('id'), function='COUNT')).values('count'),
+        output_field=IntegerField()
+    )
+
+
+def rooms_for(user):
+    """The user's rooms, newest activity first, annotated for RoomSerializer"""
+    from .models import Message, Room, RoomReadState
+
+    participants = Room.participants.through.objects
+    last = Message.objects.filter(room=OuterRef('pk')).order_by('-created_at', '-id')
+    read_upto = RoomReadState.objects.filter(room=OuterRef(OuterRef('pk')), user_id=user.id)
+    rooms = Room.objects.filter(
+        id__in=participants.filter(user_id=user.id).values('room_id')
+    ).annotate(
+        last_message_ref=Subquery(last.values('id')[:1]),
+        last_message_time=Subquery(last.values('created_at')[:1]),
+        unread=Coalesce(_count(
+            Message.objects.filter(
+                room=OuterRef('pk'),
+                id__gt=Coalesce(Subquery(read_upto.values('last_read_message_id')[:1]), Value(0)),
+            ).exclude(sender_id=user.id)
+        ), Value(0)),
+        participant_count=Coalesce(_count(participants.filter(room_id=OuterRef('pk'))), Value(0)),
+        other_participant_ref=Subquery(
+            participants.filter(room_id=OuterRef('pk')).exclude(user_id=user.id).order_by('id').values('user_id')[:1]
+        ),
+        user_is_admin=Exists(Room.admins.through.objects.filter(room_id=OuterRef('pk'), user_id=user.id)),
+    ).order_by(F('last_message_time').desc(nulls_last=True), '-updated_at', '-id')
+
+    # One-on-one rooms with someone the user blocked are hidden
+    blocked = blocks.blocking(user.id)
+    if not blocked:
+        return rooms
+    blocked_rooms = participants.filter(user_id__in=blocked).values('room_id')
+    return rooms.exclude(is_group=False, id__in=blocked_rooms)
+
+
+def first_members(through, room_ids, limit):
+    """{room_id: [user_id, ...]}: the first `limit` members of each room"""
+    members = {}
+    rows = through.objects.filter(room_id__in=room_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('room_id'), order_by=F('id').asc())
+    ).filter(position__lte=limit).order_by('room_id', 'position').values_list('room_id', 'user_id')
+    for room_id, user_id in rows:
+        members.setdefault(room_id, []).append(user_id)
+    return members
+
+
+class RoomList:
+    """Everything RoomSerializer needs for one page of rooms"""
+
+    def __init__(self, rooms, user):
+        from django.contrib.auth import get_user_model
+        from .models import Message, Room
+
+        room_ids = [room.id for room in rooms]
+        limit = getattr(settings, 'ROOM_LIST_PARTICIPANTS', 10)
+        self.participants = first_members(Room.participants.through, room_ids, limit)
+        self.admins = first_members(Room.admins.through, room_ids, limit)
+
+        message_ids = [room.last_message_ref for room in rooms if getattr(room, 'last_message_ref', None)]
+        self.messages = {
+            message.id: message
+            for message in Message.objects.filter(id__in=message_ids)
+        }
+        self.reaction_summaries = ReactionSummaries(
+            {message.id: message.reaction_counts for message in self.messages.values()}, user
+        )
+
+        user_ids = {user_id for ids in self.participants.values() for user_id in ids}
+        user_ids.update(user_id for ids in self.admins.values() for user_id in ids)
+        user_ids.update(room.other_participant_ref for room in rooms if getattr(room, 'other_participant_ref', None))
+        user_ids.update(message.sender_id for message in self.messages.values() if message.sender_id)
+        self.users = {
+            member.id: member
+            for member in get_user_model().objects.filter(id__in=user_ids).select_related('profile')
+        }
+        for room in rooms:
+            message = self.messages.get(getattr(room, 'last_message_ref', None))
+            if message is not None:
+                message.room = room
+                message.sender = self.users.get(message.sender_id)
+
+        self.viewer_context = viewer_context(user_ids, user)
+
+    def users_of(self, ids):
+        return [self.users[user_id] for user_id in ids if user_id in self.users]
+
+
+def viewer_context(user_ids, viewer):
+    """
+    UserSerializer context for a batch of users: whom `viewer` blocked (from
+    their cached block set) and the cached online flags, instead of a cache
+    get per user.
+    """
+    keys = {f'user_online_{user_id}': user_id for user_id in user_ids}
+    online = cache.get_many(list(keys))
+    return {
+        'blocked_ids': blocks.blocking(viewer.id) & set(user_ids),
+        'online_status': {keys[key]: value for key, value in online.items()},
+    }
+
+
+def load(rooms, user):
+    """Serializer context for a page of rooms from rooms_for()"""
+    room_list = RoomList(rooms, user)
+    return {
+        'room_list': room_list,
+        'reaction_summaries': room_list.reaction_summaries,
+        **room_list.viewer_context,
+    }
@@ -0,0 +1,200 @@
+# chats/search.py
+"""
+Full-text search over chat messages.
+
+- PostgreSQL: a GIN index on to_tsvector(SEARCH_CONFIG, content), created
+  by migration 0013 from the same SearchVector the queries use, so the
+  planner matches it. The database keeps the index current on every
+  INSERT, UPDATE and DELETE, including the write-behind writer's
+  bulk inserts.
+- SQLite (local runs): an external-content FTS5 table, chats_message_fts,
+  kept in step with chats_message by triggers (SQLITE_INDEX_SQL). A
+  migration that rebuilds chats_message on SQLite drops the triggers;
+  the statements are idempotent and can simply be run again.
+
+search() ranks the matches (ts_rank / bm25) and returns a snippet for
+each one. The database marks the matched words with control-character
+sentinels; page() HTML-escapes the snippet and only then turns the
+sentinels into <mark> tags, so the snippet is safe to render. Pages use a
+keyset cursor on (rank, id), so later pages cost the same as the first.
+Callers pass the queryset of messages the user may see
+(accessible_messages()).
+
+Query params understood by search_options():
+    q        words to look for (all of them must match)
+    limit    results per page (CHAT_SEARCH_PAGE, capped at CHAT_SEARCH_MAX_PAGE)
+    cursor   `next` from the previous page
+"""
+import base64
+import html
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'simple'
+FTS_TABLE = 'chats_message_fts'
+# Around matched words in raw snippets; highlight() swaps them for <mark> tags after escaping
+START_SEL, STOP_SEL = '\x02', '\x03'
+
+SQLITE_INDEX_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(content, content='chats_message', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON chats_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON chats_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF content ON chats_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+FIELDS = ('id', 'room_id', 'sender_id', 'sender__username', 'receiver_id', 'created_at', 'rank')
+
+
+def encode_cursor(rank, message_id):
+    raw = f"{rank!r}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (rank, id) from a cursor; ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rank, message_id = raw.rsplit('|', 1)
+        return float(rank), int(message_id)
+    except (TypeError, UnicodeDecodeError, ValueError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+
+
+def _words(text):
+    return re.findall(r'\w+', text or '')
+
+
+def search_options(request):
+    """Return (text, limit, cursor) from the query params; ValueError on bad input"""
+    text = (request.query_params.get('q') or '').strip()
+    if not _words(text):
+        raise ValueError('q must contain at least one word')
+    default = getattr(settings, 'CHAT_SEARCH_PAGE', 20)
+    maximum = getattr(settings, 'CHAT_SEARCH_MAX_PAGE', 50)
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    limit = min(max(1, limit), maximum)
+    cursor = request.query_params.get('cursor')
+    return text, limit, decode_cursor(cursor) if cursor else None
+
+
+def accessible_messages(user):
+    """Room messages of the user's rooms and their own direct messages"""
+    from .models import Message, Room
+
+    rooms = Room.participants.through.objects.filter(user_id=user.id).values('room_id')
+    return Message.objects.filter(
+        Q(room_id__in=rooms) |
+        Q(room__isnull=True) & (Q(sender_id=user.id) | Q(receiver_id=user.id))
+    )
+
+
+def _postgres_matches(queryset, text):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(
+        document=SearchVector('content', config=SEARCH_CONFIG),
+    ).filter(document=query).annotate(
+        # Double precision, so the rank round-trips exactly through the cursor
+        rank=Cast(SearchRank(F('document'), query), FloatField()),
+        snippet=SearchHeadline(
+            'content', query, config=SEARCH_CONFIG,
+            start_sel=START_SEL, stop_sel=STOP_SEL, max_words=24, min_words=8, max_fragments=1,
+        ),
+    )
+
+
+def _sqlite_match(text):
+    """An FTS5 query that requires every word, with the user's syntax quoted away"""
+    return ' '.join(f'"{word}"' for word in _words(text))
+
+
+def _sqlite_matches(queryset, text):
+    match = _sqlite_match(text)
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    ).annotate(
+        # bm25() is lower for better matches; negate it so both backends sort by rank descending
+        rank=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = chats_message.id",
+            [match], output_field=FloatField()
+        ),
+    )
+
+
+def _sqlite_snippets(text, message_ids):
+    if not message_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(message_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', 24) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [START_SEL, STOP_SEL, _sqlite_match(text), *message_ids]
+        )
+        return dict(cursor.fetchall())
+
+
+def search(queryset, text, limit, cursor=None):
+    """Return (rows, has_more): the best matches in `queryset`, best first"""
+    postgres = connection.vendor == 'postgresql'
+    matches = _postgres_matches(queryset, text) if postgres else _sqlite_matches(queryset, text)
+    if cursor is not None:
+        rank, message_id = cursor
+        matches = matches.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=message_id))
+    fields = FIELDS + ('snippet',) if postgres else FIELDS
+    rows = list(matches.order_by('-rank', '-id').values(*fields)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not postgres:
+        snippets = _sqlite_snippets(text, [row['id'] for row in rows])
+        for row in rows:
+            row['snippet'] = snippets.get(row['id'], '')
+    return rows, has_more
+
+
+def highlight(snippet):
+    """HTML-escape a raw snippet and turn its match sentinels into <mark> tags"""
+    return html.escape(snippet or '').replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+
+def page(queryset, text, limit, cursor=None):
+    """Return (data, pagination) for one page of results"""
+    rows, has_more = search(queryset, text, limit, cursor)
+    data = [
+        {
+            'id': row['id'],
+            'room_id': row['room_id'],
+            'sender_id': row['sender_id'],
+            'sender_username': row['sender__username'],
+            'receiver_id': row['receiver_id'],
+            'created_at': row['created_at'],
+            'snippet': highlight(row['snippet']),
+            'rank': row['rank'],
+        }
+        for row in rows
+    ]
+    pagination = {
+        'limit': limit,
+        'has_more': has_more,
+        # Pass as ?cursor= for the next page
+        'next': encode_cursor(rows[-1]['rank'], rows[-1]['id']) if has_more else None,
+    }
+    return data, pagination
@@ -21,12 +21,17 @@ class MessageSerializer(serializers.ModelSerializer):
 
     def get_reactions(self, obj):
         """Return counts of each reaction type"""
-        from django.db.models import Count
-        reactions = obj.reactions.values('reaction_type').annotate(count=Count('reaction_type'))
-        return {r['reaction_type']: r['count'] for r in reactions}
+        # Lists pass prefetched summaries (chats/reactions.py); single messages use the denormalized column
+        summaries = self.context.get('reaction_summaries')
+        if summaries is not None:
+            return summaries.counts_of(obj.id)
+        return obj.reaction_counts or {}
 
     def get_user_reaction(self, obj):
         """Return current user's reaction to this message"""
+        summaries = self.context.get('reaction_summaries')
+        if summaries is not None:
+            return summaries.reaction_of(obj.id)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             reaction = obj.reactions.filter(user=request.user).first()
@@ -35,8 +40,9 @@ class MessageSerializer(serializers.ModelSerializer):
 
 class RoomSerializer(serializers.ModelSerializer):
     """ Serializer for Room """
-    participants = UserSerializer(many=True, read_only=True)
-    admins = UserSerializer(many=True, read_only=True)
+    participants = serializers.SerializerMethodField()
+    admins = serializers.SerializerMethodField()
+    participant_count = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
     other_participant = serializers.SerializerMethodField()
@@ -44,30 +50,60 @@ class RoomSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Room
-        fields = ['id', 'name', 'participants', 'admins', 'is_group', 'last_message', 'unread_count', 'other_participant', 'is_admin', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'participants', 'admins', 'participant_count', 'is_group', 'last_message', 'unread_count', 'other_participant', 'is_admin', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+    # Room lists pass everything preloaded (chats/room_list.py); single rooms query it here
+
+    def get_participants(self, obj):
+        room_list = self.context.get('room_list')
+        users = room_list.users_of(room_list.participants.get(obj.id, [])) if room_list else obj.participants.all()
+        return UserSerializer(users, many=True, context=self.context).data
+
+    def get_admins(self, obj):
+        room_list = self.context.get('room_list')
+        users = room_list.users_of(room_list.admins.get(obj.id, [])) if room_list else obj.admins.all()
+        return UserSerializer(users, many=True, context=self.context).data
+
+    def get_participant_count(self, obj):
+        if hasattr(obj, 'participant_count'):
+            return obj.participant_count
+        return obj.participants.count()
+
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
+        room_list = self.context.get('room_list')
+        if room_list:
+            last_msg = room_list.messages.get(obj.last_message_ref)
+        else:
+            last_msg = obj.messages.last()
         if last_msg:
-            return MessageSerializer(last_msg).data
+            return MessageSerializer(last_msg, context=self.context).data
         return None
 
     def get_unread_count(self, obj):
+        if hasattr(obj, 'unread'):
+            return obj.unread
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
+            from .read_state import room_unread_count
+            return room_unread_count(obj.id, request.user.id)
         return 0
 
     def get_other_participant(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and not obj.is_group:
-            other = obj.get_other_participant(request.user)
+            room_list = self.context.get('room_list')
+            if room_list:
+                other = room_list.users.get(obj.other_participant_ref)
+            else:
+                other = obj.get_other_participant(request.user)
             if other:
-                return UserSerializer(other).data
+                return UserSerializer(other, context=self.context).data
         return None
     
     def get_is_admin(self, obj):
+        if hasattr(obj, 'user_is_admin'):
+            return obj.user_is_admin
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.is_admin(request.user)
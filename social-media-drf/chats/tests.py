@@ -1,3 +1,872 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from post.models import Follow
+from utils.broker_cache import BrokerCache
+from utils.local_channel_layer import Broker, LocalChannelLayer
+from utils.testing import client_for, make_user
+
+from . import (
+    blocks, checks, contacts, conversations, direct_messages, history, message_writer, presence, reactions,
+    read_state, search
+)
+from .consumers import DirectMessageConsumer
+from .direct_messages import DirectMessageError
+from .models import AcceptedMessage, BlockedUser, DirectConversation, Message, MessageReaction, MessageRequest, Room
+from .routing import websocket_urlpatterns
+
+
+class WithUser:
+    """ASGI wrapper that authenticates the socket as `user`"""
+
+    def __init__(self, app, user):
+        self.app = app
+        self.user = user
+
+    async def __call__(self, scope, receive, send):
+        return await self.app(dict(scope, user=self.user), receive, send)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MessageWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.room = Room.objects.create(name='group', is_group=True)
+        self.room.participants.add(self.alice, self.bob)
+
+    def test_batch_gets_ids_in_queue_order(self):
+        async def submit_all():
+            writer = message_writer.MessageWriter()
+            items = [await writer.submit(self.room.id, self.alice.id, f'm{i}') for i in range(5)]
+            await writer.flush()
+            return [await item.assigned for item in items], [await item.durable for item in items]
+
+        ids, durable = async_to_sync(submit_all)()
+        self.assertEqual(ids, sorted(ids))
+        self.assertTrue(all(durable))
+        stored = list(Message.objects.filter(room=self.room).order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(stored, ids)
+        self.assertEqual(Room.objects.get(id=self.room.id).message_count, 5)
+
+    def test_failed_insert_resolves_without_id(self):
+        async def submit_bad():
+            writer = message_writer.MessageWriter()
+            item = await writer.submit(self.room.id, 10 ** 9, 'nobody sent this')
+            await writer.flush()
+            with self.assertRaises(RuntimeError):
+                await item.durable
+            return await item.assigned
+
+        with self.assertLogs('chats.message_writer', 'ERROR'):
+            self.assertIsNone(async_to_sync(submit_bad)())
+
+    def test_sender_is_acked_after_commit(self):
+        async def chat():
+            app = URLRouter(websocket_urlpatterns)
+            sender = WebsocketCommunicator(WithUser(app, self.alice), f'/ws/chat/{self.room.id}/')
+            other = WebsocketCommunicator(WithUser(app, self.bob), f'/ws/chat/{self.room.id}/')
+            await sender.connect()
+            await other.connect()
+            await sender.send_json_to({'message': 'hello', 'client_id': 'c1'})
+            frames = []
+            while not await sender.receive_nothing(timeout=0.5):
+                frames.append(json.loads(await sender.receive_from()))
+            received = []
+            while not await other.receive_nothing(timeout=0.2):
+                received.append(json.loads(await other.receive_from()))
+            await sender.disconnect()
+            await other.disconnect()
+            return frames, received
+
+        frames, received = async_to_sync(chat)()
+        acks = [frame for frame in frames if frame.get('type') == 'ack']
+        self.assertEqual(len(acks), 1)
+        self.assertTrue(acks[0]['ok'])
+        self.assertEqual(acks[0]['client_id'], 'c1')
+        message = Message.objects.get(id=acks[0]['message_id'])
+        self.assertEqual(message.content, 'hello')
+        self.assertIn(message.id, [frame['message']['id'] for frame in received if frame.get('type') == 'message'])
+
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.room = Room.objects.create(name='group', is_group=True)
+        self.room.participants.add(self.alice, self.bob)
+
+    def post(self, sender, count):
+        return [Message.objects.create(room=self.room, sender=sender, content=f'm{i}') for i in range(count)]
+
+    def test_room_unread_counts_others_messages_above_watermark(self):
+        messages = self.post(self.bob, 3)
+        self.post(self.alice, 2)
+        self.assertEqual(read_state.room_unread_count(self.room.id, self.alice.id), 3)
+        self.assertEqual(read_state.mark_room_read(self.room.id, self.alice.id, messages[1].id), messages[1].id)
+        self.assertEqual(read_state.room_unread_count(self.room.id, self.alice.id), 1)
+
+    def test_room_watermark_only_moves_forward(self):
+        messages = self.post(self.bob, 3)
+        read_state.mark_room_read(self.room.id, self.alice.id, messages[2].id)
+        self.assertIsNone(read_state.mark_room_read(self.room.id, self.alice.id, messages[0].id))
+        self.assertEqual(read_state.room_read_upto(self.room.id, self.alice.id), messages[2].id)
+
+    def test_room_watermark_is_capped_at_the_last_message(self):
+        messages = self.post(self.bob, 2)
+        self.assertEqual(read_state.mark_room_read(self.room.id, self.alice.id, 10 ** 12), messages[-1].id)
+        later = self.post(self.bob, 1)[0]
+        self.assertEqual(read_state.room_unread_count(self.room.id, self.alice.id), 1)
+        self.assertFalse(read_state.read_flags(self.alice, room_id=self.room.id)({'id': later.id, 'sender_id': self.bob.id}))
+
+    def test_room_list_reports_unread(self):
+        self.post(self.bob, 4)
+        rooms = client_for(self.alice).get('/api/chat/rooms/').json()['results']
+        self.assertEqual([room['unread_count'] for room in rooms], [4])
+        client_for(self.alice).get(f'/api/chat/rooms/{self.room.id}/messages/')
+        rooms = client_for(self.alice).get('/api/chat/rooms/').json()['results']
+        self.assertEqual([room['unread_count'] for room in rooms], [0])
+
+    def test_direct_unread_clears_up_to_watermark(self):
+        messages = [
+            Message.objects.create(sender=self.bob, receiver=self.alice, content=f'd{i}') for i in range(3)
+        ]
+        low_id, high_id = conversations.ordered(self.alice.id, self.bob.id)
+        row = DirectConversation.objects.get(user_low_id=low_id, user_high_id=high_id)
+        self.assertEqual(conversations.unread_of(row, self.alice.id), 3)
+
+        self.assertEqual(read_state.mark_direct_read(self.alice.id, self.bob.id, messages[0].id), messages[0].id)
+        row.refresh_from_db()
+        self.assertEqual(conversations.unread_of(row, self.alice.id), 2)
+
+        # Past the last message is capped there
+        self.assertEqual(read_state.mark_direct_read(self.alice.id, self.bob.id, 10 ** 12), messages[-1].id)
+        row.refresh_from_db()
+        self.assertEqual(conversations.unread_of(row, self.alice.id), 0)
+
+
+class LocalChannelLayerTests(SimpleTestCase):
+    """Two LocalChannelLayer instances stand in for two worker processes"""
+
+    def run_with_broker(self, test, **broker_options):
+        layers = []
+
+        def make_layer(**options):
+            layers.append(LocalChannelLayer(path=path, **options))
+            return layers[-1]
+
+        async def run():
+            broker = asyncio.ensure_future(Broker(path=path, **broker_options).serve())
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            try:
+                return await test(make_layer)
+            finally:
+                # Hang up first so the broker's handlers finish before it stops
+                for connection in [c for each in layers for c in each._connections.values()]:
+                    connection.writer.close()
+                await asyncio.sleep(0.05)
+                broker.cancel()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'channels.sock')
+            return async_to_sync(run)()
+
+    def test_group_send_reaches_members_on_every_worker(self):
+        async def test(make_layer):
+            first, second = make_layer(), make_layer()
+            channels = [await first.new_channel(), await first.new_channel(), await second.new_channel()]
+            layers = [first, first, second]
+            for layer, channel in zip(layers, channels):
+                await layer.group_add('room_1', channel)
+            await first.group_discard('room_1', channels[1])
+            await second.group_send('room_1', {'type': 'chat.message', 'text': 'hi'})
+            received = [
+                await asyncio.wait_for(layer.receive(channel), 1)
+                for layer, channel in [(first, channels[0]), (second, channels[2])]
+            ]
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(first.receive(channels[1]), 0.2)
+            return received
+
+        received = self.run_with_broker(test)
+        self.assertEqual([message['text'] for message in received], ['hi', 'hi'])
+
+    def test_group_membership_expires(self):
+        async def test(make_layer):
+            layer = make_layer(group_expiry=0.1)
+            channel = await layer.new_channel()
+            await layer.group_add('room_1', channel)
+            await asyncio.sleep(0.2)
+            await layer.group_send('room_1', {'type': 'chat.message'})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.2)
+
+        self.run_with_broker(test)
+
+    def test_expired_messages_are_not_delivered(self):
+        async def test(make_layer):
+            layer = make_layer(expiry=0.1)
+            specific = await layer.new_channel()
+            await layer.send('jobs', {'type': 'job', 'n': 1})
+            await layer.send(specific, {'type': 'job', 'n': 1})
+            await asyncio.sleep(0.2)
+            await layer.send('jobs', {'type': 'job', 'n': 2})
+            await layer.send(specific, {'type': 'job', 'n': 2})
+            return [await asyncio.wait_for(layer.receive(channel), 1) for channel in ['jobs', specific]]
+
+        received = self.run_with_broker(test, expiry=0.1)
+        self.assertEqual([message['n'] for message in received], [2, 2])
+
+    @override_settings(
+        CHANNEL_LAYERS={'default': {'BACKEND': 'utils.local_channel_layer.LocalChannelLayer'}},
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    def test_local_channels_require_a_shared_cache(self):
+        self.assertEqual([error.id for error in checks.shared_cache_check(None)], ['chats.E001'])
+
+
+class BrokerCacheTests(SimpleTestCase):
+    """Two BrokerCache instances stand in for two worker processes sharing one broker"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'channels.sock')
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            self.serving = loop.create_task(Broker(path=self.path, cache_max_entries=10).serve())
+            loop.call_soon(ready.set)
+            try:
+                loop.run_until_complete(self.serving)
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        ready.wait()
+        while not os.path.exists(self.path):
+            time.sleep(0.01)
+        self.caches = [BrokerCache(self.path, {}), BrokerCache(self.path, {})]
+
+        def stop():
+            # Hang up first so the broker's handlers finish before it stops
+            for each in self.caches:
+                each.disconnect()
+            time.sleep(0.05)
+            loop.call_soon_threadsafe(self.serving.cancel)
+            thread.join()
+            loop.close()
+
+        self.addCleanup(stop)
+
+    def test_workers_share_entries(self):
+        first, second = self.caches
+        first.set('contact', frozenset({1, 2}))
+        first.set_many({'a': (1, 'x'), 'b': None})
+        self.assertEqual(second.get('contact'), frozenset({1, 2}))
+        self.assertEqual(second.get_many(['a', 'b', 'c']), {'a': (1, 'x'), 'b': None})
+        self.assertTrue(second.has_key('b'))
+        second.delete_many(['a', 'b'])
+        self.assertEqual(first.get('a', 'gone'), 'gone')
+
+    def test_add_is_first_come(self):
+        first, second = self.caches
+        self.assertTrue(first.add('lock', 1))
+        self.assertFalse(second.add('lock', 2))
+        self.assertTrue(second.delete('lock'))
+        self.assertTrue(second.add('lock', 2))
+
+    def test_incr_is_atomic_across_workers(self):
+        first, second = self.caches
+        first.set('count', 0)
+        with ThreadPoolExecutor(8) as pool:
+            for each in range(200):
+                pool.submit((first if each % 2 else second).incr, 'count')
+        self.assertEqual(first.get('count'), 200)
+        self.assertEqual(second.decr('count', 50), 150)
+        with self.assertRaises(ValueError):
+            first.incr('missing')
+        first.set('text', 'abc')
+        with self.assertRaises(TypeError):
+            first.incr('text')
+
+    def test_entries_expire(self):
+        first, second = self.caches
+        first.set('short', 1, timeout=0.1)
+        first.set('forever', 1, timeout=None)
+        first.set('never', 1, timeout=0)
+        time.sleep(0.15)
+        self.assertEqual(second.get_many(['short', 'forever', 'never']), {'forever': 1})
+        self.assertTrue(first.add('short', 2))
+
+    def test_full_broker_drops_the_oldest_writes(self):
+        cache_ = self.caches[0]
+        for each in range(12):
+            cache_.set(f'key{each}', each)
+        kept = cache_.get_many([f'key{each}' for each in range(12)])
+        self.assertNotIn('key0', kept)
+        self.assertIn('key11', kept)
+        self.assertLessEqual(len(kept), 10)
+
+    def test_reconnects_after_the_broker_drops_it(self):
+        cache_ = self.caches[0]
+        cache_.set('key', 1)
+        cache_._local.socket.shutdown(2)
+        self.assertEqual(cache_.get('key'), 1)
+
+    @override_settings(
+        CHANNEL_LAYERS={'default': {'BACKEND': 'utils.local_channel_layer.LocalChannelLayer'}},
+        CACHES={'default': {'BACKEND': 'utils.broker_cache.BrokerCache'}},
+    )
+    def test_broker_cache_is_shared(self):
+        self.assertEqual(checks.shared_cache_check(None), [])
+
+
+class ReactionCountTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.message = Message.objects.create(sender=self.alice, receiver=self.bob, content='hi')
+
+    def counts(self):
+        return Message.objects.get(id=self.message.id).reaction_counts
+
+    def test_counts_follow_reaction_rows(self):
+        reaction = MessageReaction.objects.create(message=self.message, user=self.alice, reaction_type='like')
+        MessageReaction.objects.create(message=self.message, user=self.bob, reaction_type='like')
+        self.assertEqual(self.counts(), {'like': 2})
+        reaction.reaction_type = 'love'
+        reaction.save()
+        self.assertEqual(self.counts(), {'like': 1, 'love': 1})
+        reaction.delete()
+        self.assertEqual(self.counts(), {'like': 1})
+
+    def test_cascades_of_the_message_skip_the_refresh(self):
+        carol = make_user('carol')
+        for user in (self.alice, self.bob, carol):
+            MessageReaction.objects.create(message=self.message, user=user, reaction_type='like')
+        with mock.patch.object(reactions, 'refresh_counts') as refresh:
+            carol.delete()  # Her reaction goes, the message stays
+            self.assertEqual(refresh.call_count, 1)
+            Message.objects.get(id=self.message.id).delete()
+            self.assertEqual(refresh.call_count, 1)
+
+    def test_summaries_read_counts_from_the_column(self):
+        MessageReaction.objects.create(message=self.message, user=self.alice, reaction_type='like')
+        MessageReaction.objects.create(message=self.message, user=self.bob, reaction_type='love')
+        message = Message.objects.get(id=self.message.id)
+        with self.assertNumQueries(1):  # Only the viewer's own reactions
+            summaries = reactions.reaction_context([message], self.bob)['reaction_summaries']
+        self.assertEqual(summaries.counts_of(message.id), {'like': 1, 'love': 1})
+        self.assertEqual(summaries.reaction_of(message.id), 'love')
+
+    def test_refresh_of_a_deleted_message(self):
+        message_id = self.message.id
+        self.message.delete()
+        self.assertEqual(reactions.refresh_counts(message_id), {})
+
+
+class BlockCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def test_block_and_unblock_invalidate_both_users(self):
+        self.assertEqual(blocks.status(self.alice.id, self.bob.id), (False, False))
+        self.assertEqual(blocks.status(self.bob.id, self.alice.id), (False, False))
+        block = BlockedUser.objects.create(blocker=self.alice, blocked=self.bob)
+        self.assertEqual(blocks.status(self.alice.id, self.bob.id), (True, False))
+        self.assertEqual(blocks.status(self.bob.id, self.alice.id), (False, True))
+        self.assertEqual(blocks.visible_ids(self.bob.id, [self.alice.id]), [])
+        block.delete()
+        self.assertFalse(blocks.is_blocked_either_way(self.alice.id, self.bob.id))
+        self.assertFalse(blocks.is_blocked_either_way(self.bob.id, self.alice.id))
+
+    def test_load_racing_a_block_is_not_served_afterwards(self):
+        stale = (frozenset(), frozenset())
+
+        def load_then_block(user_id):
+            # The block commits while the old rows are being read
+            BlockedUser.objects.create(blocker=self.alice, blocked=self.bob)
+            return stale
+
+        with mock.patch.object(blocks, '_load', side_effect=load_then_block):
+            self.assertEqual(blocks.sets(self.alice.id), stale)
+        self.assertTrue(blocks.has_blocked(self.alice.id, self.bob.id))
+
+    def test_warm_sets_cost_no_query(self):
+        blocks.sets(self.alice.id)
+        with self.assertNumQueries(0):
+            blocks.status(self.alice.id, self.bob.id)
+
+    def test_evicted_version_reloads(self):
+        blocks.sets(self.alice.id)
+        BlockedUser.objects.create(blocker=self.alice, blocked=self.bob)
+        cache.delete(blocks._version_key(self.alice.id))
+        self.assertTrue(blocks.has_blocked(self.alice.id, self.bob.id))
+
+
+@override_settings(CONTACT_STATE_LOCAL_TTL=0)
+class ContactStateTests(TestCase):
+    """Direct message permission decisions, read from the cached contact state"""
+
+    def setUp(self):
+        cache.clear()
+        contacts._local.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def send(self, content='hi'):
+        return direct_messages.send(self.alice, self.bob.id, content)
+
+    def assertRefused(self, code):
+        with self.assertRaises(DirectMessageError) as caught:
+            self.send()
+        self.assertEqual(caught.exception.code, code)
+
+    def test_strangers_need_a_request(self):
+        self.assertRefused('request_required')
+        response = client_for(self.alice).post(
+            '/api/chat/messages/send/', {'receiver_id': self.bob.id, 'content': 'hello?'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['data']['is_request'])
+        request_id = response.json()['data']['request_id']
+        self.assertEqual(contacts.state(self.alice.id, self.bob.id).request_of(self.alice.id), ('pending', request_id))
+
+        response = client_for(self.alice).post(
+            '/api/chat/messages/send/', {'receiver_id': self.bob.id, 'content': 'again'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['request_id'], request_id)
+
+    def test_rejected_request_blocks_the_sender(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            request = MessageRequest.objects.create(sender=self.alice, receiver=self.bob, content='hi')
+        contacts.state(self.alice.id, self.bob.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            request.status = 'rejected'
+            request.save()
+        self.assertEqual(contacts.state(self.alice.id, self.bob.id).request_of(self.alice.id)[0], 'rejected')
+        response = client_for(self.alice).post(
+            '/api/chat/messages/send/', {'receiver_id': self.bob.id, 'content': 'please'}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_accepted_contacts_can_message_until_blocked(self):
+        self.assertRefused('request_required')
+        with self.captureOnCommitCallbacks(execute=True):
+            AcceptedMessage.objects.create(user1=self.alice, user2=self.bob, accepted_by=self.bob)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.send().receiver_id, self.bob.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            block = BlockedUser.objects.create(blocker=self.bob, blocked=self.alice)
+        self.assertRefused('blocked')
+        self.assertEqual(contacts.state(self.alice.id, self.bob.id).blocks(self.alice.id), (False, True))
+        with self.captureOnCommitCallbacks(execute=True):
+            block.delete()
+        self.send()
+
+    def test_earlier_messages_allow_messaging(self):
+        contacts.state(self.alice.id, self.bob.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.bob, receiver=self.alice, content='hello')
+        self.assertTrue(contacts.state(self.alice.id, self.bob.id).can_message)
+        self.send()
+
+    def test_load_racing_a_block_is_not_served_afterwards(self):
+        stale = contacts.ContactState(
+            *conversations.ordered(self.alice.id, self.bob.id), False, False, True, True,
+            contacts.NO_REQUEST, contacts.NO_REQUEST,
+        )
+
+        def load_then_block(low_id, high_id):
+            # The block is written while the old row is being read
+            BlockedUser.objects.create(blocker=self.bob, blocked=self.alice)
+            return stale
+
+        with mock.patch.object(contacts, '_load', side_effect=load_then_block):
+            self.assertEqual(contacts.state(self.alice.id, self.bob.id), stale)
+        self.assertTrue(contacts.state(self.alice.id, self.bob.id).blocked)
+        self.assertRefused('blocked')
+
+    def test_warm_state_costs_no_query(self):
+        with self.settings(CONTACT_STATE_LOCAL_TTL=5):
+            contacts.state(self.alice.id, self.bob.id)
+            with self.assertNumQueries(0):
+                contacts.state(self.bob.id, self.alice.id)
+
+
+class ConversationListTests(TestCase):
+    url = '/api/chat/messages/conversations/'
+
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.others = [make_user(f'user{i}') for i in range(3)]
+        for other in self.others:
+            Message.objects.create(sender=other, receiver=self.alice, content='hi')
+
+    def test_pages(self):
+        first = client_for(self.alice).get(self.url, {'page': 1, 'page_size': 2}).json()
+        second = client_for(self.alice).get(self.url, {'page': 2, 'page_size': 2}).json()
+        self.assertEqual((len(first['data']), first['pagination']['has_next']), (2, True))
+        self.assertEqual((len(second['data']), second['pagination']['has_next']), (1, False))
+
+    def test_non_numeric_paging_is_rejected(self):
+        for params in ({'page': 'two'}, {'page_size': 'lots'}):
+            response = client_for(self.alice).get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+
+
+
+class HistoryTests(TestCase):
+    url = '/api/chat/messages/conversation/'
+
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        start = timezone.now() - timedelta(hours=1)
+        self.messages = []
+        # Messages 2 and 3 share a timestamp; the id breaks the tie
+        for i, minute in enumerate((0, 1, 2, 2, 3, 4, 5)):
+            sender, receiver = (self.alice, self.bob) if i % 2 else (self.bob, self.alice)
+            message = Message.objects.create(sender=sender, receiver=receiver, content=f'm{i}')
+            Message.objects.filter(id=message.id).update(created_at=start + timedelta(minutes=minute))
+            self.messages.append(message.id)
+        self.client = client_for(self.alice)
+
+    def fetch(self, **params):
+        body = self.client.get(self.url, {'user_id': self.bob.id, **params}).json()
+        return [row['id'] for row in body['data']], body['pagination']
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        self.assertEqual(history.decode_cursor(history.encode_cursor(moment, 42)), (moment, 42))
+        for cursor in ('', 'garbage', history.encode_cursor(moment, 42)[:-3]):
+            with self.assertRaises(ValueError):
+                history.decode_cursor(cursor)
+
+    def test_before_walks_back_through_both_directions(self):
+        ids, pagination = self.fetch(limit=3)
+        self.assertEqual((ids, pagination['has_more']), (self.messages[4:], True))
+        ids, pagination = self.fetch(limit=3, before=pagination['before'])
+        self.assertEqual((ids, pagination['has_more']), (self.messages[1:4], True))
+        ids, pagination = self.fetch(limit=3, before=pagination['before'])
+        self.assertEqual((ids, pagination['has_more']), (self.messages[:1], False))
+
+    def test_after_catches_up(self):
+        ids, pagination = self.fetch(limit=2, before=self.fetch(limit=5)[1]['before'])
+        self.assertEqual(ids, self.messages[:2])
+        ids, pagination = self.fetch(limit=3, after=pagination['after'])
+        self.assertEqual((ids, pagination['has_more']), (self.messages[2:5], True))
+        ids, pagination = self.fetch(limit=3, after=pagination['after'])
+        self.assertEqual((ids, pagination['has_more']), (self.messages[5:], False))
+
+    @override_settings(CHAT_HISTORY_MAX_WINDOW=4)
+    def test_limit_is_clamped(self):
+        ids, pagination = self.fetch(limit=1000)
+        self.assertEqual((len(ids), pagination['limit']), (4, 4))
+        ids, pagination = self.fetch(limit=0)
+        self.assertEqual((len(ids), pagination['limit']), (1, 1))
+
+    def test_before_and_after_together_are_rejected(self):
+        cursor = history.encode_cursor(timezone.now(), 1)
+        response = self.client.get(self.url, {'user_id': self.bob.id, 'before': cursor, 'after': cursor})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'user_id': self.bob.id, 'before': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+class MessageSearchTests(TestCase):
+    url = '/api/chat/messages/search/'
+
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.carol = make_user('carol')
+        self.room = Room.objects.create(name='group', is_group=True)
+        self.room.participants.add(self.alice, self.bob)
+        self.other_room = Room.objects.create(name='other', is_group=True)
+        self.other_room.participants.add(self.carol)
+        self.in_room = Message.objects.create(room=self.room, sender=self.bob, content='plans for the picnic')
+        self.direct = Message.objects.create(sender=self.alice, receiver=self.bob, content='picnic at noon')
+        Message.objects.create(sender=self.bob, receiver=self.carol, content='picnic without alice')
+        Message.objects.create(room=self.other_room, sender=self.carol, content='picnic in the other room')
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()['data']}
+
+    def test_snippets_are_escaped_before_highlighting(self):
+        Message.objects.create(room=self.room, sender=self.bob, content='<script>alert(1)</script> picnic')
+        response = client_for(self.alice).get(self.url, {'q': 'alert'})
+        snippet = response.json()['data'][0]['snippet']
+        self.assertNotIn('<script>', snippet)
+        self.assertIn('&lt;script&gt;', snippet)
+        self.assertIn('<mark>alert</mark>', snippet)
+
+    def test_results_are_limited_to_the_users_conversations(self):
+        response = client_for(self.alice).get(self.url, {'q': 'picnic'})
+        self.assertEqual(self.ids(response), {self.in_room.id, self.direct.id})
+
+    def test_room_and_user_filters(self):
+        client = client_for(self.alice)
+        self.assertEqual(self.ids(client.get(self.url, {'q': 'picnic', 'room_id': self.room.id})), {self.in_room.id})
+        self.assertEqual(self.ids(client.get(self.url, {'q': 'picnic', 'room_id': self.other_room.id})), set())
+        self.assertEqual(self.ids(client.get(self.url, {'q': 'picnic', 'user_id': self.bob.id})), {self.direct.id})
+        self.assertEqual(self.ids(client.get(self.url, {'q': 'picnic', 'user_id': self.carol.id})), set())
+
+    def test_cursor_pages_through_every_match_once(self):
+        expected = {self.in_room.id} | {
+            Message.objects.create(room=self.room, sender=self.bob, content=f'picnic {i}').id for i in range(4)
+        }
+        client = client_for(self.bob)
+        seen, params = [], {'q': 'picnic', 'room_id': self.room.id, 'limit': 2}
+        while True:
+            body = client.get(self.url, params).json()
+            seen += [row['id'] for row in body['data']]
+            if not body['pagination']['has_more']:
+                break
+            params['cursor'] = body['pagination']['next']
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen), expected)
+
+    def test_cursor_round_trips(self):
+        self.assertEqual(search.decode_cursor(search.encode_cursor(-1.25e-06, 42)), (-1.25e-06, 42))
+        response = client_for(self.alice).get(self.url, {'q': 'picnic', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_search_sees_every_conversation(self):
+        url = '/api/chat/admin/messages/search/'
+        self.assertEqual(client_for(self.alice).get(url, {'q': 'picnic'}).status_code, 403)
+        admin = make_user('admin', role='admin')
+        self.assertEqual(len(self.ids(client_for(admin).get(url, {'q': 'picnic'}))), 4)
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def test_user_stays_online_until_their_last_socket_closes(self):
+        self.assertTrue(presence.connect(self.alice.id))
+        self.assertFalse(presence.connect(self.alice.id))
+        self.assertFalse(presence.disconnect(self.alice.id))
+        self.assertTrue(presence.is_online(self.alice.id))
+        self.assertTrue(presence.disconnect(self.alice.id))
+        self.assertFalse(presence.is_online(self.alice.id))
+
+    @override_settings(PRESENCE_TTL=0.2)
+    def test_heartbeats_renew_presence(self):
+        presence.connect(self.alice.id)
+        time.sleep(0.12)
+        self.assertFalse(presence.heartbeat(self.alice.id))
+        time.sleep(0.12)
+        self.assertTrue(presence.is_online(self.alice.id))  # renewed past the first TTL
+        time.sleep(0.25)
+        self.assertFalse(presence.is_online(self.alice.id))
+        self.assertTrue(presence.heartbeat(self.alice.id))  # back after expiring
+        self.assertTrue(presence.is_online(self.alice.id))
+
+    def test_contacts_are_partners_roommates_and_opted_in_followers(self):
+        partner, roommate, follower, quiet_follower, blocked, stranger = [
+            make_user(name) for name in ('partner', 'roommate', 'follower', 'quiet', 'blocked', 'stranger')
+        ]
+        AcceptedMessage.objects.create(user1=partner, user2=self.alice)
+        room = Room.objects.create(name='group', is_group=True)
+        room.participants.add(self.alice, roommate, blocked)
+        Follow.objects.create(follower=follower, following=self.alice, presence_updates=True)
+        Follow.objects.create(follower=quiet_follower, following=self.alice)
+        Follow.objects.create(follower=self.alice, following=stranger, presence_updates=True)
+        BlockedUser.objects.create(blocker=self.alice, blocked=blocked)
+        self.assertEqual(presence.contact_ids(self.alice.id), sorted([partner.id, roommate.id, follower.id]))
+
+    def test_sweep_announces_users_whose_sockets_died(self):
+        AcceptedMessage.objects.create(user1=self.alice, user2=self.bob)
+        presence.connect(self.alice.id)
+        outbox = presence._outbox({self.alice.id: 'alice'})
+        self.assertEqual(outbox[self.bob.id][0]['is_online'], True)
+        self.assertEqual(presence.expired_users(), {})
+
+        # The worker died: no disconnect, the keys just expire
+        cache.delete_many([presence._connections_key(self.alice.id), presence._online_key(self.alice.id)])
+        self.assertEqual(presence.expired_users(), {self.alice.id: 'alice'})
+        outbox = presence._outbox(presence.expired_users())
+        self.assertEqual(outbox[self.bob.id][0]['is_online'], False)
+        self.assertEqual(presence.expired_users(), {})
+
+
+class AdminConversationTests(TestCase):
+    url = '/api/chat/admin/conversations/'
+
+    def setUp(self):
+        self.admin = make_user('admin', role='admin')
+        self.client_ = client_for(self.admin)
+        now = timezone.now()
+        self.alice = make_user('alice')
+        users = [make_user(f'user{i}') for i in range(3)]
+        # Newest first: room0, direct user0, room1, direct user1, room2, direct user2
+        self.expected = []
+        for i, user in enumerate(users):
+            room = Room.objects.create(name=f'room{i}', is_group=True)
+            room.participants.add(user)
+            Room.objects.filter(id=room.id).update(updated_at=now - timedelta(minutes=2 * i))
+            Message.objects.create(
+                sender=self.alice, receiver=user, content='hi', created_at=now - timedelta(minutes=2 * i + 1)
+            )
+            self.expected += [f'room_{room.id}', f'direct_{self.alice.id}_{user.id}']
+
+    def ids(self, body):
+        return [item['id'] for item in body['results']['data']]
+
+    def test_cursor_pages_interleave_rooms_and_directs(self):
+        seen, params = [], {'limit': 2}
+        while True:
+            body = self.client_.get(self.url, params).json()
+            seen += self.ids(body)
+            if not body['next']:
+                break
+            params['cursor'] = body['next'].split('cursor=')[1].split('&')[0]
+        self.assertEqual(seen, self.expected)
+
+    def test_page_numbers_match_cursor_pages(self):
+        pages = [self.ids(self.client_.get(self.url, {'limit': 2, 'page': page}).json()) for page in (1, 2, 3, 4)]
+        self.assertEqual(pages, [self.expected[0:2], self.expected[2:4], self.expected[4:6], []])
+
+    def test_type_and_search_filters(self):
+        rooms = self.ids(self.client_.get(self.url, {'type': 'room'}).json())
+        self.assertEqual(rooms, [item for item in self.expected if item.startswith('room_')])
+        found = self.ids(self.client_.get(self.url, {'search': 'user1'}).json())
+        self.assertEqual(found, self.expected[2:4])  # Its room (a participant) and its direct
+        found = self.ids(self.client_.get(self.url, {'search': 'room2', 'type': 'room'}).json())
+        self.assertEqual(found, [self.expected[4]])
+
+    def test_total_is_counted_on_the_first_page_or_on_request(self):
+        self.assertEqual(self.client_.get(self.url, {'limit': 2}).json()['count'], 6)
+        self.assertIsNone(self.client_.get(self.url, {'limit': 2, 'page': 2}).json()['count'])
+        self.assertEqual(self.client_.get(self.url, {'limit': 2, 'page': 2, 'count': 'true'}).json()['count'], 6)
+
+    def test_deleting_a_room_skips_its_counter(self):
+        room = Room.objects.create(name='doomed', is_group=True)
+        for i in range(3):
+            Message.objects.create(room=room, sender=self.alice, content=f'm{i}')
+        with CaptureQueriesContext(connection) as queries:
+            room.delete()
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE "chats_room"')])
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CONTACT_STATE_LOCAL_TTL=0,
+)
+class DirectMessageConsumerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.carol = make_user('carol')
+        AcceptedMessage.objects.create(user1=self.alice, user2=self.bob)
+
+    def converse(self, frames, listeners=()):
+        """Send `frames` as alice; return what alice and each listener received"""
+        async def run():
+            app = URLRouter(websocket_urlpatterns)
+            sockets = [WebsocketCommunicator(WithUser(app, user), '/ws/chat/direct/') for user in (self.alice, *listeners)]
+            for socket in sockets:
+                await socket.connect()
+            received = [[] for _ in sockets]
+            for frame in frames:
+                await sockets[0].send_json_to(frame)
+                for socket, frames_ in zip(sockets, received):
+                    while not await socket.receive_nothing(timeout=0.3):
+                        frames_.append(json.loads(await socket.receive_from()))
+            for socket in sockets:
+                await socket.disconnect()
+            return [[f for f in frames_ if f['type'] != 'online_status'] for frames_ in received]
+
+        return async_to_sync(run)()
+
+    def test_send_is_acked_delivered_and_deduplicated(self):
+        frame = {'type': 'send', 'client_id': 'c1', 'receiver_id': self.bob.id, 'content': 'hi'}
+        mine, theirs = self.converse([frame, frame], [self.bob])
+        acks = [f for f in mine if f['type'] == 'ack']
+        self.assertEqual([(ack['ok'], ack['client_id']) for ack in acks], [(True, 'c1'), (True, 'c1')])
+        self.assertEqual(acks[0]['message_id'], acks[1]['message_id'])
+        self.assertEqual([f['message']['content'] for f in theirs if f['type'] == 'message'], ['hi'])
+        self.assertEqual(Message.objects.filter(sender=self.alice).count(), 1)
+
+    def test_retry_waits_for_the_send_in_flight(self):
+        consumer = DirectMessageConsumer()
+        consumer.user = self.alice
+        message = Message.objects.create(sender=self.alice, receiver=self.bob, content='hi')
+        key = f'dm_client_{self.alice.id}_c1'
+        cache.add(key, 'pending', 600)
+        threading.Timer(0.2, cache.set, (key, message.id, 600)).start()
+        self.assertEqual(consumer.send_direct_message(self.bob.id, 'hi', 'c1'), (message, True))
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_failed_send_releases_the_client_id(self):
+        mine, = self.converse([
+            {'type': 'send', 'client_id': 'c1', 'receiver_id': self.carol.id, 'content': 'hi'},
+        ])
+        self.assertIsNone(cache.get(f'dm_client_{self.alice.id}_c1'))
+
+    def test_edit_and_delete_are_acked_and_relayed(self):
+        message = Message.objects.create(sender=self.alice, receiver=self.bob, content='hi')
+        theirs_message = Message.objects.create(sender=self.bob, receiver=self.alice, content='yo')
+        mine, theirs = self.converse([
+            {'type': 'edit', 'client_id': 'e1', 'message_id': message.id, 'content': 'hello'},
+            {'type': 'edit', 'client_id': 'e2', 'message_id': theirs_message.id, 'content': 'mine now'},
+            {'type': 'delete', 'client_id': 'd1', 'message_id': message.id},
+        ], [self.bob])
+        acks = {f['client_id']: f for f in mine if f['type'] == 'ack'}
+        self.assertTrue(acks['e1']['ok'])
+        self.assertEqual((acks['e2']['ok'], acks['e2']['code']), (False, 'not_found'))
+        self.assertEqual((acks['d1']['ok'], acks['d1']['message_id']), (True, message.id))
+        self.assertEqual([f['type'] for f in theirs], ['message_updated', 'message_deleted'])
+        self.assertEqual(theirs[0]['message']['content'], 'hello')
+        self.assertFalse(Message.objects.filter(id=message.id).exists())
+
+    def test_blocked_and_request_required_codes(self):
+        BlockedUser.objects.create(blocker=self.bob, blocked=self.alice)
+        mine, = self.converse([
+            {'type': 'send', 'client_id': 'b1', 'receiver_id': self.bob.id, 'content': 'hi'},
+            {'type': 'send', 'client_id': 'r1', 'receiver_id': self.carol.id, 'content': 'hi'},
+        ])
+        codes = {f['client_id']: f['code'] for f in mine if f['type'] == 'ack' and not f['ok']}
+        self.assertEqual(codes, {'b1': 'blocked', 'r1': 'request_required'})
+        self.assertFalse(Message.objects.exists())
+
+    def test_typing_reaches_only_users_alice_may_message(self):
+        mine, bobs, carols = self.converse([
+            {'type': 'typing', 'receiver_id': self.bob.id, 'is_typing': True},
+            {'type': 'typing', 'receiver_id': self.carol.id, 'is_typing': True},
+        ], [self.bob, self.carol])
+        self.assertEqual([(f['type'], f['user_id'], f['is_typing']) for f in bobs], [('typing', self.alice.id, True)])
+        self.assertEqual(carols, [])
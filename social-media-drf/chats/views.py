@@ -6,7 +6,8 @@ from django.db.models import Q, Max, Count
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from .models import Room, Message, BlockedUser, UserReport, MessageRequest, AcceptedMessage, MessageReaction
+from .models import Room, Message, BlockedUser, UserReport, MessageRequest, AcceptedMessage, MessageReaction, DirectConversation
+from . import admin_conversations, blocks, contacts, conversations, history, reactions, read_state, room_list, search
 from .serializers import (
     RoomSerializer, MessageSerializer, BlockedUserSerializer, 
     UserReportSerializer, CreateUserReportSerializer, MessageRequestSerializer,
@@ -14,6 +15,7 @@ from .serializers import (
 )
 from accounts.serializers import UserSerializer
 from accounts.permissions import IsAdmin
+from utils.exports import ExportView
 from post.models import Follow
 
 User = get_user_model()
@@ -26,24 +28,21 @@ class RoomViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get rooms where current user is a participant, excluding blocked users"""
-        # Get IDs of users blocked by current user
-        blocked_user_ids = BlockedUser.objects.filter(
-            blocker=self.request.user
-        ).values_list('blocked_id', flat=True)
-        
-        # Get rooms where current user is a participant
-        rooms = Room.objects.filter(participants=self.request.user).annotate(
-            last_message_time=Max('messages__created_at')
-        ).order_by('-last_message_time', '-updated_at').distinct()
-        
-        # For one-on-one chats, exclude rooms with blocked users
-        if blocked_user_ids:
-            rooms = rooms.exclude(
-                is_group=False,
-                participants__id__in=blocked_user_ids
-            )
-        
-        return rooms
+        # Annotated with the last message, unread count, etc. (see chats/room_list.py)
+        return room_list.rooms_for(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """One page of rooms, serialized from a handful of batched queries"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rooms = page if page is not None else list(queryset)
+        serializer = self.get_serializer(
+            rooms, many=True,
+            context={**self.get_serializer_context(), **room_list.load(rooms, request.user)}
+        )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         """Create a chat room (one-on-one or group)"""
@@ -68,13 +67,14 @@ class RoomViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Check if user is blocked
-            if BlockedUser.objects.filter(blocker=request.user, blocked=other_user).exists():
+            i_blocked_them, they_blocked_me = blocks.status(request.user.id, other_user.id)
+            if i_blocked_them:
                 return Response({
                     "success": False,
                     "error": "You have blocked this user"
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            if BlockedUser.objects.filter(blocker=other_user, blocked=request.user).exists():
+            if they_blocked_me:
                 return Response({
                     "success": False,
                     "error": "This user has blocked you"
@@ -141,19 +141,31 @@ class RoomViewSet(viewsets.ModelViewSet):
                 "error": "You don't have access to this room"
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Get messages for this room, ordered by created_at
-        messages = Message.objects.filter(room=room).select_related('sender', 'room').order_by('created_at')[:100]  # Get last 100 messages
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
+        try:
+            limit, before, after = history.window_options(request)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Mark messages as read (only messages sent to current user)
-        Message.objects.filter(
-            room=room,
-            is_read=False
-        ).exclude(sender=request.user).update(is_read=True)
+        # Newest window (or the one before/after a cursor), oldest first
+        rows, has_more = history.window([Message.objects.filter(room=room)], limit, before, after)
+        
+        # Showing the newest messages reads them: move the user's watermark (one row)
+        if before is None and rows:
+            read_upto = read_state.mark_room_read(room.id, request.user.id, max(row['id'] for row in rows))
+            if read_upto is not None:
+                read_state.broadcast(read_state.room_event(room.id, request.user.id, read_upto))
+        
+        data, pagination = history.page_of(
+            rows, has_more, request, limit, read_state.read_flags(request.user, room_id=room.id)
+        )
         
         return Response({
             "success": True,
-            "data": serializer.data
+            "data": data,
+            "pagination": pagination
         })
 
     @action(detail=True, methods=['post'])
@@ -177,15 +189,16 @@ class RoomViewSet(viewsets.ModelViewSet):
         if not room.is_group:
             other_participant = room.get_other_participant(request.user)
             if other_participant:
+                i_blocked_them, they_blocked_me = blocks.status(request.user.id, other_participant.id)
                 # Check if user is blocked by other participant
-                if BlockedUser.objects.filter(blocker=other_participant, blocked=request.user).exists():
+                if they_blocked_me:
                     return Response({
                         "success": False,
                         "error": "This user has blocked you"
                     }, status=status.HTTP_403_FORBIDDEN)
                 
                 # Check if user has blocked the other participant
-                if BlockedUser.objects.filter(blocker=request.user, blocked=other_participant).exists():
+                if i_blocked_them:
                     return Response({
                         "success": False,
                         "error": "You have blocked this user"
@@ -566,6 +579,9 @@ class MessageReactionViewSet(viewsets.GenericViewSet):
                 reaction.save()
                 action_taken = "updated"
 
+        # The MessageReaction receivers have refreshed Message.reaction_counts
+        reaction_counts = Message.objects.filter(id=message.id).values_list('reaction_counts', flat=True).first() or {}
+
         # Broadcast update via WebSocket
         from channels.layers import get_channel_layer
         from asgiref.sync import async_to_sync
@@ -579,7 +595,8 @@ class MessageReactionViewSet(viewsets.GenericViewSet):
                     'user_id': request.user.id,
                     'username': request.user.username,
                     'reaction_type': reaction_type if action_taken != "removed" else None,
-                    'action': action_taken
+                    'action': action_taken,
+                    'reactions': reaction_counts
                 }
             }
 
@@ -594,7 +611,8 @@ class MessageReactionViewSet(viewsets.GenericViewSet):
             "message": f"Reaction {action_taken} successfully",
             "data": {
                 "action": action_taken,
-                "reaction_type": reaction_type if action_taken != "removed" else None
+                "reaction_type": reaction_type if action_taken != "removed" else None,
+                "reactions": reaction_counts
             }
         }, status=status.HTTP_200_OK)
 
@@ -609,16 +627,9 @@ class ChatUserListView(APIView):
         from django.core.cache import cache
         cache.set(f'user_online_{request.user.id}', True, timeout=300)  # 5 minutes
         
-        # Get IDs of users blocked by current user
-        blocked_user_ids = BlockedUser.objects.filter(
-            blocker=request.user
-        ).values_list('blocked_id', flat=True)
-        
         # Get all users except current user and blocked users, limit to 20
         all_users = User.objects.exclude(id=request.user.id).select_related('profile')
-        if blocked_user_ids:
-            all_users = all_users.exclude(id__in=blocked_user_ids)
-        all_users = all_users[:20]
+        all_users = blocks.exclude_blocked(all_users, request.user.id)[:20]
         
         serializer = UserSerializer(all_users, many=True, context={'request': request})
         return Response({
@@ -641,20 +652,13 @@ class ChatUserSearchView(APIView):
                 "error": "Search query must be at least 2 characters"
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get IDs of users blocked by current user
-        blocked_user_ids = BlockedUser.objects.filter(
-            blocker=request.user
-        ).values_list('blocked_id', flat=True)
-        
         users = User.objects.filter(
             Q(username__icontains=query) | 
             Q(email__icontains=query)
         ).exclude(id=request.user.id)
         
-        if blocked_user_ids:
-            users = users.exclude(id__in=blocked_user_ids)
-        
-        users = users[:20]  # Limit to 20 results
+        # Leave out users blocked by current user
+        users = blocks.exclude_blocked(users, request.user.id)[:20]  # Limit to 20 results
         
         serializer = UserSerializer(users, many=True, context={'request': request})
         return Response({
@@ -702,61 +706,42 @@ class SendDirectMessageView(APIView):
                 "error": "Cannot send message to yourself"
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # Blocks, accepted contact, earlier messages and requests all come from the
+        # pair's cached contact state (chats/contacts.py), shared with the WebSocket path
+        contact = contacts.state(request.user.id, receiver.id)
+        
         # Check if user is blocked
-        if BlockedUser.objects.filter(blocker=request.user, blocked=receiver).exists():
+        i_blocked_them, they_blocked_me = contact.blocks(request.user.id)
+        if i_blocked_them:
             return Response({
                 "success": False,
                 "error": "You have blocked this user"
             }, status=status.HTTP_403_FORBIDDEN)
         
-        if BlockedUser.objects.filter(blocker=receiver, blocked=request.user).exists():
+        if they_blocked_me:
             return Response({
                 "success": False,
                 "error": "This user has blocked you"
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if users have previously messaged each other or if request was accepted
-        try:
-            # Check if they can message each other (have accepted each other or have previous messages)
-            can_message = AcceptedMessage.can_message(request.user, receiver)
-            
-            # Also check if they have previous messages (existing conversation)
-            has_previous_messages = Message.objects.filter(
-                (Q(sender=request.user, receiver=receiver) | 
-                 Q(sender=receiver, receiver=request.user))
-            ).exists()
-            
-            logger.info(f"Message check - User {request.user.id} to {receiver.id}: can_message={can_message}, has_previous_messages={has_previous_messages}")
-        except Exception as e:
-            logger.error(f"Error checking message permissions: {str(e)}", exc_info=True)
-            # Default to allowing message if check fails (fallback behavior)
-            can_message = False
-            has_previous_messages = False
+        # Check if they can message each other (accepted each other or have previous messages)
+        can_message = contact.can_message
+        logger.info(f"Message check - User {request.user.id} to {receiver.id}: can_message={can_message}")
         
         # If they can't message and haven't messaged before, create a message request
-        if not can_message and not has_previous_messages:
-            # Check if there's already a pending request
-            existing_request = MessageRequest.objects.filter(
-                sender=request.user,
-                receiver=receiver,
-                status='pending'
-            ).first()
+        if not can_message:
+            request_status, existing_request_id = contact.request_of(request.user.id)
             
-            if existing_request:
+            # Check if there's already a pending request
+            if request_status == 'pending':
                 return Response({
                     "success": False,
                     "error": "You have already sent a message request to this user. Please wait for their response.",
-                    "request_id": existing_request.id
+                    "request_id": existing_request_id
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Check if request was previously rejected
-            rejected_request = MessageRequest.objects.filter(
-                sender=request.user,
-                receiver=receiver,
-                status='rejected'
-            ).exists()
-            
-            if rejected_request:
+            if request_status == 'rejected':
                 return Response({
                     "success": False,
                     "error": "This user has rejected your message request. You cannot send messages to them."
@@ -1249,24 +1234,37 @@ class GetConversationView(APIView):
                 "error": "User not found"
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Check block status (but still allow viewing messages)
-        i_blocked_them = BlockedUser.objects.filter(blocker=request.user, blocked=other_user).exists()
-        they_blocked_me = BlockedUser.objects.filter(blocker=other_user, blocked=request.user).exists()
+        try:
+            limit, before, after = history.window_options(request)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get all messages between current user and other user (even if blocked)
-        messages = Message.objects.filter(
-            Q(sender=request.user, receiver=other_user) |
-            Q(sender=other_user, receiver=request.user)
-        ).select_related('sender', 'receiver').order_by('created_at')[:100]  # Get last 100 messages
+        # Check block status (but still allow viewing messages)
+        i_blocked_them, they_blocked_me = blocks.status(request.user.id, other_user.id)
+        
+        # Messages between the two users (even if blocked), one queryset per direction
+        rows, has_more = history.window(
+            [
+                Message.objects.filter(sender=request.user, receiver=other_user),
+                Message.objects.filter(sender=other_user, receiver=request.user),
+            ],
+            limit, before, after
+        )
         
-        # Mark messages as read (only messages sent to current user)
-        Message.objects.filter(
-            sender=other_user,
-            receiver=request.user,
-            is_read=False
-        ).update(is_read=True)
+        # Showing the newest messages reads them: move the watermark on the conversation row
+        if before is None and rows:
+            read_upto = read_state.mark_direct_read(
+                request.user.id, other_user.id, max(row['id'] for row in rows)
+            )
+            if read_upto is not None:
+                read_state.broadcast(*read_state.direct_events(request.user.id, other_user.id, read_upto))
         
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
+        data, pagination = history.page_of(
+            rows, has_more, request, limit, read_state.read_flags(request.user, other_id=other_user.id)
+        )
         
         # Include user info with last_seen and block status
         user_serializer = UserSerializer(other_user, context={'request': request})
@@ -1286,7 +1284,8 @@ class GetConversationView(APIView):
         
         response_data = {
             "success": True,
-            "data": serializer.data,
+            "data": data,
+            "pagination": pagination,
             "user": user_serializer.data,  # Include user info with online status and last_seen
             "block_status": {
                 "i_blocked_them": i_blocked_them,
@@ -1319,99 +1318,116 @@ class GetConversationsListView(APIView):
         from django.core.cache import cache
         cache.set(f'user_online_{request.user.id}', True, timeout=300)  # 5 minutes
         
-        # Get all users the current user has sent or received messages from
-        sent_to = Message.objects.filter(sender=request.user).values_list('receiver_id', flat=True).distinct()
-        received_from = Message.objects.filter(receiver=request.user).values_list('sender_id', flat=True).distinct()
-        
-        # Get users with pending message requests (where current user is receiver)
-        pending_request_senders = MessageRequest.objects.filter(
-            receiver=request.user,
-            status='pending'
-        ).values_list('sender_id', flat=True).distinct()
-        
-        # Get users where current user sent a pending request
-        sent_request_receivers = MessageRequest.objects.filter(
-            sender=request.user,
-            status='pending'
-        ).values_list('receiver_id', flat=True).distinct()
-        
-        # Combine and get unique user IDs (include blocked users so they appear in list)
-        user_ids = set(list(sent_to) + list(received_from) + list(pending_request_senders) + list(sent_request_receivers))
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = min(max(1, int(request.query_params.get('page_size', 50))), 100)
+        except ValueError:
+            return Response({
+                "success": False,
+                "error": "page and page_size must be integers"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        start = (page - 1) * page_size
+        
+        # One indexed query over the DirectConversation summaries (see chats/conversations.py);
+        # one extra row tells whether another page exists
+        rows = list(
+            DirectConversation.objects.filter(
+                Q(user_low=request.user) | Q(user_high=request.user),
+                last_activity_at__isnull=False
+            ).select_related(
+                'user_low__profile', 'user_high__profile',
+                'pending_request__sender__profile', 'pending_request__receiver__profile',
+            ).order_by('-last_activity_at', '-id')[start:start + page_size + 1]
+        )
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        
+        sides = [conversations.for_user(row, request.user.id) for row in rows]
+        # The rows already know who the user blocked; spare UserSerializer a query per user
+        context = {
+            'request': request,
+            'blocked_ids': {other.id for other, _, i_blocked_them, _ in sides if i_blocked_them},
+        }
         
-        # Get the latest message for each conversation
-        conversations = []
-        for user_id in user_ids:
-            try:
-                other_user = User.objects.get(id=user_id)
-                last_message = Message.objects.filter(
-                    Q(sender=request.user, receiver=other_user) |
-                    Q(sender=other_user, receiver=request.user)
-                ).select_related('sender', 'receiver').order_by('-created_at').first()
-                
-                unread_count = Message.objects.filter(
-                    sender=other_user,
-                    receiver=request.user,
-                    is_read=False
-                ).count()
-                
-                # Check for pending message requests
-                pending_request_received = MessageRequest.objects.filter(
-                    sender=other_user,
-                    receiver=request.user,
-                    status='pending'
-                ).select_related('sender', 'receiver').order_by('-created_at').first()
-                
-                pending_request_sent = MessageRequest.objects.filter(
-                    sender=request.user,
-                    receiver=other_user,
-                    status='pending'
-                ).select_related('sender', 'receiver').order_by('-created_at').first()
-                
-                # Check block status
-                i_blocked_them = BlockedUser.objects.filter(blocker=request.user, blocked=other_user).exists()
-                they_blocked_me = BlockedUser.objects.filter(blocker=other_user, blocked=request.user).exists()
-                
-                # Determine last activity time (message or request)
-                last_activity_time = None
-                if last_message:
-                    last_activity_time = last_message.created_at.isoformat()
-                elif pending_request_received:
-                    last_activity_time = pending_request_received.created_at.isoformat()
-                elif pending_request_sent:
-                    last_activity_time = pending_request_sent.created_at.isoformat()
-                
-                conversation_data = {
-                    'user': UserSerializer(other_user, context={'request': request}).data,
-                    'last_message': MessageSerializer(last_message, context={'request': request}).data if last_message else None,
-                    'unread_count': unread_count,
-                    'last_message_time': last_activity_time,
-                    'i_blocked_them': i_blocked_them,
-                    'they_blocked_me': they_blocked_me,
+        data = []
+        for row, (other_user, unread_count, i_blocked_them, they_blocked_me) in zip(rows, sides):
+            last_message = None
+            if row.last_message_at:
+                receiver_id = other_user.id if row.last_sender_id == request.user.id else request.user.id
+                last_message = {
+                    'id': row.last_message_id,
+                    'content': row.last_message_preview,
+                    'sender_id': row.last_sender_id,
+                    'receiver_id': receiver_id,
+                    'created_at': row.last_message_at.isoformat(),
+                    'is_read': (row.last_message_id or 0) <= conversations.read_upto(row, receiver_id),
                 }
-                
-                # Add message request data if exists
-                if pending_request_received:
-                    conversation_data['pending_request'] = MessageRequestSerializer(pending_request_received, context={'request': request}).data
-                    conversation_data['has_pending_request'] = True
-                    conversation_data['is_request_receiver'] = True
-                elif pending_request_sent:
-                    conversation_data['pending_request'] = MessageRequestSerializer(pending_request_sent, context={'request': request}).data
-                    conversation_data['has_pending_request'] = True
-                    conversation_data['is_request_receiver'] = False
-                else:
-                    conversation_data['has_pending_request'] = False
-                    conversation_data['is_request_receiver'] = False
-                
-                conversations.append(conversation_data)
-            except User.DoesNotExist:
-                continue
+            
+            conversation_data = {
+                'user': UserSerializer(other_user, context=context).data,
+                'last_message': last_message,
+                'unread_count': unread_count,
+                'last_message_time': row.last_activity_at.isoformat(),
+                'i_blocked_them': i_blocked_them,
+                'they_blocked_me': they_blocked_me,
+            }
+            
+            pending_request = row.pending_request
+            if pending_request:
+                conversation_data['pending_request'] = MessageRequestSerializer(pending_request, context=context).data
+                conversation_data['has_pending_request'] = True
+                conversation_data['is_request_receiver'] = pending_request.receiver_id == request.user.id
+            else:
+                conversation_data['has_pending_request'] = False
+                conversation_data['is_request_receiver'] = False
+            
+            data.append(conversation_data)
         
-        # Sort by last activity time (most recent first)
-        conversations.sort(key=lambda x: x['last_message_time'] or '', reverse=True)
+        return Response({
+            "success": True,
+            "data": data,
+            "pagination": {
+                "page": page,
+                "page_size": page_size,
+                "has_next": has_next,
+            }
+        })
+
+
+class MessageSearchView(APIView):
+    """
+    Full-text search in the conversations the user can see (see chats/search.py).
+    Optional filters: room_id (one room) or user_id (direct messages with that user).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_messages(self, request):
+        return search.accessible_messages(request.user)
+
+    def get(self, request):
+        try:
+            text, limit, cursor = search.search_options(request)
+            room_id = request.query_params.get('room_id')
+            user_id = request.query_params.get('user_id')
+            messages = self.get_messages(request)
+            if room_id:
+                messages = messages.filter(room_id=int(room_id))
+            elif user_id:
+                user_id = int(user_id)
+                messages = messages.filter(
+                    Q(sender_id=user_id) | Q(receiver_id=user_id), room__isnull=True
+                )
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
+        data, pagination = search.page(messages, text, limit, cursor)
         return Response({
             "success": True,
-            "data": conversations
+            "data": data,
+            "pagination": pagination
         })
 
 
@@ -1533,18 +1549,23 @@ class ReportUserView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _user_reports_queryset(request):
+    """Reports matching the admin list filter (status), newest first"""
+    status_filter = request.query_params.get('status', None)
+    queryset = UserReport.objects.all().select_related('reporter', 'reported_user', 'reviewed_by')
+    
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    
+    return queryset.order_by('-created_at')
+
+
 class UserReportsListView(APIView):
     """Get list of user reports (admin only)"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     
     def get(self, request):
-        status_filter = request.query_params.get('status', None)
-        queryset = UserReport.objects.all().select_related('reporter', 'reported_user', 'reviewed_by')
-        
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        queryset = queryset.order_by('-created_at')
+        queryset = _user_reports_queryset(request)
         serializer = UserReportSerializer(queryset, many=True, context={'request': request})
         
         return Response({
@@ -1553,6 +1574,29 @@ class UserReportsListView(APIView):
         })
 
 
+class UserReportsExportView(ExportView):
+    """Stream user reports as CSV / NDJSON (same filter as UserReportsListView)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    export_name = 'user-reports'
+    columns = (
+        ('id', 'id'),
+        ('reporter_id', 'reporter_id'),
+        ('reporter', 'reporter__username'),
+        ('reported_user_id', 'reported_user_id'),
+        ('reported_user', 'reported_user__username'),
+        ('reason', 'reason'),
+        ('description', 'description'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('reviewed_by', 'reviewed_by__username'),
+        ('reviewed_at', 'reviewed_at'),
+        ('admin_notes', 'admin_notes'),
+    )
+
+    def get_export_queryset(self, request):
+        return _user_reports_queryset(request)
+
+
 class UpdateReportStatusView(APIView):
     """Update report status (admin only)"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
@@ -1689,200 +1733,46 @@ class AdminAllConversationsView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     
     def get(self, request):
-        """Get all conversations - both direct messages and room messages with pagination"""
+        """Get all conversations - both direct messages and room messages, newest activity first"""
         try:
-            # Get pagination parameters
-            page = int(request.query_params.get('page', 1))
-            limit = int(request.query_params.get('limit', 10))
-            
-            # Get filter parameters
-            type_filter = request.query_params.get('type', None)
-            search_query = request.query_params.get('search', None)
-            
-            # Validate pagination parameters
-            if page < 1:
-                page = 1
-            if limit < 1:
-                limit = 10
-            if limit > 100:
-                limit = 100  # Max limit
-            
-            # Get all direct message conversations
-            # Get unique pairs of users who have exchanged messages
-            direct_conversations = []
-            user_pairs = Message.objects.filter(
-                room__isnull=True
-            ).exclude(
-                sender__isnull=True
-            ).exclude(
-                receiver__isnull=True
-            ).values_list('sender_id', 'receiver_id').distinct()
-            
-            # Process each user pair
-            processed_pairs = set()
-            for sender_id, receiver_id in user_pairs:
-                # Create a consistent key for the pair (smaller_id, larger_id)
-                pair_key = tuple(sorted([sender_id, receiver_id]))
-                if pair_key in processed_pairs:
-                    continue
-                processed_pairs.add(pair_key)
-                
-                user1_id, user2_id = pair_key
-                try:
-                    user1 = User.objects.get(id=user1_id)
-                    user2 = User.objects.get(id=user2_id)
-                    
-                    # Get last message between these users
-                    last_message = Message.objects.filter(
-                        Q(sender=user1, receiver=user2) | Q(sender=user2, receiver=user1),
-                        room__isnull=True
-                    ).select_related('sender', 'receiver').order_by('-created_at').first()
-                    
-                    # Get message count
-                    message_count = Message.objects.filter(
-                        Q(sender=user1, receiver=user2) | Q(sender=user2, receiver=user1),
-                        room__isnull=True
-                    ).count()
-                    
-                    # Format created_at safely
-                    created_at_str = None
-                    if last_message and last_message.created_at:
-                        created_at_str = last_message.created_at.isoformat()
-                    
-                    direct_conversations.append({
-                        'id': f'direct_{user1_id}_{user2_id}',
-                        'type': 'direct',
-                        'user1': UserSerializer(user1, context={'request': request}).data,
-                        'user2': UserSerializer(user2, context={'request': request}).data,
-                        'last_message': MessageSerializer(last_message, context={'request': request}).data if last_message else None,
-                        'message_count': message_count,
-                        'created_at': created_at_str,
-                    })
-                except User.DoesNotExist:
-                    continue
-                except Exception as e:
-                    # Log error but continue processing
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Error processing direct conversation pair {pair_key}: {str(e)}")
-                    continue
-            
-            # Get all room conversations
-            rooms = Room.objects.all().annotate(
-                message_count=Count('messages'),
-                last_message_time=Max('messages__created_at')
-            ).prefetch_related('participants', 'admins')
-            
-            # Order by last_message_time (nulls last) and created_at
-            rooms = rooms.order_by('-last_message_time', '-created_at')
-            
-            room_conversations = []
-            for room in rooms:
-                try:
-                    last_message = room.messages.select_related('sender').order_by('-created_at').first()
-                    
-                    # Format created_at safely
-                    created_at_str = None
-                    if last_message and last_message.created_at:
-                        created_at_str = last_message.created_at.isoformat()
-                    elif room.created_at:
-                        created_at_str = room.created_at.isoformat()
-                    
-                    room_conversations.append({
-                        'id': f'room_{room.id}',
-                        'type': 'room',
-                        'room_id': room.id,
-                        'name': room.name,
-                        'is_group': room.is_group,
-                        'participants': UserSerializer(room.participants.all(), many=True, context={'request': request}).data,
-                        'admins': UserSerializer(room.admins.all(), many=True, context={'request': request}).data,
-                        'last_message': MessageSerializer(last_message, context={'request': request}).data if last_message else None,
-                        'message_count': room.message_count or 0,
-                        'created_at': created_at_str,
-                    })
-                except Exception as e:
-                    # Log error but continue processing
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Error processing room {room.id}: {str(e)}")
-                    continue
-            
-            # Combine and sort by last message time
-            all_conversations = direct_conversations + room_conversations
-            all_conversations.sort(key=lambda x: x.get('created_at') or '', reverse=True)
-            
-            # Apply type filter
-            if type_filter and type_filter != 'all':
-                all_conversations = [c for c in all_conversations if c.get('type') == type_filter]
-            
-            # Apply search filter
-            if search_query:
-                search_query = search_query.strip().lower()
-                if search_query:
-                    filtered_conversations = []
-                    for conv in all_conversations:
-                        if conv.get('type') == 'direct':
-                            user1 = conv.get('user1', {})
-                            user2 = conv.get('user2', {})
-                            user1_name = (user1.get('display_name') or user1.get('username') or '').lower()
-                            user2_name = (user2.get('display_name') or user2.get('username') or '').lower()
-                            user1_email = (user1.get('email') or '').lower()
-                            user2_email = (user2.get('email') or '').lower()
-                            if (search_query in user1_name or search_query in user2_name or 
-                                search_query in user1_email or search_query in user2_email):
-                                filtered_conversations.append(conv)
-                        else:  # room
-                            room_name = (conv.get('name') or '').lower()
-                            participants = conv.get('participants', [])
-                            participant_names = [
-                                (p.get('display_name') or p.get('username') or '').lower()
-                                for p in participants
-                            ]
-                            if (search_query in room_name or 
-                                any(search_query in name for name in participant_names)):
-                                filtered_conversations.append(conv)
-                    all_conversations = filtered_conversations
-            
-            # Apply pagination
-            total_count = len(all_conversations)
-            start_index = (page - 1) * limit
-            end_index = start_index + limit
-            paginated_conversations = all_conversations[start_index:end_index]
-            
-            # Calculate pagination info
-            total_pages = (total_count + limit - 1) // limit  # Ceiling division
-            has_next = page < total_pages
-            has_previous = page > 1
-            next_page = page + 1 if has_next else None
-            previous_page = page - 1 if has_previous else None
-            
-            # Build next and previous URLs
-            base_url = request.build_absolute_uri(request.path)
-            next_url = None
-            previous_url = None
-            
-            if next_page:
-                next_url = f"{base_url}?page={next_page}&limit={limit}"
-            if previous_page:
-                previous_url = f"{base_url}?page={previous_page}&limit={limit}"
-            
-            return Response({
-                "count": total_count,
-                "next": next_url,
-                "previous": previous_url,
-                "results": {
-                    "success": True,
-                    "data": paginated_conversations
-                }
-            })
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error in AdminAllConversationsView: {str(e)}")
+            types, search_query, limit, cursor, page = admin_conversations.options(request)
+        except ValueError as e:
             return Response({
                 "success": False,
                 "error": str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Filters and search run in SQL over the summary rows (see chats/admin_conversations.py)
+        start = cursor or admin_conversations.cursor_at(types, search_query, (page - 1) * limit)
+        items, has_next = admin_conversations.window(types, search_query, limit, start)
+        # Counting both sources is the costly part; later pages only count on request
+        total_count = None
+        if (not cursor and page == 1) or request.query_params.get('count') == 'true':
+            total_count = admin_conversations.count(types, search_query)
+        
+        # Build next and previous URLs
+        params = request.query_params.copy()
+        params.pop('page', None)
+        next_url = None
+        previous_url = None
+        if has_next:
+            kind, row = items[-1]
+            params['cursor'] = admin_conversations.encode_cursor(row.activity_at, kind, row.id)
+            next_url = f"{request.build_absolute_uri(request.path)}?{params.urlencode()}"
+        if not cursor and page > 1:
+            params.pop('cursor', None)
+            params['page'] = page - 1
+            previous_url = f"{request.build_absolute_uri(request.path)}?{params.urlencode()}"
+        
+        return Response({
+            "count": total_count,
+            "next": next_url,
+            "previous": previous_url,
+            "results": {
+                "success": True,
+                "data": admin_conversations.serialize(items, request)
+            }
+        })
 
 
 class AdminGetConversationMessagesView(APIView):
@@ -1918,7 +1808,11 @@ class AdminGetConversationMessagesView(APIView):
                 room__isnull=True
             ).select_related('sender', 'receiver').order_by('created_at')
             
-            serializer = MessageSerializer(messages, many=True, context={'request': request})
+            messages = list(messages)
+            serializer = MessageSerializer(
+                messages, many=True,
+                context={'request': request, **reactions.reaction_context(messages, request.user)}
+            )
             
             return Response({
                 "success": True,
@@ -1945,7 +1839,11 @@ class AdminGetConversationMessagesView(APIView):
                 room=room
             ).select_related('sender', 'room').order_by('created_at')
             
-            serializer = MessageSerializer(messages, many=True, context={'request': request})
+            messages = list(messages)
+            serializer = MessageSerializer(
+                messages, many=True,
+                context={'request': request, **reactions.reaction_context(messages, request.user)}
+            )
             
             return Response({
                 "success": True,
@@ -1990,15 +1888,26 @@ class AdminChatHistoryView(APIView):
         ).select_related('sender', 'receiver').order_by('-created_at')[:50]
         
         # Serialize messages
-        serializer = MessageSerializer(direct_messages, many=True)
+        direct_messages = list(direct_messages)
+        serializer = MessageSerializer(
+            direct_messages, many=True, context=reactions.reaction_context(direct_messages)
+        )
         
         return Response({
             "success": True,
             "data": serializer.data,
-            "count": direct_messages.count()
+            "count": len(direct_messages)
         }, status=status.HTTP_200_OK)
 
 
+class AdminMessageSearchView(MessageSearchView):
+    """Full-text search over all chat messages - admin only (same params as MessageSearchView)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def get_messages(self, request):
+        return Message.objects.all()
+
+
 class AdminDeleteConversationView(APIView):
     """Delete a conversation (direct or room) - admin only"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
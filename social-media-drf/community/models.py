@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from django.core.validators import RegexValidator, MinLengthValidator
 from django.db.models import F
 from django.conf import settings
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.files.storage import default_storage
 from post.models import *
@@ -208,4 +208,28 @@ def delete_community_images(sender, instance, **kwargs):
             default_storage.delete(instance.profile_image.name)
     if instance.cover_image:
         if default_storage.exists(instance.cover_image.name):
-            default_storage.delete(instance.cover_image.name)
\ No newline at end of file
+            default_storage.delete(instance.cover_image.name)
+
+@receiver(post_save, sender=CommunityMember)
+@receiver(post_delete, sender=CommunityMember)
+def bump_membership_versions(sender, instance, **kwargs):
+    """Membership changes alter the community page and the member's profile counts"""
+    from utils.conditional import bump
+    bump('community', instance.community_id)
+    bump('profile', instance.user_id)
+
+@receiver(post_save, sender=CommunityJoinRequest)
+@receiver(post_delete, sender=CommunityJoinRequest)
+@receiver(post_save, sender=CommunityInvitation)
+@receiver(post_delete, sender=CommunityInvitation)
+def bump_community_version(sender, instance, **kwargs):
+    """Pending requests/invitations change the per-user flags on the community page"""
+    from utils.conditional import bump
+    bump('community', instance.community_id)
+
+
+# Shared response cache (utils/response_cache.py)
+from utils.response_cache import invalidate_on
+
+invalidate_on(Community, 'communities')
+invalidate_on(CommunityMember, 'communities')
@@ -10,6 +10,8 @@ from datetime import timedelta
 from .models import *
 from .serializers import *
 from post.models import Notification
+from utils.conditional import conditional, make_etag, latest, versions
+from utils.response_cache import cached_response
 
 User = get_user_model()
 
@@ -107,6 +109,19 @@ class CommunityViewSet(viewsets.ModelViewSet):
             "data": serializer.data
         })
     
+    def _retrieve_validators(self, request, *args, **kwargs):
+        """ETag/Last-Modified for a community page from its row and content version"""
+        row = Community.objects.filter(name=kwargs.get(self.lookup_field)).values(
+            'id', 'updated_at', 'members_count', 'posts_count'
+        ).first()
+        if row is None:
+            return None
+        # members_count/posts_count change through update() without touching updated_at
+        (version,) = versions(('community', row['id']))
+        etag = make_etag('community', request.user.id, row, version)
+        return etag, latest(row['updated_at'], version)
+
+    @conditional(_retrieve_validators)
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         user = request.user
@@ -173,6 +188,8 @@ class CommunityViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['get'])
+    # Only the anonymous list is shared; counters move via F() updates, hence the TTL
+    @cached_response('popular_communities', ttl=120, tags=('communities',), anonymous_only=True)
     def popular(self, request):
         """Get popular communities based on members count"""
         user = request.user
@@ -33,6 +33,16 @@ except:
 # Wait for database
 wait_for_postgres
 
+# Start the local channel broker when workers share it instead of Redis. Without
+# CACHE_URL it also holds the Django cache, so start it before anything saves a model.
+if [ "${USE_LOCAL_CHANNELS,,}" = "true" ]; then
+    echo "Starting channel broker..."
+    python manage.py run_channel_broker &
+    while [ ! -S "${CHANNEL_BROKER_SOCKET:-/tmp/channels.sock}" ]; do
+        sleep 0.2
+    done
+fi
+
 # Run database migrations
 echo "Running database migrations..."
 python manage.py migrate --noinput
@@ -49,5 +59,10 @@ fi
 
 echo "Starting server..."
 
+# Several daphne workers share the broker and one listening socket (WEB_CONCURRENCY, default one per core)
+if [ "${USE_LOCAL_CHANNELS,,}" = "true" ]; then
+    exec python manage.py run_asgi_workers --bind 0.0.0.0 --port 8000
+fi
+
 # Start daphne for ASGI (supports WebSockets)
 exec daphne -b 0.0.0.0 -p 8000 app.asgi:application
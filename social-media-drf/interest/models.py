@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.text import slugify
 from django.contrib.auth import get_user_model
 
@@ -8,6 +10,7 @@ class Category(models.Model):
     """ Category model for Marketplace """
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -21,6 +24,24 @@ class SubCategory(models.Model):
     """ SubCategory model for Marketplace """
     category = models.ForeignKey(Category, related_name="subcategories", on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.category.name})"
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def bump_interest_version(sender, instance, **kwargs):
+    """Deletes don't move max(updated_at), so category validators also use this version"""
+    from utils.conditional import bump
+    bump('interest')
+
+
+# Shared response cache (utils/response_cache.py)
+from utils.response_cache import invalidate_on
+
+invalidate_on(Category, 'interest')
+invalidate_on(SubCategory, 'interest')
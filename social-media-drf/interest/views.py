@@ -1,5 +1,8 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
+from django.db.models import Count, Max
+from utils.conditional import conditional, make_etag, latest, versions
+from utils.response_cache import cached_response
 from .models import *
 from .serializers import *
 
@@ -18,6 +21,40 @@ def error_response(message, code=status.HTTP_400_BAD_REQUEST):
     }, status=code)
 """ End of Custom Responses """
 
+""" Conditional GET validators """
+def _collection_state(queryset):
+    """max(updated_at) and row count for a queryset, in one aggregate query"""
+    state = queryset.aggregate(latest=Max('updated_at'), total=Count('id'))
+    return state['latest'], state['total']
+
+def _category_list_validators(view, request, *args, **kwargs):
+    categories = _collection_state(Category.objects.all())
+    subcategories = _collection_state(SubCategory.objects.all())
+    (version,) = versions(('interest', None))
+    etag = make_etag('categories', categories, subcategories, version)
+    return etag, latest(categories[0], subcategories[0], version)
+
+def _category_validators(view, request, *args, **kwargs):
+    row = Category.objects.filter(pk=kwargs.get('pk')).values('updated_at').first()
+    if row is None:
+        return None
+    subcategories = _collection_state(SubCategory.objects.filter(category_id=kwargs.get('pk')))
+    (version,) = versions(('interest', None))
+    etag = make_etag('category', kwargs.get('pk'), row['updated_at'], subcategories, version)
+    return etag, latest(row['updated_at'], subcategories[0], version)
+
+def _subcategory_list_validators(view, request, *args, **kwargs):
+    subcategories = _collection_state(SubCategory.objects.all())
+    (version,) = versions(('interest', None))
+    return make_etag('subcategories', subcategories, version), latest(subcategories[0], version)
+
+def _subcategory_validators(view, request, *args, **kwargs):
+    row = SubCategory.objects.filter(pk=kwargs.get('pk')).values('updated_at').first()
+    if row is None:
+        return None
+    return make_etag('subcategory', kwargs.get('pk'), row['updated_at']), latest(row['updated_at'])
+""" End of Conditional GET validators """
+
 """ Viewset for Interest """
 class CategoryViewSet(viewsets.ModelViewSet):
     """ Viewset for Category """
@@ -26,12 +63,16 @@ class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]
 
     # List all
+    @conditional(_category_list_validators, personalized=False)
+    @cached_response('interest_categories', tags=('interest',))
     def list(self, request, *args, **kwargs):
         categories = self.get_queryset()
         serializer = self.get_serializer(categories, many=True)
         return success_response("All categories fetched successfully", serializer.data)
 
     # Retrieve single
+    @conditional(_category_validators, personalized=False)
+    @cached_response('interest_category', tags=('interest',))
     def retrieve(self, request, *args, **kwargs):
         category = self.get_object()
         serializer = self.get_serializer(category)
@@ -76,12 +117,16 @@ class SubCategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]
 
     # List all
+    @conditional(_subcategory_list_validators, personalized=False)
+    @cached_response('interest_subcategories', tags=('interest',))
     def list(self, request, *args, **kwargs):
         sub_categories = self.get_queryset()
         serializer = self.get_serializer(sub_categories, many=True)
         return success_response("All sub-categories fetched successfully", serializer.data)
 
     # Retrieve single
+    @conditional(_subcategory_validators, personalized=False)
+    @cached_response('interest_subcategory', tags=('interest',))
     def retrieve(self, request, *args, **kwargs):
         subcat = self.get_object()
         serializer = self.get_serializer(subcat)
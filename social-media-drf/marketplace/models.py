@@ -234,3 +234,11 @@ class PostCredit(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+
+
+# Shared response cache (utils/response_cache.py)
+from utils.response_cache import invalidate_on
+
+invalidate_on(Category, 'marketplace_categories')
+invalidate_on(SubCategory, 'marketplace_categories')
+invalidate_on(SubscriptionPlan, 'subscription_plans')
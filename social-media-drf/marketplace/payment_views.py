@@ -25,6 +25,7 @@ from .payment_serializers import (
     SubscriptionUsageSerializer
 )
 from .views import success_response, error_response
+from utils.response_cache import cached_response
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +53,8 @@ class SubscriptionPlanViewSet(viewsets.ModelViewSet):
             return SubscriptionPlan.objects.all().order_by('price')
         return SubscriptionPlan.objects.filter(is_active=True).order_by('price')
     
+    # Admins see inactive plans too, so entries vary by role
+    @cached_response('subscription_plans', vary='role', tags=('subscription_plans',))
     def list(self, request, *args, **kwargs):
         try:
             queryset = self.filter_queryset(self.get_queryset())
@@ -12,6 +12,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from rest_framework import filters
 from rest_framework.decorators import action
+from utils.response_cache import cached_response
 import logging
 
 
@@ -38,10 +39,12 @@ class MarketplaceCategoryViewSet(viewsets.ModelViewSet):
 
     permission_classes = [IsOwnerOrReadOnly]
 
+    @cached_response('marketplace_categories', tags=('marketplace_categories',))
     def list(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.get_queryset(), many=True)
         return success_response("Category list retrieved successfully.", serializer.data)
 
+    @cached_response('marketplace_category', tags=('marketplace_categories',))
     def retrieve(self, request, pk=None, *args, **kwargs):
         category = get_object_or_404(Category, pk=pk)
         serializer = self.get_serializer(category)
@@ -76,6 +79,7 @@ class MarketplaceSubCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = SubCategorySerializer
     permission_classes = [IsOwnerOrReadOnly]
 
+    @cached_response('marketplace_subcategories', tags=('marketplace_categories',))
     def list(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.get_queryset(), many=True)
         return success_response("SubCategory list retrieved successfully.", serializer.data)
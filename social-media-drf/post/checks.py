@@ -0,0 +1,26 @@
+# post/checks.py
+"""
+System checks for multi-worker deployments.
+
+The follow graph (post/follow_graph.py) caches adjacency lists in each
+process. With USE_LOCAL_CHANNELS several workers serve the site; unless
+FOLLOW_GRAPH_SHARED is on, a follow handled by one worker stays invisible
+to the others until their copy's FOLLOW_GRAPH_LOCAL_TTL runs out.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def follow_graph_shared_check(app_configs, **kwargs):
+    layer = settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND', '')
+    if layer != 'utils.local_channel_layer.LocalChannelLayer':
+        return []
+    if not getattr(settings, 'FOLLOW_GRAPH_SHARED', False):
+        return [Error(
+            'USE_LOCAL_CHANNELS runs several workers, but FOLLOW_GRAPH_SHARED is off, so each '
+            'worker serves its own follow graph.',
+            hint='Unset FOLLOW_GRAPH_SHARED (it defaults on with USE_LOCAL_CHANNELS) or set it to True.',
+            id='post.E001',
+        )]
+    return []
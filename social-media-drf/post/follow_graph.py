@@ -0,0 +1,322 @@
+# post/follow_graph.py
+"""
+In-process cache of the follow graph.
+
+Each cached user keeps two sorted array('I') adjacency lists (the ids they
+follow and the ids following them), loaded lazily with one query per
+direction. Membership is a binary search and intersections are a linear
+merge of two sorted arrays, so is_following, counts and mutual lookups
+don't touch the database once a user is warm.
+
+Cold users are evicted least-recently-used first once the cache grows past
+settings.FOLLOW_GRAPH_MAX_BYTES. Follow/unfollow receivers in post/models.py
+patch cached lists after the transaction commits. A load that a patch for
+the same user overtook is returned but not cached, since it may predate
+the write.
+
+With settings.FOLLOW_GRAPH_SHARED enabled, every user also has a version
+number in the Django cache (and their serialized lists under it). Writes
+bump the version; readers compare it against their local copy, so workers
+running in separate processes pick up each other's changes on the next read.
+Without it, a local copy is reloaded after settings.FOLLOW_GRAPH_LOCAL_TTL
+seconds, which bounds how stale another process's writes can leave it.
+
+User ids must fit in an unsigned 32-bit integer.
+"""
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+TYPECODE = 'I'
+
+
+def _contains(ids, value):
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def _insert(ids, value):
+    i = bisect_left(ids, value)
+    if i == len(ids) or ids[i] != value:
+        ids.insert(i, value)
+
+
+def _remove(ids, value):
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+
+
+def intersect(a, b):
+    """Intersect two sorted id arrays"""
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return array(TYPECODE)
+
+    # Much smaller side: binary search it into the larger one
+    if len(a) * 16 < len(b):
+        return array(TYPECODE, (value for value in a if _contains(b, value)))
+
+    result = array(TYPECODE)
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            result.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class _Node:
+    __slots__ = ('following', 'followers', 'version', 'loaded_at')
+
+    def __init__(self, following, followers, version=None):
+        self.following = following
+        self.followers = followers
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def nbytes(self):
+        return sys.getsizeof(self.following) + sys.getsizeof(self.followers)
+
+
+class FollowGraph:
+    """LRU-bounded cache of per-user follow adjacency lists"""
+
+    def __init__(self, max_bytes=None, shared=None, local_ttl=None):
+        self.max_bytes = max_bytes if max_bytes is not None else getattr(
+            settings, 'FOLLOW_GRAPH_MAX_BYTES', 32 * 1024 * 1024
+        )
+        self.shared = shared if shared is not None else getattr(settings, 'FOLLOW_GRAPH_SHARED', False)
+        self.shared_timeout = getattr(settings, 'FOLLOW_GRAPH_SHARED_TIMEOUT', 3600)
+        self.local_ttl = local_ttl if local_ttl is not None else getattr(settings, 'FOLLOW_GRAPH_LOCAL_TTL', 30)
+        self._nodes = OrderedDict()
+        self._bytes = 0
+        self._loading = {}  # user id -> [loads running, writes seen meanwhile]
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Shared store
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'follow_graph_v_{user_id}'
+
+    @staticmethod
+    def _data_key(user_id):
+        return f'follow_graph_{user_id}'
+
+    def _shared_version(self, user_id):
+        return cache.get_or_set(self._version_key(user_id), 0, timeout=None)
+
+    def _bump_shared_version(self, user_id):
+        key = self._version_key(user_id)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Version was evicted; a timestamp can't collide with a stamp a worker still holds
+            version = int(time.time() * 1000)
+            cache.set(key, version, timeout=None)
+            return version
+
+    def _load_shared(self, user_id, version):
+        data = cache.get(self._data_key(user_id))
+        if data is None or data[0] != version:
+            return None
+        following, followers = array(TYPECODE), array(TYPECODE)
+        following.frombytes(data[1])
+        followers.frombytes(data[2])
+        return _Node(following, followers, version)
+
+    def _store_shared(self, user_id, node):
+        cache.set(
+            self._data_key(user_id),
+            (node.version, node.following.tobytes(), node.followers.tobytes()),
+            timeout=self.shared_timeout,
+        )
+
+    # ------------------------------------------------------------------
+    # Local cache
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _load_from_db(user_id):
+        from .models import Follow
+
+        following = array(TYPECODE, sorted(
+            Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True)
+        ))
+        followers = array(TYPECODE, sorted(
+            Follow.objects.filter(following_id=user_id).values_list('follower_id', flat=True)
+        ))
+        return _Node(following, followers)
+
+    def _node(self, user_id):
+        # Read the version before loading so a concurrent write forces a reload next time
+        version = self._shared_version(user_id) if self.shared else None
+
+        with self._lock:
+            node = self._nodes.get(user_id)
+            if node is not None and node.version == version and self._fresh(node):
+                self._nodes.move_to_end(user_id)
+                return node
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            writes = loading[1]
+
+        try:
+            node = self._load_shared(user_id, version) if self.shared else None
+            if node is None:
+                node = self._load_from_db(user_id)
+                node.version = version
+                if self.shared:
+                    self._store_shared(user_id, node)
+        except BaseException:
+            with self._lock:
+                self._done_loading(user_id, loading)
+            raise
+
+        with self._lock:
+            self._done_loading(user_id, loading)
+            if loading[1] != writes:
+                # A write landed while this loaded; the next read loads again
+                return node
+            self._discard(user_id)
+            self._nodes[user_id] = node
+            self._bytes += node.nbytes()
+            self._evict()
+        return node
+
+    def _fresh(self, node):
+        # Shared mode compares versions instead; a local copy only ages out
+        return self.shared or time.monotonic() - node.loaded_at < self.local_ttl
+
+    def _mark_written(self, user_id):
+        """Keep loads of `user_id` already running from caching what they read"""
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            loading[1] += 1
+
+    def _done_loading(self, user_id, loading):
+        loading[0] -= 1
+        if not loading[0]:
+            del self._loading[user_id]
+
+    def _discard(self, user_id):
+        node = self._nodes.pop(user_id, None)
+        if node is not None:
+            self._bytes -= node.nbytes()
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the cap
+        while self._bytes > self.max_bytes and len(self._nodes) > 1:
+            _, node = self._nodes.popitem(last=False)
+            self._bytes -= node.nbytes()
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def following(self, user_id):
+        """Sorted ids of the users `user_id` follows (do not mutate)"""
+        return self._node(user_id).following
+
+    def followers(self, user_id):
+        """Sorted ids of the users following `user_id` (do not mutate)"""
+        return self._node(user_id).followers
+
+    def following_count(self, user_id):
+        return len(self._node(user_id).following)
+
+    def followers_count(self, user_id):
+        return len(self._node(user_id).followers)
+
+    def is_following(self, follower_id, following_id):
+        return _contains(self._node(follower_id).following, following_id)
+
+    def filter_following(self, user_id, candidate_ids):
+        """Return the subset of candidate_ids that user_id follows"""
+        following = self._node(user_id).following
+        return {candidate_id for candidate_id in candidate_ids if _contains(following, candidate_id)}
+
+    def mutual_follows(self, user_id):
+        """Users that user_id follows and who follow user_id back"""
+        node = self._node(user_id)
+        return intersect(node.following, node.followers)
+
+    def common_following(self, user_a, user_b):
+        """Users followed by both user_a and user_b"""
+        return intersect(self._node(user_a).following, self._node(user_b).following)
+
+    def common_followers(self, user_a, user_b):
+        """Users following both user_a and user_b"""
+        return intersect(self._node(user_a).followers, self._node(user_b).followers)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def on_follow(self, follower_id, following_id):
+        self._apply(follower_id, following_id, _insert)
+
+    def on_unfollow(self, follower_id, following_id):
+        self._apply(follower_id, following_id, _remove)
+
+    def _apply(self, follower_id, following_id, op):
+        versions = {}
+        if self.shared:
+            versions = {
+                follower_id: self._bump_shared_version(follower_id),
+                following_id: self._bump_shared_version(following_id),
+            }
+            cache.delete_many([self._data_key(follower_id), self._data_key(following_id)])
+
+        with self._lock:
+            for user_id, attr, other_id in (
+                (follower_id, 'following', following_id),
+                (following_id, 'followers', follower_id),
+            ):
+                self._mark_written(user_id)
+                node = self._nodes.get(user_id)
+                if node is None:
+                    continue
+                if self.shared:
+                    # Only patch a copy that was current right before this write
+                    if node.version != versions[user_id] - 1:
+                        self._discard(user_id)
+                        continue
+                    node.version = versions[user_id]
+                self._bytes -= node.nbytes()
+                op(getattr(node, attr), other_id)
+                self._bytes += node.nbytes()
+            self._evict()
+
+    def invalidate(self, user_id):
+        """Forget a user's cached lists in this process (and in the shared store)"""
+        with self._lock:
+            self._mark_written(user_id)
+            self._discard(user_id)
+        if self.shared:
+            self._bump_shared_version(user_id)
+            cache.delete(self._data_key(user_id))
+
+    def clear(self):
+        """Drop every locally cached user"""
+        with self._lock:
+            self._nodes.clear()
+            self._bytes = 0
+
+
+follow_graph = FollowGraph()
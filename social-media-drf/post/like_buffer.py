@@ -0,0 +1,270 @@
+# post/like_buffer.py
+"""
+Write-behind buffer for the toggle_like endpoint.
+
+A toggle only records the desired state: in this process's pending map and
+in a per-user overlay in the Django cache ({post_id: liked}). A background
+thread flushes the pending map every settings.LIKE_FLUSH_INTERVAL seconds:
+one query finds which rows exist, then missing likes are bulk inserted,
+unliked rows are deleted per post with their like notifications, new like
+notifications are bulk inserted, and unread counters get one increment per
+recipient. Flushes that add likes to the same posts lock those post rows
+and re-read the likes, so a like another worker inserted first is not
+notified twice. Rapid like/unlike/like sequences collapse into a single
+write, or none.
+
+The overlay is the source of truth while writes are pending. The acting user
+reads their own toggles from it (PostSerializer.is_liked / likes_count). The
+flusher also resolves each pair from it, so two workers that buffered
+conflicting toggles for the same pair both write the latest one. Every
+read-modify-write of an overlay holds a short per-user lock in the cache, so
+a toggle and a flush settling the same overlay can't drop each other's entries.
+
+Toggles still pending when the process dies are lost (the flusher also
+runs at exit). LIKE_FLUSH_INTERVAL = 0 writes every toggle immediately.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from utils.conditional import bump
+
+logger = logging.getLogger(__name__)
+
+# Seconds an overlay lock lives if its holder dies before releasing it
+OVERLAY_LOCK_TIMEOUT = 5
+
+_pending = {}
+_lock = threading.Lock()
+_flusher = None
+
+
+def _interval():
+    return getattr(settings, 'LIKE_FLUSH_INTERVAL', 1.0)
+
+
+def _max_pending():
+    return getattr(settings, 'LIKE_FLUSH_MAX_PENDING', 1000)
+
+
+def _timeout():
+    return getattr(settings, 'LIKE_STATE_TIMEOUT', 300)
+
+
+def _overlay_key(user_id):
+    return f'like_overlay_{user_id}'
+
+
+@contextmanager
+def _overlay_lock(user_id):
+    """Hold the user's overlay lock; a lock left by a dead holder expires"""
+    key = _overlay_key(user_id) + '_lock'
+    while not cache.add(key, 1, timeout=OVERLAY_LOCK_TIMEOUT):
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def user_overlay(user_id):
+    """Return {post_id: liked} for the user's toggles that may not be flushed yet"""
+    return cache.get(_overlay_key(user_id)) or {}
+
+
+def current_state(user_id, post_id):
+    """Whether the user likes the post, including their unflushed toggles"""
+    from .models import Like
+
+    overlay = user_overlay(user_id)
+    if post_id in overlay:
+        return overlay[post_id]
+    return Like.objects.filter(user_id=user_id, post_id=post_id).exists()
+
+
+def toggle(user_id, post_id, liked=None):
+    """
+    Record the desired like state for (user, post).
+
+    `liked=None` flips the current state; True/False sets it (idempotent).
+    Returns the resulting state.
+    """
+    key = _overlay_key(user_id)
+    with _overlay_lock(user_id):
+        if liked is None:
+            liked = not current_state(user_id, post_id)
+        overlay = cache.get(key) or {}
+        overlay[post_id] = liked
+        cache.set(key, overlay, timeout=_timeout())
+
+    with _lock:
+        _pending[(user_id, post_id)] = liked
+        pending_count = len(_pending)
+
+    # The acting user's view of the post changed (ETag / Last-Modified)
+    bump('post', post_id)
+
+    if not _interval() or pending_count >= _max_pending():
+        try:
+            flush()
+        except Exception:
+            # The toggle is recorded and the batch re-queued; the flusher retries it
+            _ensure_flusher()
+    else:
+        _ensure_flusher()
+    return liked
+
+
+def flush():
+    """Persist every pending toggle. Returns the number of (user, post) pairs handled."""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+
+    try:
+        _write(pending)
+    except Exception:
+        logger.exception("Failed to flush %d buffered like(s); re-queueing", len(pending))
+        with _lock:
+            # Newer toggles recorded meanwhile win over the failed batch
+            for pair, liked in pending.items():
+                _pending.setdefault(pair, liked)
+        raise
+    return len(pending)
+
+
+def _write(pending):
+    from .models import Like, Notification, Post
+    from . import unread_counters
+
+    desired = defaultdict(dict)
+    for (user_id, post_id), liked in pending.items():
+        desired[user_id][post_id] = liked
+
+    # The shared overlay holds the latest toggle, even one buffered by another worker
+    overlays = cache.get_many([_overlay_key(user_id) for user_id in desired])
+    for user_id, posts in desired.items():
+        overlay = overlays.get(_overlay_key(user_id)) or {}
+        for post_id in posts:
+            if post_id in overlay:
+                posts[post_id] = overlay[post_id]
+
+    post_ids = {post_id for posts in desired.values() for post_id in posts}
+    existing = set(
+        Like.objects.filter(user_id__in=list(desired), post_id__in=post_ids)
+        .values_list('user_id', 'post_id')
+    )
+    owners = dict(
+        Post.objects.filter(id__in=post_ids, status='approved').values_list('id', 'user_id')
+    )
+
+    to_add = []
+    to_remove = defaultdict(list)
+    for user_id, posts in desired.items():
+        for post_id, liked in posts.items():
+            if liked and (user_id, post_id) not in existing and post_id in owners:
+                to_add.append((user_id, post_id))
+            elif not liked and (user_id, post_id) in existing:
+                to_remove[post_id].append(user_id)
+
+    with transaction.atomic():
+        if to_add:
+            # Flushes touching the same posts take turns from here, so the re-read below sees
+            # every like another worker inserted since `existing` and only new likes notify
+            list(
+                Post.objects.select_for_update(no_key=True)
+                .filter(id__in=sorted({post_id for _, post_id in to_add})).values_list('id')
+            )
+            inserted = set(
+                Like.objects.filter(
+                    user_id__in={user_id for user_id, _ in to_add},
+                    post_id__in={post_id for _, post_id in to_add},
+                ).values_list('user_id', 'post_id')
+            )
+            to_add = [pair for pair in to_add if pair not in inserted]
+        Like.objects.bulk_create(
+            [Like(user_id=user_id, post_id=post_id) for user_id, post_id in to_add],
+            ignore_conflicts=True,
+            batch_size=500
+        )
+        removed = Q()
+        for post_id, user_ids in to_remove.items():
+            Like.objects.filter(post_id=post_id, user_id__in=user_ids).delete()
+            removed |= Q(post_id=post_id, sender_id__in=user_ids)
+        if to_remove:
+            # An unlike takes back its notification (the post_delete receiver lowers the badge)
+            Notification.objects.filter(removed, notification_type='like').delete()
+        notifications = [
+            Notification(recipient_id=owners[post_id], sender_id=user_id, notification_type='like', post_id=post_id)
+            for user_id, post_id in to_add
+            if owners[post_id] != user_id
+        ]
+        # bulk_create skips post_save, so unread counters are adjusted once per recipient below
+        Notification.objects.bulk_create(notifications, batch_size=500)
+
+    # bulk_create skips the Like receivers that bump post versions
+    for post_id in {post_id for _, post_id in to_add}:
+        bump('post', post_id)
+
+    for recipient_id, count in Counter(n.recipient_id for n in notifications).items():
+        unread_counters.increment(unread_counters.NOTIFICATIONS, recipient_id, count)
+
+    _settle_overlays(desired)
+
+
+def _settle_overlays(flushed):
+    """Drop overlay entries that the database now reflects"""
+    for user_id, posts in flushed.items():
+        key = _overlay_key(user_id)
+        with _overlay_lock(user_id):
+            overlay = cache.get(key)
+            if not overlay:
+                continue
+            remaining = {
+                post_id: liked for post_id, liked in overlay.items()
+                if posts.get(post_id, not liked) != liked
+            }
+            if remaining:
+                cache.set(key, remaining, timeout=_timeout())
+            else:
+                cache.delete(key)
+
+
+def _run():
+    while True:
+        time.sleep(_interval())
+        try:
+            flush()
+        except Exception:
+            # Already logged and re-queued; retry on the next tick
+            pass
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run, name='like-buffer-flusher', daemon=True)
+            _flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        pass
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from post.retention import RETENTION_TARGETS, NDJSONArchive, compact, purge
+
+
+class Command(BaseCommand):
+    help = 'Delete (and optionally archive) expired notifications and post views in keyset batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            choices=sorted(RETENTION_TARGETS) + ['all'],
+            default='all',
+            help='Which table to prune (default: all)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows deleted per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Export deleted rows to gzip-compressed NDJSON files as their batches commit'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Directory for archive files (default: settings.RETENTION_ARCHIVE_DIR)'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches to leave room for live traffic'
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='VACUUM (ANALYZE) each pruned table afterwards (PostgreSQL only)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count expired rows, do not delete anything'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        targets = sorted(RETENTION_TARGETS) if options['target'] == 'all' else [options['target']]
+        archive_dir = options['archive_dir'] or getattr(settings, 'RETENTION_ARCHIVE_DIR', None)
+        if options['archive'] and not archive_dir:
+            raise CommandError('--archive requires --archive-dir or settings.RETENTION_ARCHIVE_DIR')
+
+        for label in targets:
+            model, expiry_q_builder = RETENTION_TARGETS[label]
+            expiry_q = expiry_q_builder()
+            if expiry_q is None:
+                self.stdout.write(f'{label}: retention disabled, skipping')
+                continue
+
+            archive = None
+            if options['archive'] and not options['dry_run']:
+                archive = NDJSONArchive(archive_dir, label)
+
+            try:
+                count = purge(
+                    model,
+                    expiry_q,
+                    batch_size=batch_size,
+                    archive=archive,
+                    dry_run=options['dry_run'],
+                    pause=options['pause'],
+                )
+            finally:
+                if archive is not None:
+                    archive.close()
+
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {count} expired row(s) would be deleted')
+                continue
+
+            message = f'{label}: deleted {count} expired row(s)'
+            if archive is not None and archive.rows:
+                message += f', archived {archive.rows} (through id {archive.last_id}) to {archive.path}'
+            self.stdout.write(self.style.SUCCESS(message))
+
+            if options['vacuum'] and count:
+                if compact(model):
+                    self.stdout.write(f'{label}: vacuumed {model._meta.db_table}')
+                else:
+                    self.stdout.write(f'{label}: --vacuum only applies to PostgreSQL, skipping')
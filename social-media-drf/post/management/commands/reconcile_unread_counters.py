@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from post import unread_counters
+from utils import caches
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild cached unread notification and direct message counters from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only reconcile the given user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users reconciled per GROUP BY query (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if caches.is_per_process():
+            raise CommandError(
+                f'The default cache ({caches.default_backend()}) belongs to this process alone, so the web workers would '
+                'never see the reconciled counters. Set CACHE_URL to a shared cache; without one, counters '
+                'are recounted on read every UNREAD_COUNTER_TIMEOUT seconds.'
+            )
+
+        batch_size = max(1, options['batch_size'])
+        user_ids = options.get('user_ids')
+
+        if user_ids:
+            batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        else:
+            batches = self._batches(batch_size)
+
+        reconciled = 0
+        for batch in batches:
+            for kind in unread_counters.KINDS:
+                counts = unread_counters.grouped_counts_from_db(kind, batch)
+                unread_counters.set_many(kind, counts)
+            reconciled += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled unread counters for {reconciled} user(s).')
+        )
+
+    def _batches(self, batch_size):
+        """Walk user ids in primary key order without loading the whole table"""
+        last_id = 0
+        while True:
+            batch = list(
+                User.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
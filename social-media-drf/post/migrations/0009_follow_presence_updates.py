@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_post_video_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='presence_updates',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,9 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from ckeditor.fields import RichTextField
 from community.models import *
 from interest.models import SubCategory
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.core.files.storage import default_storage
 
@@ -149,6 +149,8 @@ class Follow(models.Model):
         on_delete=models.CASCADE, 
         related_name='followers'
     )
+    # The follower wants online/offline updates for this user (chats/presence.py)
+    presence_updates = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -296,4 +298,100 @@ def delete_post_media(sender, instance, **kwargs):
             if default_storage.exists(file_path):
                 default_storage.delete(file_path)
 
+@receiver(post_save, sender=Notification)
+def increment_unread_notifications(sender, instance, created, **kwargs):
+    """Keep the recipient's cached unread notification counter in step"""
+    if created and not instance.is_read:
+        from .unread_counters import increment, NOTIFICATIONS
+        increment(NOTIFICATIONS, instance.recipient_id)
+
+@receiver(post_delete, sender=Notification)
+def decrement_unread_notifications(sender, instance, **kwargs):
+    """Deleting an unread notification lowers the recipient's badge"""
+    if not instance.is_read:
+        from .unread_counters import decrement, NOTIFICATIONS
+        decrement(NOTIFICATIONS, instance.recipient_id)
+
+@receiver(post_save, sender=Follow)
+def add_follow_graph_edge(sender, instance, created, **kwargs):
+    """Patch the cached follow graph once the follow is committed"""
+    if created:
+        from .follow_graph import follow_graph
+        transaction.on_commit(lambda: follow_graph.on_follow(instance.follower_id, instance.following_id))
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_graph_edge(sender, instance, **kwargs):
+    """Patch the cached follow graph once the unfollow is committed"""
+    from .follow_graph import follow_graph
+    transaction.on_commit(lambda: follow_graph.on_unfollow(instance.follower_id, instance.following_id))
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_suggestions(sender, instance, **kwargs):
+    """A follow or unfollow changes the follower's neighbourhood; re-rank after the graph has it"""
+    from .suggestions import invalidate
+    transaction.on_commit(lambda: invalidate(instance.follower_id))
+
+@receiver(post_save, sender=Follow)
+def increment_follow_stats(sender, instance, created, **kwargs):
+    """Count a new follow on both profiles"""
+    if created:
+        from accounts.profile_stats import adjust
+        adjust(instance.follower_id, following_count=1)
+        adjust(instance.following_id, followers_count=1)
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_stats(sender, instance, **kwargs):
+    """Remove an unfollowed relationship from both profiles"""
+    from accounts.profile_stats import adjust
+    adjust(instance.follower_id, following_count=-1)
+    adjust(instance.following_id, followers_count=-1)
+
+@receiver(post_init, sender=Post)
+def remember_post_status(sender, instance, **kwargs):
+    """Remember the loaded status/owner so saves can tell approvals apart"""
+    instance._stats_status = instance.__dict__.get('status')
+    instance._stats_user_id = instance.__dict__.get('user_id')
+
+@receiver(post_save, sender=Post)
+def update_post_stats(sender, instance, created, **kwargs):
+    """Keep the owner's approved posts_count in step with status changes"""
+    from accounts.profile_stats import adjust
+
+    was_approved = not created and instance._stats_status == 'approved'
+    is_approved = instance.status == 'approved'
+    if was_approved and (not is_approved or instance._stats_user_id != instance.user_id):
+        adjust(instance._stats_user_id, posts_count=-1)
+    if is_approved and (not was_approved or instance._stats_user_id != instance.user_id):
+        adjust(instance.user_id, posts_count=1)
+
+    instance._stats_status = instance.status
+    instance._stats_user_id = instance.user_id
+
+@receiver(post_delete, sender=Post)
+def decrement_post_stats(sender, instance, **kwargs):
+    """Deleting an approved post lowers the owner's posts_count"""
+    if instance.status == 'approved':
+        from accounts.profile_stats import adjust
+        adjust(instance.user_id, posts_count=-1)
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Share)
+@receiver(post_delete, sender=Share)
+def bump_post_version(sender, instance, **kwargs):
+    """Engagement changes don't touch Post.updated_at; invalidate the post's ETag"""
+    from utils.conditional import bump
+    bump('post', instance.post_id)
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_community_post_version(sender, instance, **kwargs):
+    """Community posts_count moves with post changes; invalidate the community page"""
+    if instance.community_id:
+        from utils.conditional import bump
+        bump('community', instance.community_id)
+
 """ End of Post Models """
\ No newline at end of file
@@ -0,0 +1,156 @@
+# post/retention.py
+"""
+Retention rules for the append-only post tables (Notification, PostView).
+
+Both tables grow with every interaction. Old rows are removed in keyset
+batches (the next batch_size expired ids above the last one deleted), so
+each DELETE touches a bounded number of rows however sparse the expired
+ones are, instead of one long statement that locks the whole expired set.
+
+Deleting leaves dead tuples behind; on PostgreSQL, compact() runs VACUUM
+(ANALYZE) on the table afterwards so the space is reused and the planner's
+statistics match the smaller table. Other databases skip it.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, PostView
+
+DEFAULT_NOTIFICATION_RETENTION_DAYS = {
+    'default': 90,
+}
+DEFAULT_POST_VIEW_RETENTION_DAYS = 30
+
+
+def notification_expiry_q(now=None):
+    """
+    Build a filter matching expired notifications.
+
+    settings.NOTIFICATION_RETENTION_DAYS maps notification_type to a TTL in
+    days; 'default' covers every type not listed. A TTL of None keeps that
+    type forever.
+    """
+    now = now or timezone.now()
+    ttls = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', DEFAULT_NOTIFICATION_RETENTION_DAYS)
+    default_ttl = ttls.get('default')
+    typed = {t: days for t, days in ttls.items() if t != 'default'}
+
+    conditions = [
+        Q(notification_type=t, created_at__lt=now - timedelta(days=days))
+        for t, days in typed.items() if days is not None
+    ]
+    if default_ttl is not None:
+        conditions.append(
+            Q(created_at__lt=now - timedelta(days=default_ttl)) & ~Q(notification_type__in=list(typed))
+        )
+
+    if not conditions:
+        return None
+    return reduce(or_, conditions)
+
+
+def post_view_expiry_q(now=None):
+    """Build a filter matching expired post views (None disables pruning)"""
+    now = now or timezone.now()
+    days = getattr(settings, 'POST_VIEW_RETENTION_DAYS', DEFAULT_POST_VIEW_RETENTION_DAYS)
+    if days is None:
+        return None
+    return Q(viewed_at__lt=now - timedelta(days=days))
+
+
+class NDJSONArchive:
+    """Append rows to a gzip-compressed newline-delimited JSON file"""
+
+    def __init__(self, directory, label):
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+        self.directory = directory
+        self.path = os.path.join(directory, f'{label}-{stamp}.ndjson.gz')
+        self._file = None
+        self.rows = 0
+        self.last_id = None  # Highest id written; every row up to it is in the file
+
+    def write(self, rows):
+        for row in rows:
+            if self._file is None:
+                # Opened lazily so runs with nothing to archive leave no empty files
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+            self._file.write(json.dumps(row, cls=DjangoJSONEncoder))
+            self._file.write('\n')
+            self.rows += 1
+            self.last_id = row['id']
+        if self._file is not None:
+            # A sync flush: what is written so far stays readable if the run dies later
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def purge(model, expiry_q, batch_size=1000, archive=None, dry_run=False, pause=0):
+    """
+    Delete rows of `model` matching `expiry_q`, lowest ids first.
+
+    Each batch selects the next `batch_size` expired ids above the last one
+    deleted and deletes exactly those, in one transaction. Returns the number
+    of rows deleted (or that would be deleted on a dry run). With `archive`,
+    a batch's rows are read inside its transaction and written to the archive
+    once the delete has committed, so the archive never holds rows that are
+    still in the table.
+    """
+    if expiry_q is None:
+        return 0
+    if dry_run:
+        return model.objects.filter(expiry_q).count()
+
+    total = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                model.objects.filter(expiry_q, id__gt=last_id)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            batch = model.objects.filter(id__in=ids)
+            rows = list(batch.order_by('id').values()) if archive is not None else None
+            # Going through the ORM keeps post_delete receivers (unread counters) accurate
+            _, deleted = batch.delete()
+        if rows:
+            archive.write(rows)
+        total += deleted.get(model._meta.label, 0)
+        last_id = ids[-1]
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def compact(model):
+    """VACUUM (ANALYZE) the model's table on PostgreSQL; returns whether it ran"""
+    if connection.vendor != 'postgresql':
+        return False
+    # VACUUM can't run in a transaction block; outside atomic() Django autocommits
+    with connection.cursor() as cursor:
+        cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(model._meta.db_table)}')
+    return True
+
+
+RETENTION_TARGETS = {
+    'notifications': (Notification, notification_expiry_q),
+    'post_views': (PostView, post_view_expiry_q),
+}
@@ -153,7 +153,7 @@ class PostSerializer(serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField(source='user.avatar', read_only=True)
 
 
-    likes_count = serializers.IntegerField(source='likes.count', read_only=True)
+    likes_count = serializers.SerializerMethodField()
     comments_count = serializers.IntegerField(source='comments.count', read_only=True)
     shares_count = serializers.IntegerField(source='shares.count', read_only=True)
     comments = serializers.SerializerMethodField()
@@ -319,9 +319,31 @@ class PostSerializer(serializers.ModelSerializer):
             return obj.user == request.user
         return False
     
+    def _like_overlay(self):
+        """The requesting user's unflushed toggle_like states, read once per request"""
+        if '_like_overlay' not in self.context:
+            from .like_buffer import user_overlay
+            request = self.context.get('request')
+            authenticated = request and request.user.is_authenticated
+            self.context['_like_overlay'] = user_overlay(request.user.id) if authenticated else {}
+        return self.context['_like_overlay']
+
+    def get_likes_count(self, obj):
+        count = obj.likes.count()
+        overlay = self._like_overlay()
+        if obj.id in overlay:
+            # Read-your-writes: include the user's own pending like/unlike
+            request = self.context.get('request')
+            stored = Like.objects.filter(user=request.user, post=obj).exists()
+            count += int(overlay[obj.id]) - int(stored)
+        return count
+
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            overlay = self._like_overlay()
+            if obj.id in overlay:
+                return overlay[obj.id]
             return Like.objects.filter(user=request.user, post=obj).exists()
         return False
     
@@ -382,7 +404,7 @@ class FollowSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'follower', 'follower_name', 'follower_avatar', 'follower_about',
             'following', 'following_name', 'following_avatar', 'following_about', 
-            'created_at'
+            'presence_updates', 'created_at'
         ]
         read_only_fields = ['follower', 'created_at']
     
@@ -0,0 +1,145 @@
+# post/suggestions.py
+"""
+Follow suggestions built from the requesting user's neighbourhood.
+
+Candidates come from three sources, each a single grouped query bounded by
+the size of the user's own graph rather than the user table:
+
+- friends of friends: people followed by the people the user follows
+- shared communities: approved members of the user's communities
+- shared interests: profiles that picked the same interest subcategories
+
+Each source contributes a weighted score per candidate, the best ones are
+kept with a bounded top-K heap, and the ranked id list is cached per user.
+Following or unfollowing someone drops the follower's cached list.
+"""
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count
+
+from .follow_graph import follow_graph
+from .models import Follow
+
+User = get_user_model()
+
+# Score contributed per shared connection / community / interest
+FRIEND_OF_FRIEND_WEIGHT = 3
+SHARED_COMMUNITY_WEIGHT = 2
+SHARED_INTEREST_WEIGHT = 1
+
+# Upper bound on rows pulled from each candidate source
+SOURCE_LIMIT = 500
+
+# Number of ranked suggestions kept (and cached) per user
+POOL_SIZE = 200
+
+
+def _cache_key(user_id):
+    return f'follow_suggestions_{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'FOLLOW_SUGGESTIONS_CACHE_TIMEOUT', 900)
+
+
+def invalidate(user_id):
+    """Drop a user's cached suggestions (called when they follow/unfollow)"""
+    cache.delete(_cache_key(user_id))
+
+
+def _friends_of_friends(following_ids, excluded_ids):
+    if not following_ids:
+        return []
+    return (
+        Follow.objects.filter(follower_id__in=following_ids)
+        .exclude(following_id__in=excluded_ids)
+        .values('following_id')
+        .annotate(shared=Count('id'))
+        .order_by('-shared')
+        .values_list('following_id', 'shared')[:SOURCE_LIMIT]
+    )
+
+
+def _shared_communities(user_id, excluded_ids):
+    from community.models import CommunityMember
+
+    community_ids = list(
+        CommunityMember.objects.filter(user_id=user_id, is_approved=True)
+        .values_list('community_id', flat=True)
+    )
+    if not community_ids:
+        return []
+    return (
+        CommunityMember.objects.filter(community_id__in=community_ids, is_approved=True)
+        .exclude(user_id__in=excluded_ids)
+        .values('user_id')
+        .annotate(shared=Count('community_id'))
+        .order_by('-shared')
+        .values_list('user_id', 'shared')[:SOURCE_LIMIT]
+    )
+
+
+def _shared_interests(user_id, excluded_ids):
+    from accounts.models import Profile
+
+    through = Profile.subcategories.through
+    subcategory_ids = list(
+        through.objects.filter(profile__user_id=user_id)
+        .values_list('subcategory_id', flat=True)
+    )
+    if not subcategory_ids:
+        return []
+    return (
+        through.objects.filter(subcategory_id__in=subcategory_ids)
+        .exclude(profile__user_id__in=excluded_ids)
+        .values('profile__user_id')
+        .annotate(shared=Count('subcategory_id'))
+        .order_by('-shared')
+        .values_list('profile__user_id', 'shared')[:SOURCE_LIMIT]
+    )
+
+
+def _newest_users(excluded_ids, limit):
+    """Cold-start fallback for users with an empty neighbourhood"""
+    return list(
+        User.objects.filter(is_active=True)
+        .exclude(id__in=excluded_ids)
+        .order_by('-id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def rank_candidates(user_id, following_ids):
+    """Score every candidate in the neighbourhood and return the top POOL_SIZE ids"""
+    excluded_ids = set(following_ids) | {user_id}
+    scores = Counter()
+
+    for candidate_id, shared in _friends_of_friends(following_ids, excluded_ids):
+        scores[candidate_id] += shared * FRIEND_OF_FRIEND_WEIGHT
+    for candidate_id, shared in _shared_communities(user_id, excluded_ids):
+        scores[candidate_id] += shared * SHARED_COMMUNITY_WEIGHT
+    for candidate_id, shared in _shared_interests(user_id, excluded_ids):
+        scores[candidate_id] += shared * SHARED_INTEREST_WEIGHT
+
+    # Bounded heap: O(n log K) instead of sorting every candidate
+    top = heapq.nlargest(POOL_SIZE, scores.items(), key=lambda item: (item[1], item[0]))
+    ranked = [candidate_id for candidate_id, _ in top]
+
+    if len(ranked) < POOL_SIZE:
+        ranked.extend(_newest_users(excluded_ids | set(ranked), POOL_SIZE - len(ranked)))
+    return ranked
+
+
+def get_suggested_user_ids(user_id):
+    """Return the ranked suggestion ids for a user, computing them on a cache miss"""
+    key = _cache_key(user_id)
+    ranked = cache.get(key)
+    if ranked is None:
+        following_ids = list(follow_graph.following(user_id))
+        ranked = rank_candidates(user_id, following_ids)
+        cache.set(key, ranked, timeout=_timeout())
+    return ranked
@@ -1,5 +1,379 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from array import array
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
+from community.models import Community, CommunityMember
+from utils import conditional
+from utils.testing import client_for, make_user
 
+from . import checks, like_buffer, retention, suggestions, unread_counters
+from .follow_graph import TYPECODE, FollowGraph, _Node, follow_graph
+from .models import Comment, Follow, Like, Notification, Post, Share
+
+
+class FollowGraphTests(SimpleTestCase):
+    def load(self, following, followers=()):
+        return _Node(array(TYPECODE, following), array(TYPECODE, followers))
+
+    def test_load_overtaken_by_a_write_is_not_cached(self):
+        graph = FollowGraph(shared=False)
+
+        def stale_load(user_id):
+            # The follow commits and patches the graph while the old rows are being read
+            graph.on_follow(1, 2)
+            return self.load([])
+
+        with mock.patch.object(FollowGraph, '_load_from_db', side_effect=stale_load):
+            self.assertFalse(graph.is_following(1, 2))
+        with mock.patch.object(FollowGraph, '_load_from_db', return_value=self.load([2])) as load:
+            self.assertTrue(graph.is_following(1, 2))
+            self.assertTrue(graph.is_following(1, 2))
+        self.assertEqual(load.call_count, 1)
+
+    def test_writes_patch_cached_lists(self):
+        graph = FollowGraph(shared=False)
+        with mock.patch.object(FollowGraph, '_load_from_db', side_effect=lambda user_id: self.load([])):
+            graph.following(1)
+            graph.followers(2)
+            graph.on_follow(1, 2)
+            self.assertTrue(graph.is_following(1, 2))
+            self.assertEqual(list(graph.followers(2)), [1])
+            graph.on_unfollow(1, 2)
+            self.assertFalse(graph.is_following(1, 2))
+
+    def test_local_copy_is_reloaded_after_its_ttl(self):
+        graph = FollowGraph(shared=False, local_ttl=0.1)
+        with mock.patch.object(FollowGraph, '_load_from_db', side_effect=[self.load([]), self.load([2])]):
+            self.assertFalse(graph.is_following(1, 2))
+            self.assertFalse(graph.is_following(1, 2))  # another worker followed; still within the TTL
+            time.sleep(0.15)
+            self.assertTrue(graph.is_following(1, 2))
+
+    @override_settings(
+        CHANNEL_LAYERS={'default': {'BACKEND': 'utils.local_channel_layer.LocalChannelLayer'}},
+        FOLLOW_GRAPH_SHARED=False,
+    )
+    def test_local_channels_require_a_shared_graph(self):
+        self.assertEqual([error.id for error in checks.follow_graph_shared_check(None)], ['post.E001'])
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def notify(self):
+        return Notification.objects.create(recipient=self.alice, sender=self.bob, notification_type='follow')
+
+    @override_settings(UNREAD_COUNTER_TIMEOUT=0.2)
+    def test_drifted_counter_is_recounted_once_it_expires(self):
+        self.notify()
+        self.assertEqual(unread_counters.get_count(unread_counters.NOTIFICATIONS, self.alice.id), 1)
+        unread_counters.increment(unread_counters.NOTIFICATIONS, self.alice.id, 5)  # a lost write
+        self.assertEqual(unread_counters.get_count(unread_counters.NOTIFICATIONS, self.alice.id), 6)
+        time.sleep(0.3)
+        self.assertEqual(unread_counters.get_count(unread_counters.NOTIFICATIONS, self.alice.id), 1)
+
+    def test_reconcile_refuses_a_per_process_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('reconcile_unread_counters')
+
+
+@override_settings(LIKE_FLUSH_INTERVAL=0)
+class ToggleLikeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.post = Post.objects.create(user=self.bob, title='hello', post_type='text')
+
+    def toggle(self, user, post, **data):
+        return client_for(user).post(f'/api/posts/{post.id}/toggle_like/', data, format='json')
+
+    def test_toggle_writes_through_and_flips(self):
+        response = self.toggle(self.alice, self.post)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'post_id': self.post.id, 'liked': True, 'likes_count': 1})
+        self.assertTrue(Like.objects.filter(user=self.alice, post=self.post).exists())
+        self.assertEqual(like_buffer.user_overlay(self.alice.id), {})
+
+        self.assertFalse(self.toggle(self.alice, self.post).json()['data']['liked'])
+        self.assertFalse(Like.objects.filter(user=self.alice, post=self.post).exists())
+
+    def test_failed_inline_flush_still_accepts_the_toggle(self):
+        with mock.patch.object(like_buffer, '_write', side_effect=RuntimeError('database down')), \
+                mock.patch.object(like_buffer, '_ensure_flusher'), \
+                self.assertLogs('post.like_buffer', 'ERROR'):
+            response = self.toggle(self.alice, self.post, liked=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(like_buffer.user_overlay(self.alice.id), {self.post.id: True})
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertTrue(Like.objects.filter(user=self.alice, post=self.post).exists())
+
+    def test_unlike_takes_back_the_notification(self):
+        self.toggle(self.alice, self.post)
+        self.assertEqual(Notification.objects.filter(recipient=self.bob, notification_type='like').count(), 1)
+        self.assertEqual(unread_counters.get_count(unread_counters.NOTIFICATIONS, self.bob.id), 1)
+        self.toggle(self.alice, self.post)
+        self.assertFalse(Notification.objects.filter(recipient=self.bob, notification_type='like').exists())
+        self.assertEqual(unread_counters.get_count(unread_counters.NOTIFICATIONS, self.bob.id), 0)
+
+    def test_like_another_worker_inserted_first_is_not_notified_again(self):
+        real_atomic, raced = transaction.atomic, []
+
+        def atomic(*args, **kwargs):
+            # The other worker's flush lands between this flush's read and its transaction
+            if not raced:
+                raced.append(True)
+                Like.objects.create(user=self.alice, post=self.post)
+                Notification.objects.create(
+                    recipient=self.bob, sender=self.alice, notification_type='like', post=self.post
+                )
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch.object(transaction, 'atomic', side_effect=atomic):
+            like_buffer._write({(self.alice.id, self.post.id): True})
+        self.assertEqual(Like.objects.filter(user=self.alice, post=self.post).count(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.bob, notification_type='like').count(), 1)
+
+    def test_private_community_posts_need_membership(self):
+        community = Community.objects.create(
+            name='secret', title='Secret', visibility='private', created_by=self.bob
+        )
+        post = Post.objects.create(user=self.bob, community=community, title='members only', post_type='text')
+        self.assertEqual(self.toggle(self.alice, post).status_code, 404)
+        CommunityMember.objects.create(user=self.alice, community=community, is_approved=True)
+        self.assertEqual(self.toggle(self.alice, post).status_code, 200)
+
+
+
+class PostStateTests(TestCase):
+    url = '/api/posts/state/'
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.clear()
+        self.alice = make_user('alice')
+        self.authors = [make_user(f'author{i}') for i in range(3)]
+        self.communities = [
+            Community.objects.create(name=f'c{i}', title=f'C{i}', visibility='public', created_by=self.authors[0])
+            for i in range(2)
+        ]
+        CommunityMember.objects.create(user=self.alice, community=self.communities[0], is_approved=True)
+        pending = CommunityMember.objects.create(user=self.alice, community=self.communities[1])
+        CommunityMember.objects.filter(id=pending.id).update(is_approved=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.alice, following=self.authors[1])
+        self.posts = []
+        for i in range(12):
+            post = Post.objects.create(
+                user=self.authors[i % 3], community=self.communities[i % 2] if i % 4 else None,
+                title=f'post {i}', post_type='text', status='approved',
+            )
+            Like.objects.create(user=self.authors[0], post=post)
+            if i % 2:
+                Like.objects.create(user=self.alice, post=post)
+                Comment.objects.create(user=self.authors[2], post=post, content='nice')
+            if i % 3 == 0:
+                Share.objects.create(user=self.alice, post=post)
+            self.posts.append(post)
+        self.client = client_for(self.alice)
+
+    def state(self, posts):
+        response = self.client.get(self.url, {'ids': ','.join(str(post.id) for post in posts)})
+        self.assertEqual(response.status_code, 200)
+        return {row['id']: row for row in response.json()['data']}
+
+    def test_query_count_does_not_grow_with_the_posts(self):
+        self.state(self.posts[:1])  # loads alice's follow graph node
+        # posts, three counters, own likes, own shares, memberships
+        with self.assertNumQueries(7):
+            self.state(self.posts[:3])
+        with self.assertNumQueries(7):
+            states = self.state(self.posts)
+        self.assertEqual(len(states), 12)
+
+    def test_state_of_each_post(self):
+        states = self.state(self.posts)
+        for i, post in enumerate(self.posts):
+            community_membership = None
+            if i % 4:
+                community_membership = 'pending' if i % 2 else 'member'
+            self.assertEqual(states[post.id], {
+                'id': post.id,
+                'is_liked': bool(i % 2),
+                'is_shared': i % 3 == 0,
+                'is_author_followed': i % 3 == 1,
+                'community_membership': community_membership,
+                'likes_count': 1 + i % 2,
+                'comments_count': i % 2,
+                'shares_count': int(i % 3 == 0),
+            })
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_user('alice')
+        self.post = Post.objects.create(user=self.alice, title='hello', post_type='text')
+        self.url = f'/api/posts/{self.post.id}/'
+
+    def get(self, **headers):
+        return client_for(self.alice).get(self.url, **headers)
+
+    def test_etag_revalidates(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        conditional.bump('post', self.post.id)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_is_checked_before_if_modified_since(self):
+        etag = self.get()['ETag']
+        conditional.bump('post', self.post.id)
+        response = self.get(HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_is_sent_once_its_second_has_passed(self):
+        clock = mock.Mock()
+        clock.time.return_value = int(time.time()) + 10
+        with mock.patch.object(conditional, 'time', clock):
+            conditional.bump('post', self.post.id)  # changed in the current second
+            response = self.get()
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+        clock.time.return_value += 1
+        with mock.patch.object(conditional, 'time', clock):
+            response = self.get()
+            self.assertIn('Last-Modified', response)
+            self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS={'default': 10, 'follow': 1, 'comment': None})
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def notify(self, notification_type, days_old):
+        notification = Notification.objects.create(
+            recipient=self.alice, sender=self.bob, notification_type=notification_type
+        )
+        Notification.objects.filter(id=notification.id).update(created_at=timezone.now() - timedelta(days=days_old))
+        return notification.id
+
+    def purge(self, **options):
+        return retention.purge(Notification, retention.notification_expiry_q(), **options)
+
+    def test_each_type_expires_after_its_own_ttl(self):
+        expired = {self.notify('follow', 2), self.notify('like', 11)}
+        kept = {self.notify('follow', 0), self.notify('like', 5), self.notify('comment', 400)}
+        self.assertEqual(self.purge(), 2)
+        self.assertEqual(set(Notification.objects.values_list('id', flat=True)), kept)
+        self.assertFalse(Notification.objects.filter(id__in=expired).exists())
+
+    def test_deletes_in_keyset_batches(self):
+        expired = set()
+        for i in range(5):
+            expired.add(self.notify('like', 20))
+            self.notify('like', 0)  # live rows between expired ones don't shrink a batch
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.purge(batch_size=2), 5)
+        deletes = [q for q in queries.captured_queries if q['sql'].startswith('DELETE FROM "post_notification"')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(Notification.objects.count(), 5)
+        self.assertFalse(Notification.objects.filter(id__in=expired).exists())
+
+    def test_dry_run_only_counts(self):
+        self.notify('like', 20)
+        self.notify('follow', 3)
+        self.assertEqual(self.purge(dry_run=True), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_archive_holds_exactly_the_deleted_rows(self):
+        expired = sorted(self.notify('like', 20) for i in range(3))
+        self.notify('like', 0)
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                'apply_retention', '--target', 'notifications', '--batch-size', '2',
+                '--archive', '--archive-dir', directory, stdout=io.StringIO(),
+            )
+            [name] = os.listdir(directory)
+            with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as archived:
+                rows = [json.loads(line) for line in archived]
+        self.assertEqual([row['id'] for row in rows], expired)
+        self.assertEqual({row['notification_type'] for row in rows}, {'like'})
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failed_batch_is_not_archived(self):
+        expired = self.notify('like', 20)
+        archive = mock.Mock()
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=RuntimeError('lock timeout')):
+            with self.assertRaises(RuntimeError):
+                self.purge(archive=archive)
+        archive.write.assert_not_called()
+        self.assertTrue(Notification.objects.filter(id=expired).exists())
+
+
+class SuggestionTests(TestCase):
+    url = '/api/follows/suggestions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice')
+        cls.bob = make_user('bob')
+        cls.carol = make_user('carol')
+        cls.others = [make_user(f'user{i}') for i in range(24)]
+        Follow.objects.create(follower=cls.alice, following=cls.bob)
+        Follow.objects.create(follower=cls.bob, following=cls.carol)
+        Follow.objects.create(follower=cls.bob, following=cls.alice)
+
+    def setUp(self):
+        # The graph and rankings are reloaded from this test's rows
+        cache.clear()
+        follow_graph.clear()
+        self.client = client_for(self.alice)
+
+    def suggested_ids(self, **params):
+        return [user['id'] for user in self.client.get(self.url, params).data['results']['data']]
+
+    def test_followed_users_and_self_are_excluded(self):
+        ids = suggestions.get_suggested_user_ids(self.alice.id)
+        # Friend of a friend first, then the newest users as the cold-start fill
+        self.assertEqual(ids[0], self.carol.id)
+        self.assertEqual(set(ids), {self.carol.id, *(user.id for user in self.others)})
+
+    def test_ranking_is_cached_until_the_user_follows_someone(self):
+        ids = suggestions.get_suggested_user_ids(self.alice.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(suggestions.get_suggested_user_ids(self.alice.id), ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.alice, following=self.carol)
+        self.assertNotIn(self.carol.id, suggestions.get_suggested_user_ids(self.alice.id))
+
+    def test_pages_walk_the_ranked_pool(self):
+        response = self.client.get(self.url, {'limit': 10})
+        self.assertEqual(response.data['count'], 25)
+        self.assertIsNotNone(response.data['next'])
+        pages = [self.suggested_ids(limit=10, page=page) for page in (1, 2, 3)]
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), suggestions.get_suggested_user_ids(self.alice.id))
+
+    def test_limit_is_capped(self):
+        response = self.client.get(self.url, {'limit': 1000})
+        self.assertEqual(len(response.data['results']['data']), 25)
+        self.assertIsNone(response.data['next'])
@@ -0,0 +1,137 @@
+# post/unread_counters.py
+"""
+Per-user unread counters for notification and direct message badges.
+
+Counters live in the Django cache and fall back to a COUNT query on a miss.
+Writers only adjust counters that are already cached; a missing key is
+simply recomputed from the database on the next read, so a lost increment
+can never leave a badge permanently wrong. Direct messages are recounted
+from the per-conversation unread columns of chats.DirectConversation,
+which follow the read watermarks (chats/read_state.py).
+
+Increments and decrements keep a counter's expiry, so every cached value
+is recounted in-process at least every UNREAD_COUNTER_TIMEOUT seconds.
+Any drift left behind by concurrent writers lasts no longer than that.
+The reconcile_unread_counters management command rewrites cached values
+at once. It needs a shared cache (CACHE_URL), because a per-process cache
+would only fix the command's own copy.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+NOTIFICATIONS = 'notifications'
+MESSAGES = 'messages'
+KINDS = (NOTIFICATIONS, MESSAGES)
+
+
+def _timeout():
+    return getattr(settings, 'UNREAD_COUNTER_TIMEOUT', 600)
+
+
+def _key(kind, user_id):
+    return f'unread_{kind}_{user_id}'
+
+
+def _count_from_db(kind, user_id):
+    """Count unread rows for a single user straight from the database"""
+    if kind == NOTIFICATIONS:
+        from post.models import Notification
+        return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    if kind == MESSAGES:
+        return grouped_counts_from_db(MESSAGES, [user_id])[user_id]
+    raise ValueError(f"Unknown unread counter kind: {kind}")
+
+
+def grouped_counts_from_db(kind, user_ids):
+    """Return {user_id: unread_count} for many users in a single GROUP BY query"""
+    from django.db.models import Count, Sum
+
+    counts = {user_id: 0 for user_id in user_ids}
+    if kind == NOTIFICATIONS:
+        from post.models import Notification
+        rows = (
+            Notification.objects.filter(recipient_id__in=user_ids, is_read=False)
+            .values('recipient_id')
+            .annotate(count=Count('id'))
+            .values_list('recipient_id', 'count')
+        )
+        counts.update(dict(rows))
+    elif kind == MESSAGES:
+        from chats.models import DirectConversation
+        # Each user is the low side of some pairs and the high side of others
+        for side in ('low', 'high'):
+            rows = (
+                DirectConversation.objects.filter(**{f'user_{side}_id__in': user_ids})
+                .values(f'user_{side}_id')
+                .annotate(count=Sum(f'unread_{side}'))
+                .values_list(f'user_{side}_id', 'count')
+            )
+            for user_id, count in rows:
+                counts[user_id] += max(0, count or 0)
+    else:
+        raise ValueError(f"Unknown unread counter kind: {kind}")
+    return counts
+
+
+def get_count(kind, user_id):
+    """Get the unread count for a user, loading it from the database on a cache miss"""
+    key = _key(kind, user_id)
+    value = cache.get(key)
+    if value is None:
+        value = _count_from_db(kind, user_id)
+        cache.set(key, value, timeout=_timeout())
+    return value
+
+
+def get_counts(user_id):
+    """Get every unread counter for a user with one cache round trip"""
+    keys = {kind: _key(kind, user_id) for kind in KINDS}
+    cached = cache.get_many(list(keys.values()))
+
+    counts = {}
+    missing = {}
+    for kind, key in keys.items():
+        if key in cached:
+            counts[kind] = cached[key]
+        else:
+            counts[kind] = _count_from_db(kind, user_id)
+            missing[key] = counts[kind]
+
+    if missing:
+        cache.set_many(missing, timeout=_timeout())
+    return counts
+
+
+def increment(kind, user_id, delta=1):
+    """Add to a cached counter. A counter that is not cached is left alone."""
+    if not user_id or not delta:
+        return
+    try:
+        cache.incr(_key(kind, user_id), delta)
+    except ValueError:
+        # Key not cached - the next read recomputes it from the database
+        pass
+
+
+def decrement(kind, user_id, delta=1):
+    """Subtract from a cached counter, dropping it if it would go negative"""
+    if not user_id or not delta:
+        return
+    key = _key(kind, user_id)
+    try:
+        value = cache.decr(key, delta)
+    except ValueError:
+        return
+    if value < 0:
+        cache.delete(key)
+
+
+def reset(kind, user_id, value=0):
+    """Overwrite a counter with a known value (e.g. after mark-all-read)"""
+    cache.set(_key(kind, user_id), value, timeout=_timeout())
+
+
+def set_many(kind, counts):
+    """Overwrite counters for many users at once ({user_id: count})"""
+    if counts:
+        cache.set_many({_key(kind, user_id): count for user_id, count in counts.items()}, timeout=_timeout())
@@ -4,7 +4,7 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.views import APIView
 from django.db.models import Q, Count, Exists, OuterRef, Prefetch, Case, When, IntegerField, F
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
@@ -16,6 +16,10 @@ from community.models import *
 from community.serializers import *
 import random
 from .moderation import moderate_post
+from . import unread_counters
+from .follow_graph import follow_graph
+from accounts import profile_stats
+from utils.conditional import conditional, make_etag, latest, versions
 from rest_framework import serializers 
 
 User = get_user_model()
@@ -153,13 +157,15 @@ class PostViewSet(viewsets.ModelViewSet):
             elif community.visibility == 'private':
                 post = serializer.save(user=self.request.user, status='pending')
             else:
-                # Public/restricted: post is approved immediately
-                post = serializer.save(user=self.request.user, status='approved')
-                # Refresh post from database to ensure status is correct
-                post.refresh_from_db()
-                # Update posts_count for approved posts (use community from validated_data to ensure it's set)
-                if community and post.status == 'approved':
-                    Community.objects.filter(pk=community.pk).update(posts_count=F('posts_count') + 1)
+                # Public/restricted: post is approved immediately.
+                # Saved together with the community and profile counters.
+                with transaction.atomic():
+                    post = serializer.save(user=self.request.user, status='approved')
+                    # Refresh post from database to ensure status is correct
+                    post.refresh_from_db()
+                    # Update posts_count for approved posts (use community from validated_data to ensure it's set)
+                    if community and post.status == 'approved':
+                        Community.objects.filter(pk=community.pk).update(posts_count=F('posts_count') + 1)
         else:
             # Personal post - apply moderation
             if not is_approved:
@@ -270,6 +276,32 @@ class PostViewSet(viewsets.ModelViewSet):
             "data": serializer.data
         })
 
+    def _retrieve_validators(self, request, *args, **kwargs):
+        """ETag/Last-Modified for a post without serializing it"""
+        user = request.user
+        posts = Post.objects.filter(pk=kwargs.get('pk'))
+        if not (hasattr(user, 'role') and user.role == 'admin'):
+            posts = posts.filter(Q(status='approved') | Q(user=user))
+        row = posts.values(
+            'updated_at', 'status', 'shared_from_id', 'shared_from__updated_at', 'user__profile__updated_at'
+        ).first()
+        if row is None:
+            return None
+
+        # Likes, comments and shares bump the post's content version
+        version_keys = [('post', kwargs.get('pk'))]
+        if row['shared_from_id']:
+            version_keys.append(('post', row['shared_from_id']))
+        post_versions = versions(*version_keys)
+
+        from .like_buffer import user_overlay
+        pending_like = user_overlay(user.id).get(int(kwargs.get('pk')))
+
+        etag = make_etag('post', kwargs.get('pk'), user.id, row, post_versions, pending_like)
+        last_modified = latest(row['updated_at'], row['shared_from__updated_at'], row['user__profile__updated_at'], *post_versions)
+        return etag, last_modified
+
+    @conditional(_retrieve_validators)
     def retrieve(self, request, *args, **kwargs):
         """Get a single post by ID"""
         instance = self.get_object()
@@ -297,13 +329,15 @@ class PostViewSet(viewsets.ModelViewSet):
                 "message": f"Post is already {old_status}. Only rejected or pending posts can be approved."
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Approve the post (bypass moderation)
-        post.status = 'approved'
-        post.save()
-        
-        # Update posts_count if post has a community
-        if old_community and old_status != 'approved':
-            Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') + 1)
+        # Approve the post (bypass moderation); the profile posts_count
+        # receiver runs inside the same transaction
+        with transaction.atomic():
+            post.status = 'approved'
+            post.save()
+            
+            # Update posts_count if post has a community
+            if old_community and old_status != 'approved':
+                Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') + 1)
         
         serializer = self.get_serializer(post)
         return Response({
@@ -343,18 +377,19 @@ class PostViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Determine final status based on community settings
-        if post.community:
-            if post.community.visibility == 'private':
-                post.status = 'pending'
+        with transaction.atomic():
+            if post.community:
+                if post.community.visibility == 'private':
+                    post.status = 'pending'
+                else:
+                    post.status = 'approved'
+                    # Update posts_count for approved posts
+                    Community.objects.filter(pk=post.community.pk).update(posts_count=F('posts_count') + 1)
             else:
+                # Personal post - approve immediately
                 post.status = 'approved'
-                # Update posts_count for approved posts
-                Community.objects.filter(pk=post.community.pk).update(posts_count=F('posts_count') + 1)
-        else:
-            # Personal post - approve immediately
-            post.status = 'approved'
-        
-        post.save()
+            
+            post.save()
         
         serializer = self.get_serializer(post)
         return Response({
@@ -363,6 +398,155 @@ class PostViewSet(viewsets.ModelViewSet):
             "data": serializer.data
         })
 
+    @action(detail=False, methods=['get'], url_path='state')
+    def state(self, request):
+        """
+        Per-user engagement state and counters for up to 200 posts:
+        /posts/state/?ids=1,2,3. Lets clients reuse cached post bodies and
+        only fetch this overlay. Runs a fixed number of queries.
+        """
+        MAX_STATE_IDS = 200
+
+        raw_ids = request.query_params.get('ids', '')
+        try:
+            post_ids = list(dict.fromkeys(int(value) for value in raw_ids.split(',') if value.strip()))
+        except ValueError:
+            return Response({
+                "success": False,
+                "message": "ids must be a comma-separated list of post ids"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not post_ids:
+            return Response({
+                "success": False,
+                "message": "Please provide post ids using ?ids=1,2,3"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(post_ids) > MAX_STATE_IDS:
+            return Response({
+                "success": False,
+                "message": f"At most {MAX_STATE_IDS} post ids can be requested at once"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        visible = Post.objects.filter(id__in=post_ids)
+        if not (hasattr(user, 'role') and user.role == 'admin'):
+            visible = visible.filter(Q(status='approved') | Q(user=user))
+        posts = {
+            row['id']: row
+            for row in visible.values('id', 'user_id', 'community_id')
+        }
+        found_ids = list(posts)
+
+        def grouped_counts(model):
+            return dict(
+                model.objects.filter(post_id__in=found_ids)
+                .values('post_id')
+                .annotate(count=Count('id'))
+                .values_list('post_id', 'count')
+            )
+
+        likes_counts = grouped_counts(Like)
+        comments_counts = grouped_counts(Comment)
+        shares_counts = grouped_counts(Share)
+
+        liked_ids = set(
+            Like.objects.filter(user=user, post_id__in=found_ids).values_list('post_id', flat=True)
+        )
+        shared_ids = set(
+            Share.objects.filter(user=user, post_id__in=found_ids).values_list('post_id', flat=True)
+        )
+
+        # Unflushed toggle_like writes by this user (read-your-writes)
+        from .like_buffer import user_overlay
+        for post_id, liked in user_overlay(user.id).items():
+            if post_id not in posts or (post_id in liked_ids) == liked:
+                continue
+            if liked:
+                liked_ids.add(post_id)
+                likes_counts[post_id] = likes_counts.get(post_id, 0) + 1
+            else:
+                liked_ids.discard(post_id)
+                likes_counts[post_id] = likes_counts.get(post_id, 0) - 1
+
+        followed_ids = follow_graph.filter_following(user.id, {row['user_id'] for row in posts.values()})
+
+        community_ids = {row['community_id'] for row in posts.values() if row['community_id']}
+        memberships = dict(
+            CommunityMember.objects.filter(user=user, community_id__in=community_ids)
+            .values_list('community_id', 'is_approved')
+        ) if community_ids else {}
+
+        data = []
+        for post_id in post_ids:
+            row = posts.get(post_id)
+            if row is None:
+                continue
+            community_id = row['community_id']
+            if community_id in memberships:
+                membership = 'member' if memberships[community_id] else 'pending'
+            else:
+                membership = None
+            data.append({
+                'id': post_id,
+                'is_liked': post_id in liked_ids,
+                'is_shared': post_id in shared_ids,
+                'is_author_followed': row['user_id'] in followed_ids,
+                'community_membership': membership,
+                'likes_count': likes_counts.get(post_id, 0),
+                'comments_count': comments_counts.get(post_id, 0),
+                'shares_count': shares_counts.get(post_id, 0),
+            })
+
+        return Response({
+            "success": True,
+            "message": "Post state retrieved successfully",
+            "data": data
+        })
+
+    @action(detail=True, methods=['post'])
+    def toggle_like(self, request, pk=None):
+        """
+        Like or unlike a post. Send {"liked": true|false} to set the state
+        (idempotent) or no body to flip it. Writes are buffered and flushed
+        in batches; the response already reflects the new state.
+        """
+        from . import like_buffer
+
+        # Posts in a private community can only be liked by its approved members
+        post = Post.objects.filter(pk=pk, status='approved').filter(
+            ~Q(community__visibility='private') |
+            Exists(CommunityMember.objects.filter(
+                community_id=OuterRef('community_id'), user=request.user, is_approved=True
+            ))
+        ).only('id', 'user_id').first()
+        if post is None:
+            return Response({
+                "success": False,
+                "message": "Post not found or not approved"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        liked = request.data.get('liked')
+        if liked is not None:
+            liked = str(liked).lower() in ('true', '1')
+
+        liked = like_buffer.toggle(request.user.id, post.id, liked)
+
+        # Count from the database, corrected by this user's unflushed toggle
+        likes_count = post.likes.count()
+        if Like.objects.filter(user=request.user, post=post).exists() != liked:
+            likes_count += 1 if liked else -1
+
+        return Response({
+            "success": True,
+            "message": "Post liked successfully" if liked else "Post unliked successfully",
+            "data": {
+                "post_id": post.id,
+                "liked": liked,
+                "likes_count": likes_count
+            }
+        }, status=status.HTTP_200_OK)
+
     def perform_destroy(self, instance):
         """Update community posts_count when post is deleted and handle shared posts"""
         community = instance.community
@@ -380,12 +564,13 @@ class PostViewSet(viewsets.ModelViewSet):
                 logger = logging.getLogger(__name__)
                 logger.error(f"Error deleting Share record for shared post {instance.id}: {e}")
         
-        super().perform_destroy(instance)
-        
-        # Update posts_count if post was approved and had a community
-        # Only count non-shared posts for community posts_count
-        if was_approved and community and not is_shared_post:
-            Community.objects.filter(pk=community.pk).update(posts_count=F('posts_count') - 1)
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            
+            # Update posts_count if post was approved and had a community
+            # Only count non-shared posts for community posts_count
+            if was_approved and community and not is_shared_post:
+                Community.objects.filter(pk=community.pk).update(posts_count=F('posts_count') - 1)
     
     def destroy(self, request, *args, **kwargs):
         """Delete post - admin can delete any post, users can only delete their own"""
@@ -439,31 +624,32 @@ class PostViewSet(viewsets.ModelViewSet):
                 # Personal post - approve immediately
                 serializer.validated_data['status'] = 'approved'
         
-        # Save the post
-        super().perform_update(serializer)
-        
-        # Get the updated instance
-        updated_instance = serializer.instance
-        final_status = updated_instance.status
-        new_community = updated_instance.community
-        
-        # Handle posts_count updates when status changes
-        if old_community and old_status != final_status:
-            # Post was approved, now it's not
-            if old_status == 'approved' and final_status != 'approved':
-                Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') - 1)
-            # Post was not approved, now it is
-            elif old_status != 'approved' and new_status == 'approved':
-                Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') + 1)
-        
-        # Handle community change
-        if old_community != new_community:
-            # If old community existed and post was approved, decrease count
-            if old_community and old_status == 'approved':
-                Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') - 1)
-            # If new community exists and post is approved, increase count
-            if new_community and new_status == 'approved':
-                Community.objects.filter(pk=new_community.pk).update(posts_count=F('posts_count') + 1)
+        # Save the post and adjust counters atomically
+        with transaction.atomic():
+            super().perform_update(serializer)
+        
+            # Get the updated instance
+            updated_instance = serializer.instance
+            final_status = updated_instance.status
+            new_community = updated_instance.community
+        
+            # Handle posts_count updates when status changes
+            if old_community and old_status != final_status:
+                # Post was approved, now it's not
+                if old_status == 'approved' and final_status != 'approved':
+                    Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') - 1)
+                # Post was not approved, now it is
+                elif old_status != 'approved' and new_status == 'approved':
+                    Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') + 1)
+        
+            # Handle community change
+            if old_community != new_community:
+                # If old community existed and post was approved, decrease count
+                if old_community and old_status == 'approved':
+                    Community.objects.filter(pk=old_community.pk).update(posts_count=F('posts_count') - 1)
+                # If new community exists and post is approved, increase count
+                if new_community and new_status == 'approved':
+                    Community.objects.filter(pk=new_community.pk).update(posts_count=F('posts_count') + 1)
     
     def _calculate_post_score(self, post, user, time_decay_hours=24, user_interest_names=None, user_subcategories=None):
         """
@@ -485,7 +671,7 @@ class PostViewSet(viewsets.ModelViewSet):
         personalization = 1.0
         
         # Boost if from followed user
-        if Follow.objects.filter(follower=user, following=post.user).exists():
+        if follow_graph.is_following(user.id, post.user_id):
             personalization *= 2.0
         
         # Boost if from joined community
@@ -592,7 +778,7 @@ class PostViewSet(viewsets.ModelViewSet):
         fresh_date = timezone.now() - timedelta(hours=24)
         
         # Get user's social graph (convert to list to avoid subquery issues)
-        following_ids = list(Follow.objects.filter(follower=user).values_list('following_id', flat=True))
+        following_ids = list(follow_graph.following(user.id))
         joined_community_ids = list(CommunityMember.objects.filter(
             user=user, is_approved=True
         ).values_list('community_id', flat=True))
@@ -1534,15 +1720,16 @@ class ShareViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_200_OK)
             else:
                 # Share record exists but post doesn't - create the post
-                shared_post = Post.objects.create(
-                    user=user,
-                    title='Shared Post',  # Simple title - not displayed in UI, original post title is shown instead
-                    post_type='text',
-                    content='',
-                    shared_from=original_post,
-                    status='approved',
-                    community=original_post.community,
-                )
+                with transaction.atomic():
+                    shared_post = Post.objects.create(
+                        user=user,
+                        title='Shared Post',  # Simple title - not displayed in UI, original post title is shown instead
+                        post_type='text',
+                        content='',
+                        shared_from=original_post,
+                        status='approved',
+                        community=original_post.community,
+                    )
                 post_serializer = PostSerializer(shared_post, context={'request': request})
                 return Response({
                     "success": True,
@@ -1555,15 +1742,16 @@ class ShareViewSet(viewsets.ModelViewSet):
         
         # Create a new Post that references the original post (not the intermediate shared post)
         try:
-            shared_post = Post.objects.create(
-                user=user,
-                title='Shared Post',  # Simple title - not displayed in UI, original post title is shown instead
-                post_type='text',  # Shared posts are always text type
-                content='',  # Empty content, original post content is shown via original_post
-                shared_from=original_post,  # Always reference the original post, not the intermediate shared post
-                status='approved',  # Shared posts are auto-approved
-                community=original_post.community,  # Share in the same community if applicable
-            )
+            with transaction.atomic():
+                shared_post = Post.objects.create(
+                    user=user,
+                    title='Shared Post',  # Simple title - not displayed in UI, original post title is shown instead
+                    post_type='text',  # Shared posts are always text type
+                    content='',  # Empty content, original post content is shown via original_post
+                    shared_from=original_post,  # Always reference the original post, not the intermediate shared post
+                    status='approved',  # Shared posts are auto-approved
+                    community=original_post.community,  # Share in the same community if applicable
+                )
         except Exception as e:
             # If post creation fails, delete the share record
             share.delete()
@@ -1763,7 +1951,7 @@ class FollowViewSet(viewsets.ModelViewSet):
         ).first()
         
         if follow:
-            # Unfollow
+            # Unfollow (delete() is atomic, so the profile counter receivers commit with it)
             follow.delete()
             return Response({
                 "success": True,
@@ -1771,23 +1959,56 @@ class FollowViewSet(viewsets.ModelViewSet):
                 "data": {'status': 'unfollowed', 'following': False}
             }, status=status.HTTP_200_OK)
         else:
-            # Follow
-            Follow.objects.create(
-                follower=request.user,
-                following=following_user
-            )
-            # Create notification
-            Notification.objects.create(
-                recipient=following_user,
-                sender=request.user,
-                notification_type='follow'
-            )
+            # Follow (profile counters are updated in the same transaction)
+            with transaction.atomic():
+                Follow.objects.create(
+                    follower=request.user,
+                    following=following_user
+                )
+                # Create notification
+                Notification.objects.create(
+                    recipient=following_user,
+                    sender=request.user,
+                    notification_type='follow'
+                )
             return Response({
                 "success": True,
                 "message": "User followed successfully",
                 "data": {'status': 'followed', 'following': True}
             }, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'])
+    def presence(self, request):
+        """Opt in or out of online/offline updates for a user you follow"""
+        following_id = request.data.get('following_id')
+        enabled = request.data.get('enabled', True)
+        if isinstance(enabled, str):
+            enabled = enabled.lower() == 'true'
+        
+        if not following_id or not str(following_id).isdigit():
+            return Response({
+                "success": False,
+                "error": "following_id (a user id) is required"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        updated = Follow.objects.filter(
+            follower=request.user,
+            following_id=following_id
+        ).update(presence_updates=bool(enabled))
+        if not updated:
+            return Response({
+                "success": False,
+                "error": "You are not following this user"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        from chats import presence
+        presence.forget_contacts(following_id)
+        return Response({
+            "success": True,
+            "message": "Presence updates enabled" if enabled else "Presence updates disabled",
+            "data": {'following_id': int(following_id), 'presence_updates': bool(enabled)}
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'])
     def user_profile(self, request):
         """Get user profile with follow statistics"""
@@ -1815,18 +2036,16 @@ class FollowViewSet(viewsets.ModelViewSet):
                     "error": "Invalid user identifier"
                 }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get stats with optimized queries
-        followers_count = Follow.objects.filter(following=target_user).count()
-        following_count = Follow.objects.filter(follower=target_user).count()
-        posts_count = Post.objects.filter(user=target_user, status='approved').count()
+        # Denormalized counters: a single-row read
+        stats = profile_stats.get_stats(target_user.id)
+        followers_count = stats['followers_count']
+        following_count = stats['following_count']
+        posts_count = stats['posts_count']
         
         # Check if current user is following this user
         is_following = False
         if request.user != target_user:
-            is_following = Follow.objects.filter(
-                follower=request.user,
-                following=target_user
-            ).exists()
+            is_following = follow_graph.is_following(request.user.id, target_user.id)
         
         profile_data = {
             'user_id': target_user.id,
@@ -1846,59 +2065,38 @@ class FollowViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def suggestions(self, request):
-        """Get all users as suggestions with follow status"""
-        # Get all users except current user
-        all_users = list(User.objects.exclude(id=request.user.id).select_related('profile'))
-        user_ids = [user.id for user in all_users]
-        
-        if not user_ids:
-            return Response({
-                "success": True,
-                "message": "No user suggestions available",
-                "data": []
-            })
-        
-        # Get IDs of users the current user is following
-        following_ids = set(
-            Follow.objects.filter(follower=request.user)
-            .values_list('following_id', flat=True)
-        )
-        
-        # Get follow relationship IDs for users being followed
-        follow_relations = {
-            follow.following_id: follow.id
-            for follow in Follow.objects.filter(
-                follower=request.user,
-                following_id__in=user_ids
-            )
-        }
-        
-        # Get counts for each user using optimized queries
-        from django.db.models import Count
-        followers_counts = dict(
-            Follow.objects.filter(following_id__in=user_ids)
-            .values('following_id')
-            .annotate(count=Count('id'))
-            .values_list('following_id', 'count')
-        )
-        
-        following_counts = dict(
-            Follow.objects.filter(follower_id__in=user_ids)
-            .values('follower_id')
-            .annotate(count=Count('id'))
-            .values_list('follower_id', 'count')
-        )
-        
-        posts_counts = dict(
-            Post.objects.filter(
-                user_id__in=user_ids,
-                status='approved'
-            )
-            .values('user_id')
-            .annotate(count=Count('id'))
-            .values_list('user_id', 'count')
-        )
-        
+        """
+        Get ranked follow suggestions from the user's neighbourhood
+        (friends of friends, shared communities and shared interests).
+        Supports ?page= and ?limit= (max 100).
+        """
+        from .suggestions import get_suggested_user_ids
+
+        ranked_ids = get_suggested_user_ids(request.user.id)
+
+        limit = request.query_params.get('limit')
+        if limit:
+            try:
+                # Set on the paginator instance so other views keep the default page size
+                self.paginator.page_size = max(1, min(int(limit), 100))
+            except ValueError:
+                pass
+
+        page_ids = self.paginate_queryset(ranked_ids)
+        paginated = page_ids is not None
+        if not paginated:
+            page_ids = ranked_ids[:20]
+
+        # Only the users on this page are loaded and counted
+        users_by_id = User.objects.select_related('profile', 'stats').in_bulk(page_ids)
+
+        # Follow ids are only fetched for users the graph says are followed
+        followed_ids = follow_graph.filter_following(request.user.id, page_ids)
+        follow_relations = dict(
+            Follow.objects.filter(follower=request.user, following_id__in=followed_ids)
+            .values_list('following_id', 'id')
+        ) if followed_ids else {}
+
         # Build suggestion data with all required fields
         # Create a simple class to hold suggestion data
         class SuggestionData:
@@ -1911,35 +2109,40 @@ class FollowViewSet(viewsets.ModelViewSet):
                 self.followers_count = followers_count
                 self.following_count = following_count
                 self.posts_count = posts_count
-        
+
         suggestions_data = []
-        for user in all_users:
-            user_id = user.id
-            is_following = user_id in following_ids
+        for user_id in page_ids:
+            user = users_by_id.get(user_id)
+            if user is None:
+                # Deleted since the ranking was cached
+                continue
             follow_id = follow_relations.get(user_id)
-            
-            suggestion_obj = SuggestionData(
+            # Denormalized counters arrive with the user via select_related
+            stats = profile_stats.for_user(user)
+            suggestions_data.append(SuggestionData(
                 user=user,
-                is_following=is_following,
+                is_following=follow_id is not None,
                 follow_id=follow_id,
-                followers_count=followers_counts.get(user_id, 0),
-                following_count=following_counts.get(user_id, 0),
-                posts_count=posts_counts.get(user_id, 0)
-            )
-            suggestions_data.append(suggestion_obj)
-        
+                followers_count=stats['followers_count'],
+                following_count=stats['following_count'],
+                posts_count=stats['posts_count']
+            ))
+
         # Serialize the data
         serializer = UserSuggestionSerializer(
-            suggestions_data, 
-            many=True, 
+            suggestions_data,
+            many=True,
             context={'request': request}
         )
-        
-        return Response({
+
+        payload = {
             "success": True,
-            "message": "User suggestions retrieved successfully",
+            "message": "User suggestions retrieved successfully" if suggestions_data else "No user suggestions available",
             "data": serializer.data
-        })
+        }
+        if paginated:
+            return self.get_paginated_response(payload)
+        return Response(payload)
 
 class PostReportViewSet(viewsets.ModelViewSet):
     """ Viewset for Post Reports """
@@ -2125,10 +2328,18 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 "error": "You do not have permission to modify this notification."
             }, status=status.HTTP_403_FORBIDDEN)
         
+        was_read = instance.is_read
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
         
+        # Keep the cached badge in step when is_read is toggled directly
+        if was_read != serializer.instance.is_read:
+            if serializer.instance.is_read:
+                unread_counters.decrement(unread_counters.NOTIFICATIONS, request.user.id)
+            else:
+                unread_counters.increment(unread_counters.NOTIFICATIONS, request.user.id)
+        
         return Response({
             "success": True,
             "message": "Notification updated successfully",
@@ -2157,8 +2368,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        """Get count of unread notifications"""
-        count = self.get_queryset().filter(is_read=False).count()
+        """Get count of unread notifications (served from the cached counter)"""
+        count = unread_counters.get_count(unread_counters.NOTIFICATIONS, request.user.id)
         return Response({
             "success": True,
             "message": "Unread count retrieved successfully",
@@ -2169,6 +2380,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_all_read(self, request):
         """Mark all notifications as read"""
         updated = self.get_queryset().filter(is_read=False).update(is_read=True)
+        unread_counters.reset(unread_counters.NOTIFICATIONS, request.user.id)
         return Response({
             "success": True,
             "message": "All notifications marked as read",
@@ -2188,8 +2400,10 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 "error": "You do not have permission to modify this notification."
             }, status=status.HTTP_403_FORBIDDEN)
         
-        notification.is_read = True
-        notification.save()
+        if not notification.is_read:
+            notification.is_read = True
+            notification.save(update_fields=['is_read'])
+            unread_counters.decrement(unread_counters.NOTIFICATIONS, request.user.id)
         
         serializer = self.get_serializer(notification)
         return Response({
@@ -2198,6 +2412,27 @@ class NotificationViewSet(viewsets.ModelViewSet):
             "data": serializer.data
         })
     
+    @action(detail=False, methods=['get'])
+    def badges(self, request):
+        """Get all badge counts (notifications, direct messages, message requests) in one call"""
+        from chats.models import MessageRequest
+        
+        counts = unread_counters.get_counts(request.user.id)
+        message_requests = MessageRequest.objects.filter(
+            receiver=request.user,
+            status='pending'
+        ).count()
+        
+        return Response({
+            "success": True,
+            "message": "Badge counts retrieved successfully",
+            "data": {
+                'notifications': counts[unread_counters.NOTIFICATIONS],
+                'messages': counts[unread_counters.MESSAGES],
+                'message_requests': message_requests,
+            }
+        })
+    
     def destroy(self, request, *args, **kwargs):
         """Only the recipient can delete their notification"""
         notification = self.get_object()
@@ -0,0 +1,181 @@
+"""
+Django cache backend kept in the channel broker (run_channel_broker).
+
+With USE_LOCAL_CHANNELS the workers already share one broker process on a
+Unix socket. Without CACHE_URL, settings point the default cache here, so
+presence refcounts, unread counters, block sets and contact states are
+shared between the workers without Redis or any other extra service. The
+broker handles one request at a time, so add() and incr() are atomic
+across workers, as they are in Redis.
+
+- Each thread keeps one blocking connection to the broker; a request is
+  one frame out and one reply back.
+- Integers are sent as they are, so the broker can incr() them; every
+  other value is pickled in the worker and opaque to the broker.
+- Entries live in the broker's memory only. Restarting it empties the
+  cache, which every caller already treats as a miss. Past
+  `run_channel_broker --cache-entries` entries, it drops expired ones
+  first and then the oldest writes.
+
+Settings:
+    CACHES = {'default': {
+        'BACKEND': 'utils.broker_cache.BrokerCache',
+        'LOCATION': '/tmp/channels.sock',
+    }}
+"""
+import pickle
+import socket
+import threading
+
+import msgpack
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .local_channel_layer import _HEADER, DEFAULT_PATH, _pack
+
+# Safe to resend after a dropped connection; add() and incr() are not
+IDEMPOTENT_OPS = {'cache_get', 'cache_set', 'cache_touch', 'cache_delete', 'cache_clear'}
+
+
+def _encode(value):
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    return value if isinstance(value, int) else pickle.loads(value)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('The channel broker closed the connection')
+        data += chunk
+    return bytes(data)
+
+
+def _recv_frame(sock):
+    (length,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return msgpack.unpackb(_recv_exactly(sock, length), raw=False)
+
+
+class BrokerCache(BaseCache):
+    """Cache backend stored in the run_channel_broker process (see the module docstring)"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location or DEFAULT_PATH
+        self.socket_timeout = params.get('OPTIONS', {}).get('SOCKET_TIMEOUT', 5)
+        self._local = threading.local()
+        self._sockets = set()
+        self._sockets_lock = threading.Lock()
+
+    def _socket(self):
+        sock = getattr(self._local, 'socket', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.socket_timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(
+                    f'Channel broker not reachable at {self.path} '
+                    '(start it with `python manage.py run_channel_broker`)'
+                ) from e
+            self._local.socket = sock
+            self._local.next_request = 0
+            with self._sockets_lock:
+                self._sockets.add(sock)
+        return sock
+
+    def _drop_socket(self):
+        sock = getattr(self._local, 'socket', None)
+        if sock is not None:
+            self._local.socket = None
+            with self._sockets_lock:
+                self._sockets.discard(sock)
+            sock.close()
+
+    def _request(self, op, *args):
+        attempts = 2 if op in IDEMPOTENT_OPS else 1
+        for attempt in range(1, attempts + 1):
+            sock = self._socket()
+            self._local.next_request += 1
+            request_id = self._local.next_request
+            try:
+                sock.sendall(_pack([op, request_id, *args]))
+                while True:
+                    frame = _recv_frame(sock)
+                    if frame[0] == 'reply' and frame[1] == request_id:
+                        return frame[2]
+            except OSError as e:
+                # A broker restart leaves a dead connection behind; reconnect next time
+                self._drop_socket()
+                if attempt == attempts:
+                    raise ConnectionError('Lost the channel broker connection') from e
+
+    def disconnect(self):
+        """Close every thread's connection (they reconnect on next use)"""
+        with self._sockets_lock:
+            sockets, self._sockets = self._sockets, set()
+        for sock in sockets:
+            sock.close()
+        self._local = threading.local()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._request('cache_add', key, _encode(value), self.get_backend_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        found = self._request('cache_get', [key])
+        return _decode(found[key]) if key in found else default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._request('cache_set', {key: _encode(value)}, self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._request('cache_touch', key, self.get_backend_timeout(timeout))
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._request('cache_delete', [key]))
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        found = self._request('cache_get', list(keys))
+        return {keys[key]: _decode(value) for key, value in found.items()}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = {self.make_and_validate_key(key, version=version): _encode(value) for key, value in data.items()}
+        if items:
+            self._request('cache_set', items, self.get_backend_timeout(timeout))
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._request('cache_delete', keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return key in self._request('cache_get', [key])
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        result = self._request('cache_incr', key, delta)
+        if result is None:
+            raise ValueError(f"Key '{key}' not found")
+        if result is False:
+            raise TypeError(f"Key '{key}' does not hold an integer")
+        return result
+
+    def clear(self):
+        self._request('cache_clear')
@@ -0,0 +1,23 @@
+"""
+What the configured Django cache can be trusted with.
+
+Presence refcounts, unread counters, block sets and contact states are
+kept in the default cache and must be the same for every worker. A
+per-process backend (LocMemCache, DummyCache) gives each process its own
+copy: fine for one worker, silently wrong for several, and useless to a
+management command whose writes no web worker would ever read.
+"""
+from django.conf import settings
+
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def default_backend():
+    return settings.CACHES.get('default', {}).get('BACKEND', '')
+
+
+def is_per_process():
+    return default_backend() in PER_PROCESS_CACHES
@@ -0,0 +1,125 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304 Not Modified).
+
+Views declare a validator function that computes an (etag, last_modified)
+pair from cheap columns (updated_at, counter columns, an aggregate of
+max(updated_at) and count for collections) instead of serializing the
+response. Changes that don't touch a row's own updated_at - likes,
+comments, memberships, m2m edits - bump a "content version" for the
+affected object. A version is just the time of the last change, stored in
+the Django cache, so it can feed both the ETag and Last-Modified.
+
+A version missing from the cache is reseeded with the current time. That
+only costs clients one full response; it never produces a stale 304.
+
+Every response carries the ETag, and If-None-Match is checked before
+If-Modified-Since. Last-Modified has one-second precision, so it is only
+sent once the second it names has passed. A change later in that same
+second could otherwise be answered 304 for a client that only sends
+If-Modified-Since.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def _timeout():
+    return getattr(settings, 'CONTENT_VERSION_TIMEOUT', 7 * 24 * 3600)
+
+
+def _version_key(scope, obj_id):
+    return f'content_version_{scope}_{obj_id}'
+
+
+def bump(scope, obj_id=None):
+    """Record that something shown for (scope, obj_id) changed just now"""
+    cache.set(_version_key(scope, obj_id), time.time(), timeout=_timeout())
+
+
+def versions(*pairs):
+    """Return the version timestamp for each (scope, obj_id) pair"""
+    keys = [_version_key(scope, obj_id) for scope, obj_id in pairs]
+    found = cache.get_many(keys)
+    now = time.time()
+    result = []
+    for key in keys:
+        if key not in found:
+            # Unknown history: treat as changed now, and remember it
+            cache.add(key, now, timeout=_timeout())
+            found[key] = now
+        result.append(found[key])
+    return result
+
+
+def make_etag(*parts):
+    """Build a weak ETag from any repr()-able validator parts"""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def latest(*values):
+    """Newest of datetimes / unix timestamps (None values are skipped), as a timestamp"""
+    timestamps = [
+        value.timestamp() if isinstance(value, datetime) else value
+        for value in values if value is not None
+    ]
+    return max(timestamps) if timestamps else None
+
+
+def conditional(validators, personalized=True):
+    """
+    Decorate a GET view method with ETag / Last-Modified handling.
+
+    `validators(view, request, *args, **kwargs)` returns (etag, last_modified)
+    or None to skip conditional handling (e.g. the object doesn't exist, so
+    the view can produce its normal error). last_modified is a unix
+    timestamp or None. Personalized responses must fold the user into the
+    etag; they are marked private and vary on Authorization.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return func(self, request, *args, **kwargs)
+
+            try:
+                result = validators(self, request, *args, **kwargs)
+            except ValueError:
+                # Malformed lookup value (e.g. a non-numeric pk); the view reports it
+                result = None
+            if result is None:
+                return func(self, request, *args, **kwargs)
+            etag, last_modified = result
+            if last_modified is not None:
+                last_modified = int(last_modified)
+                if last_modified >= int(time.time()):
+                    # Still the current second: a change may follow within it
+                    last_modified = None
+
+            if request.META.get('HTTP_IF_NONE_MATCH'):
+                response = get_conditional_response(request, etag=etag)
+            else:
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = func(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Clients may keep the body but must revalidate before reusing it
+            if personalized:
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ['Authorization'])
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,171 @@
+"""
+Streaming CSV / NDJSON exports for admin listings.
+
+stream_export() projects a queryset onto flat columns with values_list(),
+walks it with .iterator(chunk_size=...) (a server-side cursor on
+PostgreSQL) and encodes the rows into 64 KB blocks, optionally
+gzip-compressed on the fly. The response body is an async generator that
+pulls one block at a time from that pipeline through sync_to_async, so
+an ASGI server (daphne) sends each block as it is produced. Only one
+chunk of rows is held in memory at a time, whatever the table size.
+Under WSGI Django would buffer an async body in full; the app is served
+over ASGI.
+
+Query params understood by export_options():
+    export_format   csv (default) or ndjson
+    gzip            true to download a .gz file
+"""
+import csv
+import json
+import zlib
+from abc import ABCMeta, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+class _Echo:
+    """File-like object whose write() returns the written text (for csv.writer)"""
+    def write(self, value):
+        return value
+
+
+def export_options(request):
+    """Return (export_format, gzip) from the query params; ValueError on an unknown format"""
+    export_format = request.query_params.get('export_format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of: {', '.join(EXPORT_FORMATS)}")
+    compress = request.query_params.get('gzip', '').lower() == 'true'
+    return export_format, compress
+
+
+def _csv_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
+def _rows(queryset, columns):
+    lookups = [lookup for _, lookup in columns]
+    return queryset.values_list(*lookups).iterator(chunk_size=_chunk_size())
+
+
+def _csv_lines(queryset, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in _rows(queryset, columns):
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def _ndjson_lines(queryset, columns):
+    headers = [header for header, _ in columns]
+    for row in _rows(queryset, columns):
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def _batched(lines, size=64 * 1024):
+    """Join small lines into larger blocks so each write to the client is worthwhile"""
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def _gzipped(blocks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _streamed(blocks):
+    """
+    Yield the blocks of a synchronous pipeline, producing each one in the
+    thread that runs the ORM (the server-side cursor stays on its connection)
+    """
+    next_block = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            block = await next_block(blocks, None)
+            if block is None:
+                return
+            yield block
+    finally:
+        # Releases the cursor when the client goes away mid-download
+        await sync_to_async(blocks.close, thread_sensitive=True)()
+
+
+def stream_export(queryset, columns, name, export_format='csv', compress=False):
+    """
+    Stream `queryset` as a downloadable file.
+
+    `columns` is a list of (header, lookup) pairs, e.g. ('plan', 'plan__name');
+    `name` is the file name stem (a timestamp and extension are appended).
+    """
+    content_type, extension = EXPORT_FORMATS[export_format]
+    lines = _csv_lines(queryset, columns) if export_format == 'csv' else _ndjson_lines(queryset, columns)
+    blocks = _batched(lines)
+
+    filename = f"{name}-{timezone.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    if compress:
+        blocks = _gzipped(blocks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(_streamed(blocks), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class ExportView(APIView, metaclass=ABCMeta):
+    """
+    GET view streaming a filtered queryset as CSV / NDJSON.
+
+    Subclasses set permission_classes, export_name and columns, and return
+    the filtered queryset from get_export_queryset(request).
+    """
+    export_name = 'export'
+    columns = ()
+
+    @abstractmethod
+    def get_export_queryset(self, request):
+        """The queryset to export, with the request's filters applied"""
+
+    def get(self, request):
+        try:
+            export_format, compress = export_options(request)
+        except ValueError as e:
+            return Response({
+                "success": False,
+                "message": str(e)
+            }, status=400)
+        return stream_export(
+            self.get_export_queryset(request), self.columns, self.export_name,
+            export_format=export_format, compress=compress
+        )
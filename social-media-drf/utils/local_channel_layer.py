@@ -0,0 +1,456 @@
+"""
+Channel layer for several ASGI worker processes on one host, without Redis.
+
+A small broker process (`python manage.py run_channel_broker`) listens on a
+Unix domain socket. Each worker's LocalChannelLayer keeps one connection
+to it per event loop. Frames are length-prefixed msgpack.
+
+- Process-specific channels (`specific.<client>!<id>`, which is what
+  consumers get from new_channel()) are pushed by the broker to the
+  connection that owns <client>. That connection buffers them locally, up
+  to the channel's capacity.
+- Normal channels are queued in the broker, up to `capacity`, and handed
+  to receive() calls in order.
+- Groups live in the broker. group_send() is one frame to the broker,
+  which fans it out as one frame per worker connection (not per member).
+  Memberships expire after `group_expiry` seconds and are dropped when
+  their worker disconnects. Workers re-add their own memberships when
+  they reconnect.
+- Messages older than `expiry` seconds are dropped instead of delivered.
+
+Workers must also share the Django cache, and chats/checks.py refuses a
+per-process one. Without CACHE_URL, settings use utils.broker_cache,
+which keeps the cache in this same broker (the cache_* operations below),
+so no Redis is needed for either. entrypoint.sh starts the broker and then
+`python manage.py run_asgi_workers`, which runs WEB_CONCURRENCY daphne
+processes on one listening socket.
+
+Settings:
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'utils.local_channel_layer.LocalChannelLayer',
+        'CONFIG': {'path': '/tmp/channels.sock'},
+    }}
+"""
+import asyncio
+import itertools
+import logging
+import os
+import secrets
+import struct
+import time
+from collections import defaultdict, deque
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = '/tmp/channels.sock'
+_HEADER = struct.Struct('!I')
+# A worker connection whose unread output passes this many bytes gets no more pushes
+MAX_CLIENT_BUFFER = 8 * 1024 * 1024
+
+
+def _pack(frame):
+    data = msgpack.packb(frame, use_bin_type=True)
+    return _HEADER.pack(len(data)) + data
+
+
+async def _read_frame(reader):
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return msgpack.unpackb(await reader.readexactly(length), raw=False)
+
+
+def _client_of(channel):
+    """The worker connection id inside a process-specific channel name"""
+    return channel[:channel.index('!')].rsplit('.', 1)[-1]
+
+
+""" Broker """
+class Broker:
+    """Holds normal channel queues and groups; routes messages between worker connections"""
+
+    def __init__(self, path=DEFAULT_PATH, capacity=100, expiry=60, cache_max_entries=100000):
+        self.path = path
+        self.capacity = capacity
+        self.expiry = expiry
+        self.cache_max_entries = cache_max_entries
+        self.cache = {}                     # cache key -> (expires at or None, value)
+        self.clients = {}                   # client id -> writer
+        self.queues = defaultdict(deque)    # normal channel -> (timestamp, message)
+        self.waiters = defaultdict(deque)   # normal channel -> (writer, request id)
+        self.groups = defaultdict(dict)     # group -> {channel: expires at}
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.info('Channel broker listening on %s', self.path)
+        async with server:
+            await server.serve_forever()
+
+    def _push(self, writer, frame):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            return False
+        writer.write(_pack(frame))
+        return True
+
+    async def _handle(self, reader, writer):
+        client_id = None
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                op = frame[0]
+                if op == 'hello':
+                    client_id = frame[1]
+                    self.clients[client_id] = writer
+                else:
+                    getattr(self, f'_op_{op}')(writer, *frame[1:])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception('Channel broker dropped a client connection')
+        finally:
+            self._forget(client_id, writer)
+            writer.close()
+
+    def _forget(self, client_id, writer):
+        if client_id is not None and self.clients.get(client_id) is writer:
+            del self.clients[client_id]
+            for group, members in list(self.groups.items()):
+                for channel in [c for c in members if '!' in c and _client_of(c) == client_id]:
+                    del members[channel]
+                if not members:
+                    del self.groups[group]
+        for channel, waiting in list(self.waiters.items()):
+            self.waiters[channel] = deque(w for w in waiting if w[0] is not writer)
+
+    def _deliver(self, channel, message, timestamp, capacity):
+        """Route one message; False when the channel is full"""
+        if '!' in channel:
+            writer = self.clients.get(_client_of(channel))
+            if writer is None:
+                return True  # Its worker is gone; nobody will receive it
+            return self._push(writer, ['deliver', [channel], message, timestamp])
+        waiting = self.waiters.get(channel)
+        while waiting:
+            writer, request_id = waiting.popleft()
+            if not writer.is_closing():
+                return self._push(writer, ['reply', request_id, [channel, message]])
+        queue = self.queues[channel]
+        self._expire(queue)
+        if len(queue) >= (capacity or self.capacity):
+            return False
+        queue.append((timestamp, message))
+        return True
+
+    def _expire(self, queue):
+        cutoff = time.time() - self.expiry
+        while queue and queue[0][0] < cutoff:
+            queue.popleft()
+
+    def _op_send(self, writer, request_id, channel, message, capacity):
+        ok = self._deliver(channel, message, time.time(), capacity)
+        self._push(writer, ['reply', request_id, ok])
+
+    def _op_receive(self, writer, request_id, channel):
+        queue = self.queues.get(channel)
+        if queue:
+            self._expire(queue)
+        if queue:
+            _, message = queue.popleft()
+            self._push(writer, ['reply', request_id, [channel, message]])
+        else:
+            self.waiters[channel].append((writer, request_id))
+
+    def _op_group_add(self, writer, request_id, group, channel, group_expiry):
+        self.groups[group][channel] = time.time() + group_expiry
+        self._push(writer, ['reply', request_id, True])
+
+    def _op_group_discard(self, writer, request_id, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        self._push(writer, ['reply', request_id, True])
+
+    def _op_group_send(self, writer, request_id, group, message, capacity):
+        now = time.time()
+        members = self.groups.get(group, {})
+        by_client = defaultdict(list)
+        for channel, expires_at in list(members.items()):
+            if expires_at < now:
+                del members[channel]
+            elif '!' in channel:
+                by_client[_client_of(channel)].append(channel)
+            else:
+                self._deliver(channel, message, now, capacity)
+        # One frame per worker connection, however many of its channels are in the group
+        for client_id, channels in by_client.items():
+            target = self.clients.get(client_id)
+            if target is not None:
+                self._push(target, ['deliver', channels, message, now])
+        self._push(writer, ['reply', request_id, True])
+
+    def _op_flush(self, writer, request_id):
+        self.queues.clear()
+        self.groups.clear()
+        self._push(writer, ['reply', request_id, True])
+
+    # Cache operations (utils.broker_cache). Requests run one at a time, so
+    # add() and incr() are atomic across workers. Values are opaque bytes,
+    # except integers, which are stored as they are so incr() can add to them.
+
+    def _cache_entry(self, key):
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            del self.cache[key]
+            return None
+        return entry
+
+    def _cache_store(self, key, value, expires_at):
+        self.cache.pop(key, None)
+        if expires_at is not None and expires_at <= time.time():
+            return
+        if len(self.cache) >= self.cache_max_entries:
+            self._cache_cull()
+        self.cache[key] = (expires_at, value)
+
+    def _cache_cull(self):
+        now = time.time()
+        for key in [k for k, (expires_at, _) in self.cache.items() if expires_at is not None and expires_at <= now]:
+            del self.cache[key]
+        if len(self.cache) >= self.cache_max_entries:
+            # Still full: drop the oldest third of the writes
+            for key in list(itertools.islice(self.cache, len(self.cache) // 3 or 1)):
+                del self.cache[key]
+
+    def _op_cache_get(self, writer, request_id, keys):
+        found = {}
+        for key in keys:
+            entry = self._cache_entry(key)
+            if entry is not None:
+                found[key] = entry[1]
+        self._push(writer, ['reply', request_id, found])
+
+    def _op_cache_set(self, writer, request_id, items, expires_at):
+        for key, value in items.items():
+            self._cache_store(key, value, expires_at)
+        self._push(writer, ['reply', request_id, True])
+
+    def _op_cache_add(self, writer, request_id, key, value, expires_at):
+        added = self._cache_entry(key) is None
+        if added:
+            self._cache_store(key, value, expires_at)
+        self._push(writer, ['reply', request_id, added])
+
+    def _op_cache_touch(self, writer, request_id, key, expires_at):
+        entry = self._cache_entry(key)
+        if entry is not None:
+            self._cache_store(key, entry[1], expires_at)
+        self._push(writer, ['reply', request_id, entry is not None])
+
+    def _op_cache_incr(self, writer, request_id, key, delta):
+        entry = self._cache_entry(key)
+        if entry is None:
+            result = None
+        elif type(entry[1]) is not int:
+            result = False
+        else:
+            result = entry[1] + delta
+            self.cache[key] = (entry[0], result)
+        self._push(writer, ['reply', request_id, result])
+
+    def _op_cache_delete(self, writer, request_id, keys):
+        deleted = [key for key in keys if self._cache_entry(key) is not None]
+        for key in deleted:
+            del self.cache[key]
+        self._push(writer, ['reply', request_id, len(deleted)])
+
+    def _op_cache_clear(self, writer, request_id):
+        self.cache.clear()
+        self._push(writer, ['reply', request_id, True])
+
+
+""" Worker side """
+class _Connection:
+    """One worker event loop's connection to the broker"""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.client_id = secrets.token_hex(8)
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.lock = None
+        self.next_request = 0
+        self.pending = {}
+        self.abandoned = set()
+        self.buffers = defaultdict(deque)   # specific channel -> (timestamp, message)
+        self.buffer_waiters = {}            # specific channel -> future
+        self.memberships = set()
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def ensure_open(self):
+        if self.connected:
+            return
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.connected:
+                return
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.layer.path)
+            except OSError as e:
+                raise ConnectionError(
+                    f'Channel broker not reachable at {self.layer.path} '
+                    '(start it with `python manage.py run_channel_broker`)'
+                ) from e
+            self.writer.write(_pack(['hello', self.client_id]))
+            self.reader_task = asyncio.get_running_loop().create_task(self._read())
+            # The broker forgot this connection's groups if it dropped the previous one
+            for group, channel in self.memberships:
+                self.writer.write(_pack(['group_add', None, group, channel, self.layer.group_expiry]))
+
+    async def _read(self):
+        try:
+            while True:
+                frame = await _read_frame(self.reader)
+                if frame[0] == 'deliver':
+                    _, channels, message, timestamp = frame
+                    for channel in channels:
+                        self._buffer(channel, message, timestamp)
+                elif frame[0] == 'reply':
+                    self._reply(frame[1], frame[2])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Lost the channel broker connection'))
+            self.pending.clear()
+
+    def _buffer(self, channel, message, timestamp):
+        buffer = self.buffers[channel]
+        if len(buffer) >= self.layer.get_capacity(channel):
+            logger.warning('Channel %s is full; dropping a message', channel)
+            return
+        buffer.append((timestamp, message))
+        waiter = self.buffer_waiters.pop(channel, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _reply(self, request_id, result):
+        future = self.pending.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+        elif request_id in self.abandoned:
+            # A cancelled receive() still got a message: put it back
+            self.abandoned.discard(request_id)
+            channel, message = result
+            self.writer.write(_pack(['send', None, channel, message, None]))
+
+    async def request(self, op, *args):
+        await self.ensure_open()
+        self.next_request += 1
+        request_id = self.next_request
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(_pack([op, request_id, *args]))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if self.pending.pop(request_id, None) is not None and op == 'receive':
+                self.abandoned.add(request_id)
+            raise
+
+    async def receive_specific(self, channel):
+        buffer = self.buffers[channel]
+        while True:
+            while buffer:
+                timestamp, message = buffer.popleft()
+                if time.time() - timestamp <= self.layer.expiry:
+                    if not buffer:
+                        del self.buffers[channel]
+                    return message
+            waiter = asyncio.get_running_loop().create_future()
+            self.buffer_waiters[channel] = waiter
+            try:
+                await waiter
+            finally:
+                self.buffer_waiters.pop(channel, None)
+
+
+class LocalChannelLayer(BaseChannelLayer):
+    """Channel layer backed by the broker of run_channel_broker (see the module docstring)"""
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path=DEFAULT_PATH, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self._connections = {}
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        connection = self._connections.get(loop)
+        if connection is None:
+            # async_to_sync() runs each call in a fresh loop; forget the finished ones
+            for closed in [other for other in self._connections if other.is_closed()]:
+                del self._connections[closed]
+            connection = self._connections[loop] = _Connection(self)
+        await connection.ensure_open()
+        return connection
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        connection = await self._connection()
+        if not await connection.request('send', channel, message, self.get_capacity(channel)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        connection = await self._connection()
+        if '!' in channel:
+            return await connection.receive_specific(channel)
+        _, message = await connection.request('receive', channel)
+        return message
+
+    async def new_channel(self, prefix='specific'):
+        connection = await self._connection()
+        return f'{prefix}.{connection.client_id}!{secrets.token_hex(6)}'
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        connection = await self._connection()
+        if '!' in channel:
+            connection.memberships.add((group, channel))
+        await connection.request('group_add', group, channel, self.group_expiry)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        connection = await self._connection()
+        connection.memberships.discard((group, channel))
+        await connection.request('group_discard', group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        connection = await self._connection()
+        await connection.request('group_send', group, message, self.capacity)
+
+    async def flush(self):
+        connection = await self._connection()
+        await connection.request('flush')
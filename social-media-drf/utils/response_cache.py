@@ -0,0 +1,188 @@
+"""
+Shared response cache for public, rarely-changing GET endpoints.
+
+Decorate a view method with cached_response(name, ttl=..., vary=..., tags=...):
+
+- vary decides who shares an entry: 'none' (everyone), 'auth' (anonymous vs
+  authenticated), 'role' (anonymous / user / moderator / admin) or 'user'
+  (one entry per user). anonymous_only=True bypasses the cache for
+  authenticated requests whose responses are personalized.
+- tags name the data a response depends on. Every tag has a generation
+  number that is part of the cache key; invalidate(tag) bumps it, so all
+  entries built from the old data become unreachable and age out by TTL.
+  invalidate_on(Model, *tags) does that from post_save/post_delete;
+  ignore_fields skips saves that only write fields no response shows.
+- Concurrent misses for the same key are single-flighted: the first request
+  takes a short lock in the cache and computes; the others wait briefly for
+  its result instead of running the same queries.
+
+Only 200 responses are cached, as response data (DRF re-renders it, so
+content negotiation still works). Responses carry X-Cache: HIT/MISS, and
+stats() returns hit/miss counters per cached endpoint.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+VARY_CHOICES = ('none', 'auth', 'role', 'user')
+
+# Names of every decorated endpoint, for stats()
+_registry = set()
+
+
+def _enabled():
+    return getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+
+
+def _lock_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_LOCK_TIMEOUT', 10)
+
+
+def _wait_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_WAIT_TIMEOUT', 2)
+
+
+def _tag_key(tag):
+    return f'response_cache_tag_{tag}'
+
+
+def _stat_key(name, kind):
+    return f'response_cache_stat_{name}_{kind}'
+
+
+def invalidate(*tags):
+    """Invalidate every cached response that depends on any of the tags"""
+    now = time.time()
+    cache.set_many({_tag_key(tag): now for tag in tags}, timeout=None)
+
+
+def invalidate_on(model, *tags, ignore_fields=()):
+    """
+    Invalidate the tags whenever an instance of `model` is saved or deleted.
+    Saves whose update_fields are all in `ignore_fields` (e.g. the
+    last_login write on every login) leave the tags alone.
+    """
+    ignore_fields = frozenset(ignore_fields)
+
+    def receiver(sender, update_fields=None, **kwargs):
+        if update_fields and ignore_fields.issuperset(update_fields):
+            return
+        invalidate(*tags)
+
+    uid = f'response_cache_{model._meta.label}_{"_".join(tags)}'
+    post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}_save')
+    post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}_delete')
+
+
+def _tag_generations(tags):
+    if not tags:
+        return ()
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def _vary_part(request, vary):
+    user = request.user
+    authenticated = bool(user and user.is_authenticated)
+    if vary == 'none':
+        return ''
+    if vary == 'auth':
+        return 'auth' if authenticated else 'anon'
+    if vary == 'role':
+        return getattr(user, 'role', 'user') if authenticated else 'anon'
+    return f'user{user.pk}' if authenticated else 'anon'
+
+
+def _count(name, kind):
+    key = _stat_key(name, kind)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def stats():
+    """Return {endpoint name: {'hits': n, 'misses': n, 'hit_rate': float}}"""
+    names = sorted(_registry)
+    keys = [_stat_key(name, kind) for name in names for kind in ('hits', 'misses')]
+    found = cache.get_many(keys)
+    result = {}
+    for name in names:
+        hits = found.get(_stat_key(name, 'hits'), 0)
+        misses = found.get(_stat_key(name, 'misses'), 0)
+        total = hits + misses
+        result[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return result
+
+
+def reset_stats():
+    cache.delete_many([_stat_key(name, kind) for name in _registry for kind in ('hits', 'misses')])
+
+
+def cached_response(name, ttl=300, vary='none', tags=(), anonymous_only=False):
+    """Cache the response data of a GET view method (see module docstring)"""
+    if vary not in VARY_CHOICES:
+        raise ValueError(f"vary must be one of {VARY_CHOICES}")
+    _registry.add(name)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or not _enabled():
+                return func(self, request, *args, **kwargs)
+            if anonymous_only and request.user and request.user.is_authenticated:
+                return func(self, request, *args, **kwargs)
+
+            raw_key = repr((
+                name,
+                request.path,
+                sorted(request.query_params.lists()),
+                _vary_part(request, vary),
+                _tag_generations(tags),
+            ))
+            key = 'response_cache_' + hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+
+            cached = cache.get(key)
+            locked = False
+            if cached is None:
+                locked = cache.add(key + '_lock', 1, timeout=_lock_timeout())
+                if not locked:
+                    # Another request is computing this entry; wait for it briefly
+                    deadline = time.monotonic() + _wait_timeout()
+                    while cached is None and time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        cached = cache.get(key)
+
+            if cached is not None:
+                _count(name, 'hits')
+                response = Response(cached)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(name, 'misses')
+            try:
+                response = func(self, request, *args, **kwargs)
+                if response.status_code == 200 and isinstance(response, Response):
+                    # Plain JSON types: ReturnDict/ReturnList hold a serializer reference
+                    data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                    cache.set(key, data, timeout=ttl)
+            finally:
+                if locked:
+                    cache.delete(key + '_lock')
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
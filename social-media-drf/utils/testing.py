@@ -0,0 +1,18 @@
+"""
+Helpers shared by the apps' test suites.
+"""
+
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+
+def make_user(username, role='user'):
+    return get_user_model().objects.create_user(
+        username=username, email=f'{username}@example.com', password='pw12345678', role=role
+    )
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client